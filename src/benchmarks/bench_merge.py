@@ -0,0 +1,160 @@
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+
+# Benchmark: merge one 10-minute generator snapshot into a large yearly master.
+#
+#   python src/benchmarks/bench_merge.py                 # ~190 MB synthetic master
+#   python src/benchmarks/bench_merge.py --days 30       # smaller master
+#   python src/benchmarks/bench_merge.py --master data/taipower_generators/generator_2025.json
+#
+# Each variant runs in its own subprocess so peak RSS is measured per variant:
+#   legacy  - dict of every record + full sort (the original process_directory merge)
+#   table   - organize_taipower_data.write_master_json (RecordTable: interned codes
+#             + typed arrays), the path the json backend runs
+
+src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(src_dir)
+
+from process.organize_taipower_data import load_json, save_json, write_master_json
+
+UNITS = 320  # Roughly the number of units in d006010
+VARIANTS = ("legacy", "table")
+
+
+def make_master(path, days, units=UNITS):
+    start = datetime(2025, 1, 1)
+    records = []
+    for step in range(days * 144):
+        ts = (start + timedelta(minutes=10 * step)).strftime("%Y-%m-%dT%H:%M:%S")
+        for u in range(units):
+            records.append({
+                "DATETIME": ts,
+                "FUEL_TYPE": "燃煤" if u % 3 == 0 else "燃氣",
+                "UNIT_NAME": f"機組{u:03d}",
+                "NET_P": f"{(step * 7 + u) % 500}.{u % 10}",
+            })
+    save_json(path, {"records": {
+        "CATALOG": "bench", "START_DATE": records[0]["DATETIME"], "END_DATE": records[-1]["DATETIME"],
+        "UNIT_OF_MEASUREMENT": "MW", "INTERVAL": "10min", "NET_P": records,
+    }})
+    return records[-1]["DATETIME"]
+
+
+def make_snapshot(last_datetime, units=UNITS):
+    # One new 10-minute step plus a rewrite of the previous step (typical snapshot overlap)
+    last = datetime.strptime(last_datetime, "%Y-%m-%dT%H:%M:%S")
+    records = []
+    for ts in (last, last + timedelta(minutes=10)):
+        for u in range(units):
+            records.append({
+                "DATETIME": ts.strftime("%Y-%m-%dT%H:%M:%S"),
+                "FUEL_TYPE": "燃煤" if u % 3 == 0 else "燃氣",
+                "UNIT_NAME": f"機組{u:03d}",
+                "NET_P": "1.0",
+            })
+    return records
+
+
+def peak_kib():
+    # VmHWM restarts at exec; ru_maxrss can carry over the parent's peak from the fork
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def legacy_merge(existing, new_records):
+    existing_records_dict = {}
+    for rec in existing:
+        existing_records_dict[(rec["DATETIME"], rec["UNIT_NAME"])] = rec
+    for rec in new_records:
+        existing_records_dict[(rec["DATETIME"], rec["UNIT_NAME"])] = rec
+    all_records = list(existing_records_dict.values())
+    all_records.sort(key=lambda x: (x["DATETIME"], x["UNIT_NAME"]))
+    return all_records
+
+
+def run_variant(variant, master_path, snapshot_path):
+    new_records = load_json(snapshot_path)
+    t0 = time.perf_counter()
+    if variant == "table":
+        # The json backend's merge as process_directory runs it (master named {prefix}_{year}.json)
+        year = int(new_records[0]["DATETIME"][:4])
+        write_master_json(os.path.dirname(master_path), "NET_P", "generator", year, new_records,
+                          {"CATALOG": "bench", "UNIT_OF_MEASUREMENT": "MW", "INTERVAL": "10min"})
+    else:
+        master = load_json(master_path)
+        master["records"]["NET_P"] = legacy_merge(master["records"]["NET_P"], new_records)
+        save_json(master_path, master)
+    print(json.dumps({"run": time.perf_counter() - t0, "peak_kib": peak_kib()}))
+
+
+def measure(variant, master_src, snapshot_path, work_dir, year):
+    variant_dir = os.path.join(work_dir, variant)
+    os.makedirs(variant_dir)
+    master_path = os.path.join(variant_dir, f"generator_{year}.json")
+    shutil.copyfile(master_src, master_path)
+    t0 = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, __file__, "--run", variant, "--master", master_path, "--snapshot", snapshot_path],
+        check=True, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - t0
+    timings = json.loads(out.stdout.strip().splitlines()[-1])
+    shutil.rmtree(variant_dir)
+    return wall, timings["peak_kib"], timings
+
+
+def main():
+    import argparse
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--days", type=int, default=85, help="days in the synthetic master (85 days ~ 190 MB)")
+    ap.add_argument("--master", help="use an existing master file instead of a synthetic one")
+    ap.add_argument("--snapshot", help=argparse.SUPPRESS)
+    ap.add_argument("--run", choices=VARIANTS, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.run:
+        run_variant(args.run, args.master, args.snapshot)
+        return
+
+    work_dir = tempfile.mkdtemp(prefix="bench_merge_")
+    try:
+        if args.master:
+            master_src = args.master
+            last = load_json(master_src)["records"]["NET_P"][-1]["DATETIME"]
+        else:
+            master_src = os.path.join(work_dir, "generator_2025.json")
+            print(f"Generating synthetic master ({args.days} days x {UNITS} units)...")
+            last = make_master(master_src, args.days)
+        snapshot_path = os.path.join(work_dir, "snapshot.json")
+        save_json(snapshot_path, make_snapshot(last))
+        print(f"Master: {os.path.getsize(master_src) / 1e6:.1f} MB")
+
+        results = {}
+        for variant in VARIANTS:
+            results[variant] = measure(variant, master_src, snapshot_path, work_dir, last[:4])
+
+        # run s: load + merge + save inside the subprocess (wall s adds interpreter start-up)
+        print(f"{'variant':<8} {'wall s':>8} {'run s':>8} {'peak RSS MB':>12}")
+        for variant, (wall, peak, t) in results.items():
+            print(f"{variant:<8} {wall:8.2f} {t['run']:8.2f} {peak / 1024:12.0f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
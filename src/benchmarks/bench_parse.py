@@ -0,0 +1,143 @@
+import os
+import sys
+import glob
+import time
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+# Benchmark: parse epower report2.aspx / dataq.aspx pages.
+#
+#   python src/benchmarks/bench_parse.py                   # synthetic pages
+#   python src/benchmarks/bench_parse.py --pages saved/    # saved responses (*.html)
+#
+# Saved pages are classified by name: files containing "dataq" are meter pages,
+# everything else is treated as a report2 page. Compares the original
+# pd.read_html path with crawler.epower's table extraction and checks that
+# both give the same values.
+
+src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(src_dir)
+
+from crawler.epower import parse_report_page, parse_meter_page
+
+LAYOUT = """<html><head><title>NTU epower</title></head><body>
+<form method="post" action="./{page}" id="form1">
+<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{viewstate}" />
+<table width="100%" border="0"><tr><td>臺灣大學 電力監控系統</td><td><a href="../index.aspx">首頁</a></td></tr></table>
+{table}
+</form></body></html>"""
+
+
+def make_report_page(n_buildings=25, seed=0):
+    rng = np.random.default_rng(seed)
+    names = [f"館舍{i:02d}" for i in range(n_buildings)]
+    rows = [f'<tr><td colspan="{n_buildings + 1}">日報表 2026/01/01</td></tr>']
+    rows.append("<tr><td>時間</td>" + "".join(f"<td>{n}</td>" for n in names) + "</tr>")
+    rows.append("<tr><td>單位</td>" + "<td>kW</td>" * n_buildings + "</tr>")
+    for h in range(24):
+        cells = []
+        for _ in names:
+            cells.append("---" if rng.random() < 0.05 else f"{rng.random() * 900:.2f}")
+        rows.append(f"<tr><td>{h:02d}:00</td>" + "".join(f"<td>{c}</td>" for c in cells) + "</tr>")
+    rows.append("<tr><td>合計</td>" + "<td>&nbsp;</td>" * n_buildings + "</tr>")
+    table = '<table id="GridView1" cellspacing="0" rules="all" border="1">\n' + "\n".join(rows) + "\n</table>"
+    return LAYOUT.format(page="report2.aspx", viewstate="x" * 4000, table=table)
+
+
+def make_meter_page(days=5, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = ["<tr><td>編號</td><td>電表</td><td>時間</td><td>用電量(kWh)</td></tr>"]
+    for h in range(days * 24):
+        value = "---" if rng.random() < 0.05 else f"{rng.random() * 300:.2f}"
+        rows.append(f"<tr><td>{h + 1}</td><td>01A_P1_01</td><td>2026/01/{1 + h // 24:02d} {h % 24:02d}:00</td><td>{value}</td></tr>")
+    table = '<table id="GridView1" cellspacing="0" rules="all" border="1">\n' + "\n".join(rows) + "\n</table>"
+    return LAYOUT.format(page="dataq.aspx", viewstate="x" * 4000, table=table)
+
+
+# The parsers used before crawler.epower got its own table extraction
+def legacy_report(page):
+    dfs = pd.read_html(StringIO(page))
+    if len(dfs) <= 1:
+        return None
+    data = dfs[1].copy()
+    data.columns = data.iloc[1]
+    data = data.iloc[3:27]
+    table = data.apply(lambda col: pd.to_numeric(col.replace('---', np.nan), errors='coerce'))
+    return table.reset_index(drop=True)
+
+
+def legacy_meter(page):
+    dfs = pd.read_html(StringIO(page))
+    if len(dfs) <= 1:
+        return None
+    values = dfs[1].iloc[1:, 3].replace('---', np.nan)
+    return pd.to_numeric(values, errors='coerce').to_numpy(dtype=float)
+
+
+def same(a, b):
+    if isinstance(a, pd.DataFrame):
+        if list(a.columns) != list(b.columns):
+            return False
+        a, b = a.to_numpy(dtype=float), b.to_numpy(dtype=float)
+    return a.shape == b.shape and np.allclose(a, b, equal_nan=True)
+
+
+def bench(fn, pages, min_time=1.0):
+    n = 0
+    t0 = time.perf_counter()
+    while True:
+        for page in pages:
+            fn(page)
+        n += len(pages)
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time:
+            return elapsed / n
+
+
+def main():
+    import argparse
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", help="directory of saved *.html responses")
+    ap.add_argument("--count", type=int, default=20, help="synthetic pages per kind")
+    ap.add_argument("--min-time", type=float, default=1.0, help="seconds per measurement")
+    args = ap.parse_args()
+
+    if args.pages:
+        report_pages, meter_pages = [], []
+        for path in sorted(glob.glob(os.path.join(args.pages, "*.html"))):
+            with open(path, "r", encoding="utf-8") as f:
+                (meter_pages if "dataq" in os.path.basename(path) else report_pages).append(f.read())
+    else:
+        report_pages = [make_report_page(seed=i) for i in range(args.count)]
+        meter_pages = [make_meter_page(seed=i) for i in range(args.count)]
+
+    try:
+        import lxml  # noqa: F401  (pd.read_html needs it)
+        has_lxml = True
+    except ImportError:
+        has_lxml = False
+        print("lxml not installed: only the new parsers are timed")
+
+    print(f"{'page':<8} {'pages':>6} {'read_html ms':>13} {'epower ms':>10} {'speedup':>8} {'pages/s':>9}")
+    for kind, pages, new, old in (
+        ("report2", report_pages, parse_report_page, legacy_report),
+        ("dataq", meter_pages, parse_meter_page, legacy_meter),
+    ):
+        if not pages:
+            continue
+        t_new = bench(new, pages, args.min_time)
+        if has_lxml:
+            mismatched = sum(not same(new(p), old(p)) for p in pages)
+            if mismatched:
+                print(f"{kind}: {mismatched} page(s) parsed differently from read_html")
+            t_old = bench(old, pages, args.min_time)
+            print(f"{kind:<8} {len(pages):>6} {t_old * 1e3:13.2f} {t_new * 1e3:10.2f} {t_old / t_new:7.1f}x {1 / t_new:9.0f}")
+        else:
+            print(f"{kind:<8} {len(pages):>6} {'-':>13} {t_new * 1e3:10.2f} {'-':>8} {1 / t_new:9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import os
+import sys
+import json
+import time
+import glob
+import shutil
+import resource
+import tempfile
+import subprocess
+from datetime import date, datetime, timedelta
+
+# Benchmark: the crawl-and-merge pipeline against a local replay server.
+#
+#   python src/benchmarks/bench_pipeline.py                          # all scenarios
+#   python src/benchmarks/bench_pipeline.py --scenario daily --latency 0.05
+#   python src/benchmarks/bench_pipeline.py --scenario backfill --days 90 --meters 20
+#   python src/benchmarks/bench_pipeline.py --recorded saved/        # replay recorded responses
+#
+# Scenarios (each in its own subprocess and scratch copy of data/):
+#   daily      one day of buildings, meters and settlement (a normal daily run)
+#   backfill   --days days of buildings, meters and settlement (custom range re-crawl)
+#   generator  download one opendata snapshot and merge it into a --gen-days master
+#   poll       --polls conditional polls of the same snapshot (first merges, rest are 304s)
+#
+# Reported per scenario: wall time, requests served, bytes written to disk and
+# peak RSS. All crawler hosts are routed to the replay server through
+# transport.configure(host, base_url=...), so nothing touches the live servers.
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.dirname(bench_dir)
+root_dir = os.path.dirname(src_dir)
+sys.path.append(src_dir)
+sys.path.append(bench_dir)
+
+from replay_server import ReplayServer, point_crawlers_at
+
+SCENARIOS = ("daily", "backfill", "generator", "poll")
+SEED_DIRS = ("ntu_building", "taipower_ancillary")
+
+
+def io_written():
+    # Bytes this process caused to be written to storage (Linux), else bytes passed to write()
+    try:
+        with open("/proc/self/io") as f:
+            stats = dict(line.split(": ") for line in f.read().splitlines())
+        return int(stats["write_bytes"]) or int(stats["wchar"])
+    except (OSError, KeyError, ValueError):
+        return 0
+
+
+def seed_workdir(work_dir, seed_data):
+    # Copy the small datasets; the meter store and generator masters are built by the scenarios
+    data_dir = os.path.join(work_dir, "data")
+    os.makedirs(data_dir, exist_ok=True)
+    for name in SEED_DIRS:
+        src = os.path.join(seed_data, name)
+        if os.path.isdir(src):
+            shutil.copytree(src, os.path.join(data_dir, name))
+    meter_src = os.path.join(seed_data, "ntu_meter")
+    meter_dst = os.path.join(data_dir, "ntu_meter")
+    os.makedirs(meter_dst, exist_ok=True)
+    for path in glob.glob(os.path.join(meter_src, "meters_*.*")):
+        shutil.copy(path, meter_dst)
+    if os.path.isdir(os.path.join(meter_src, ".checkpoints")):
+        shutil.copytree(os.path.join(meter_src, ".checkpoints"), os.path.join(meter_dst, ".checkpoints"))
+
+
+def make_generator_master(directory, days, units):
+    from process.organize_taipower_data import save_json
+
+    os.makedirs(directory, exist_ok=True)
+    end = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=1)
+    start = max(end - timedelta(days=days), datetime(end.year, 1, 1))
+    records = []
+    ts = start
+    while ts <= end:
+        stamp = ts.strftime("%Y-%m-%dT%H:%M:%S")
+        for u in range(units):
+            records.append({"DATETIME": stamp, "FUEL_TYPE": "燃煤" if u % 3 == 0 else "燃氣", "UNIT_NAME": f"機組{u:03d}", "NET_P": "1.0"})
+        ts += timedelta(minutes=10)
+    save_json(os.path.join(directory, f"generator_{end.year}.json"), {"records": {
+        "CATALOG": "bench", "START_DATE": records[0]["DATETIME"], "END_DATE": records[-1]["DATETIME"],
+        "UNIT_OF_MEASUREMENT": "MW", "INTERVAL": "10min", "NET_P": records,
+    }})
+
+
+# --- Scenario bodies (run inside the child process, cwd = scratch dir) ---
+
+def run_crawlers(start, end, meters):
+    import run
+
+    if meters:
+        run.meter_name_map = dict(list(run.meter_name_map.items())[:meters])
+    run.update_buildings(start, end)
+    run.update_meters(start, end)
+    run.update_settlement(start, end)
+
+
+def run_generator(backend, polls=1):
+    from crawler import crawler_generate
+
+    gen_dir = os.path.join("data", "taipower_generators")
+    registry = {}
+    for _ in range(polls):
+        crawler_generate.update_dataset(crawler_generate.url1, gen_dir, "NET_P", "generator", registry, backend)
+
+
+def run_scenario(args):
+    os.chdir(args.workdir)
+    point_crawlers_at(args.server)
+    t0 = time.perf_counter()
+    if args.run == "daily":
+        day = args.date.isoformat()
+        run_crawlers(day, day, args.meters)
+    elif args.run == "backfill":
+        first = (args.date - timedelta(days=args.days - 1)).isoformat()
+        run_crawlers(first, args.date.isoformat(), args.meters)
+    else:
+        run_generator(args.backend, args.polls if args.run == "poll" else 1)
+    wall = time.perf_counter() - t0
+    # ru_maxrss is in KiB on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"wall": wall, "written": io_written(), "peak_kib": peak}))
+
+
+# --- Driver ---
+
+def measure(scenario, server, args):
+    work_dir = tempfile.mkdtemp(prefix=f"bench_{scenario}_")
+    try:
+        seed_workdir(work_dir, args.seed)
+        if scenario in ("generator", "poll"):
+            make_generator_master(os.path.join(work_dir, "data", "taipower_generators"), args.gen_days, args.units)
+        cmd = [
+            sys.executable, __file__, "--run", scenario, "--server", server.url, "--workdir", work_dir,
+            "--date", args.date.isoformat(), "--days", str(args.days), "--backend", args.backend,
+            "--polls", str(args.polls),
+        ]
+        if args.meters:
+            cmd += ["--meters", str(args.meters)]
+        server.reset_counters()
+        out = subprocess.run(cmd, capture_output=True, text=True)
+        if out.returncode != 0:
+            print(out.stdout[-2000:], out.stderr[-4000:])
+            raise RuntimeError(f"scenario {scenario} failed")
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        result["requests"] = server.requests
+        result["received"] = server.bytes_sent
+        return result
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    import argparse
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scenario", choices=SCENARIOS, action="append", help="scenario(s) to run (default: all)")
+    ap.add_argument("--latency", type=float, default=0.0, help="replay server latency per request (s)")
+    ap.add_argument("--recorded", help="directory of recorded responses (see replay_server.py)")
+    ap.add_argument("--seed", default=os.path.join(root_dir, "data"), help="data directory to copy as the starting state")
+    ap.add_argument("--date", type=date.fromisoformat, default=date.today() - timedelta(days=1), help="last day to crawl")
+    ap.add_argument("--days", type=int, default=365, help="days in the backfill scenario")
+    ap.add_argument("--meters", type=int, help="only crawl the first N meters")
+    ap.add_argument("--gen-days", type=int, default=30, help="days in the synthetic generator master")
+    ap.add_argument("--units", type=int, default=320, help="generator units per snapshot")
+    ap.add_argument("--polls", type=int, default=10, help="polls in the poll scenario")
+    ap.add_argument("--backend", default="json", help="organize_taipower_data backend for the generator scenario")
+    ap.add_argument("--run", choices=SCENARIOS, help=argparse.SUPPRESS)
+    ap.add_argument("--server", help=argparse.SUPPRESS)
+    ap.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.run:
+        run_scenario(args)
+        return
+
+    server = ReplayServer(latency=args.latency, recorded=args.recorded, opendata_units=args.units).start()
+    try:
+        results = {}
+        for scenario in args.scenario or SCENARIOS:
+            print(f"Running {scenario}...")
+            results[scenario] = measure(scenario, server, args)
+    finally:
+        server.stop()
+
+    print(f"{'scenario':<10} {'wall s':>8} {'requests':>9} {'recv MB':>8} {'written MB':>11} {'peak RSS MB':>12}")
+    for scenario, r in results.items():
+        print(f"{scenario:<10} {r['wall']:8.2f} {r['requests']:9d} {r['received'] / 1e6:8.1f} {r['written'] / 1e6:11.1f} {r['peak_kib'] / 1024:12.0f}")
+
+
+if __name__ == "__main__":
+    main()
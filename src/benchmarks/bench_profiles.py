@@ -0,0 +1,104 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Benchmark: rolling means and seasonal week profiles of many hourly series.
+#
+#   python src/benchmarks/bench_profiles.py                      # 300 columns x 3 years
+#   python src/benchmarks/bench_profiles.py --columns 800 --years 5
+#   python src/benchmarks/bench_profiles.py --csv merged_dorms.csv
+#
+# Compares process.profiles.compute (all columns in one pass) with the
+# per-column pandas code process_dorms used before (rolling + month -> season
+# map + groupby(weekday, hour)), which is timed on --legacy-columns columns and
+# extrapolated, and checks that both give the same values.
+
+src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(src_dir)
+
+from process.profiles import SEASONS, compute
+
+
+def make_frame(columns, years, missing=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2023-01-01", periods=years * 365 * 24, freq="h", name="Datetime")
+    hour = index.hour.to_numpy()[:, None]
+    values = 50 + 30 * np.sin(hour / 24 * 2 * np.pi) + rng.normal(0, 5, (len(index), columns))
+    values[rng.random(values.shape) < missing] = np.nan
+    return pd.DataFrame(values.astype(np.float32), index=index, columns=[f"meter{i:04d}" for i in range(columns)])
+
+
+def get_season(month):
+    if month in [3, 4, 5]:
+        return 'Spring (春)'
+    elif month in [6, 7, 8]:
+        return 'Summer (夏)'
+    elif month in [9, 10, 11]:
+        return 'Autumn (秋)'
+    else:
+        return 'Winter (冬)'
+
+
+def legacy(series):
+    # What process_dorms did per dorm before profiles.compute
+    weekly = series.rolling(window=24*7, min_periods=1).mean()
+    monthly = series.rolling(window=24*30, min_periods=1).mean()
+    df_profile = series.to_frame('value')
+    df_profile['weekday'] = df_profile.index.dayofweek
+    df_profile['hour'] = df_profile.index.hour
+    df_profile['season'] = df_profile.index.month.map(get_season)
+    full_idx = pd.MultiIndex.from_product([range(7), range(24)], names=['weekday', 'hour'])
+    profile = np.full((len(SEASONS), 168), np.nan)
+    for i, season in enumerate(SEASONS):
+        season_data = df_profile[df_profile['season'] == season]
+        if not season_data.empty:
+            profile[i] = season_data.groupby(['weekday', 'hour'])['value'].mean().reindex(full_idx).values
+    return weekly, monthly, profile
+
+
+def main():
+    import argparse
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--csv", help="wide hourly CSV (e.g. merged_dorms.csv) instead of synthetic data")
+    ap.add_argument("--columns", type=int, default=300)
+    ap.add_argument("--years", type=int, default=3)
+    ap.add_argument("--legacy-columns", type=int, default=10, help="columns timed with the per-column code")
+    args = ap.parse_args()
+
+    if args.csv:
+        df = pd.read_csv(args.csv, index_col=0, parse_dates=True).astype(np.float32)
+    else:
+        df = make_frame(args.columns, args.years)
+    print(f"{df.shape[1]} columns x {len(df)} hours")
+
+    t0 = time.perf_counter()
+    result = compute(df)
+    t_new = time.perf_counter() - t0
+
+    n = min(args.legacy_columns, df.shape[1])
+    t0 = time.perf_counter()
+    old = [legacy(df.iloc[:, i].astype(np.float64)) for i in range(n)]
+    t_old = (time.perf_counter() - t0) / max(n, 1) * df.shape[1]
+
+    # compute() works on the hourly grid; compare on the rows the legacy code saw
+    rows = result["index"].get_indexer(df.index)
+    mismatched = 0
+    for i, (weekly, monthly, profile) in enumerate(old):
+        ok = (np.allclose(result["rolling"][7][rows, i], weekly, rtol=1e-4, equal_nan=True)
+              and np.allclose(result["rolling"][30][rows, i], monthly, rtol=1e-4, equal_nan=True)
+              and np.allclose(result["profiles"][:, :, i], profile, rtol=1e-4, equal_nan=True))
+        mismatched += not ok
+    if mismatched:
+        print(f"{mismatched} of {n} column(s) differ from the per-column code")
+
+    print(f"{'variant':<12} {'seconds':>9}")
+    print(f"{'per-column':<12} {t_old:9.2f}  (extrapolated from {n} columns)")
+    print(f"{'compute':<12} {t_new:9.2f}  {t_old / t_new:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
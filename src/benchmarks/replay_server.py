@@ -0,0 +1,256 @@
+import os
+import sys
+import json
+import time
+import zlib
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+# Local stand-in for the NTU epower and Taipower servers, for benchmarks.
+#
+#   python src/benchmarks/replay_server.py --port 8765 --latency 0.05
+#   python src/benchmarks/replay_server.py --recorded saved/        # serve recorded responses first
+#
+# Serves the four endpoints the crawlers use, at a configurable latency:
+#
+#   POST /fn4/report2.aspx                         report2/{ctg}_{YYYY-MM-DD}.html
+#   POST /fn2/dataq.aspx                           dataq/{meter}_{YYYY-MM-DD}_{YYYY-MM-DD}.html
+#   GET  /api/infoboard/settle_value/query         settlement/{YYYY-MM-DD}.json
+#   GET  /data/opendata/apply/file/{id}/001.json   opendata/{id}.json
+#
+# A response is taken from the recorded directory (paths on the right) when
+# present, otherwise generated: same table layout / JSON shape as the live
+# servers, deterministic values. GET responses carry an ETag and answer a
+# matching If-None-Match with 304. Crawlers are pointed here with
+# transport.configure(host, base_url=server.url, verify=False).
+
+src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(src_dir)
+
+HOSTS = ("epower.ga.ntu.edu.tw", "etp.taipower.com.tw", "service.taipower.com.tw")
+
+SETTLEMENT_FIELDS = [
+    "tranDate", "tranHour", "marginalPrice", "regBid", "regBidQse", "regBidNontrade", "regDemand", "regOffering",
+    "regPrice", "regRegistered", "srBid", "srBidQse", "srBidNontrade", "srDemand", "srOffering", "srPrice",
+    "srRegistered", "supBid", "supBidQse", "supBidNontrade", "supDemand", "supOffering", "supPrice", "supRegistered",
+    "edregBid", "edregPrice",
+]
+
+LAYOUT = """<html><head><title>NTU epower</title></head><body>
+<form method="post" action="./{page}" id="form1">
+<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{viewstate}" />
+<table width="100%" border="0"><tr><td>臺灣大學 電力監控系統</td><td><a href="../index.aspx">首頁</a></td></tr></table>
+{table}
+</form></body></html>"""
+
+
+def _rng(*key):
+    # Stable across processes (str hashes are salted)
+    return np.random.default_rng(zlib.crc32(repr(key).encode("utf-8")))
+
+
+def report_page(names, date_str):
+    rng = _rng("report", date_str, len(names))
+    rows = [f'<tr><td colspan="{len(names) + 1}">日報表 {date_str}</td></tr>']
+    rows.append("<tr><td>時間</td>" + "".join(f"<td>{n}</td>" for n in names) + "</tr>")
+    rows.append("<tr><td>單位</td>" + "<td>kW</td>" * len(names) + "</tr>")
+    values = rng.random((24, len(names))) * 900
+    for h in range(24):
+        rows.append(f"<tr><td>{h:02d}:00</td>" + "".join(f"<td>{v:.2f}</td>" for v in values[h]) + "</tr>")
+    table = '<table id="GridView1" cellspacing="0" rules="all" border="1">\n' + "\n".join(rows) + "\n</table>"
+    return LAYOUT.format(page="report2.aspx", viewstate="x" * 4000, table=table)
+
+
+def meter_page(meter, first, last):
+    hours = int((last - first).total_seconds() // 3600) + 1
+    rng = _rng("meter", meter, first.isoformat())
+    rows = ["<tr><td>編號</td><td>電表</td><td>時間</td><td>用電量(kWh)</td></tr>"]
+    for h, v in enumerate(rng.random(hours) * 300):
+        ts = first + timedelta(hours=h)
+        rows.append(f"<tr><td>{h + 1}</td><td>{meter}</td><td>{ts:%Y/%m/%d %H:%M}</td><td>{v:.2f}</td></tr>")
+    table = '<table id="GridView1" cellspacing="0" rules="all" border="1">\n' + "\n".join(rows) + "\n</table>"
+    return LAYOUT.format(page="dataq.aspx", viewstate="x" * 4000, table=table)
+
+
+def settlement_payload(date_str):
+    rng = _rng("settlement", date_str)
+    data = []
+    for h in range(24):
+        row = {field: round(float(v), 3) for field, v in zip(SETTLEMENT_FIELDS[2:], rng.random(len(SETTLEMENT_FIELDS) - 2) * 1000)}
+        row = {"tranDate": date_str, "tranHour": f"{h:02d}:00", **row}
+        data.append(row)
+    return {"code": 200, "data": data}
+
+
+def opendata_payload(dataset, now=None, units=320):
+    # One 10-minute snapshot (the live files hold the latest readings)
+    now = now or datetime.now()
+    ts = now.replace(minute=now.minute - now.minute % 10, second=0, microsecond=0)
+    list_key = "NET_P" if dataset == "d006010" else "FLOW_P"
+    rng = _rng("opendata", dataset, ts.isoformat())
+    records = []
+    for u, v in enumerate(rng.random(units) * 500):
+        records.append({
+            "DATETIME": ts.strftime("%Y-%m-%dT%H:%M:%S"),
+            "FUEL_TYPE": "燃煤" if u % 3 == 0 else "燃氣",
+            "UNIT_NAME": f"機組{u:03d}",
+            list_key: f"{v:.1f}",
+        })
+    stamp = ts.strftime("%Y-%m-%dT%H:%M:%S")
+    return {"records": {
+        "CATALOG": dataset, "START_DATE": stamp, "END_DATE": stamp,
+        "UNIT_OF_MEASUREMENT": "MW", "INTERVAL": "10min", list_key: records,
+    }}
+
+
+class ReplayServer:
+    def __init__(self, port=0, latency=0.0, recorded=None, buildings=None, opendata_units=320):
+        self.latency = latency
+        self.recorded = recorded
+        self.buildings = buildings
+        self.opendata_units = opendata_units
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="replay-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = 0
+            self.bytes_sent = 0
+
+    def _recorded(self, *parts):
+        if not self.recorded:
+            return None
+        path = os.path.join(self.recorded, *parts)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read()
+        return None
+
+    def _building_names(self, ctg):
+        if self.buildings is None:
+            from run import buildings_dict
+            self.buildings = buildings_dict
+        return self.buildings.get(ctg, [])
+
+    def respond(self, method, path, params):
+        """(status, content type, body) for one request."""
+        if path.endswith("/report2.aspx"):
+            ctg = params.get("ctg", "")
+            date_str = params.get("dt1", "").replace("/", "-")
+            body = self._recorded("report2", f"{ctg}_{date_str}.html")
+            if body is None:
+                body = report_page(self._building_names(ctg), date_str).encode("utf-8")
+            return 200, "text/html; charset=utf-8", body
+        if path.endswith("/dataq.aspx"):
+            meter = params.get("build", "")
+            first = datetime.strptime(params.get("dt1", ""), "%Y/%m/%d %H:%M")
+            last = datetime.strptime(params.get("dt2", ""), "%Y/%m/%d %H:%M")
+            body = self._recorded("dataq", f"{meter}_{first:%Y-%m-%d}_{last:%Y-%m-%d}.html")
+            if body is None:
+                body = meter_page(meter, first, last).encode("utf-8")
+            return 200, "text/html; charset=utf-8", body
+        if path.endswith("/settle_value/query"):
+            date_str = params.get("startDate", "")
+            body = self._recorded("settlement", f"{date_str}.json")
+            if body is None:
+                body = json.dumps(settlement_payload(date_str), ensure_ascii=False).encode("utf-8")
+            return 200, "application/json", body
+        if "/opendata/" in path:
+            dataset = path.rstrip("/").split("/")[-2]
+            body = self._recorded("opendata", f"{dataset}.json")
+            if body is None:
+                body = json.dumps(opendata_payload(dataset, units=self.opendata_units), ensure_ascii=False).encode("utf-8")
+            return 200, "application/json", body
+        return 404, "text/plain", b"not found"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _serve(self, method):
+                parts = urlsplit(self.path)
+                params = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    form = self.rfile.read(length).decode("utf-8")
+                    params.update({k: v[-1] for k, v in parse_qs(form).items()})
+                if server.latency:
+                    time.sleep(server.latency)
+                status, content_type, body = server.respond(method, parts.path, params)
+                etag = f'"{zlib.crc32(body):08x}"'
+                if method == "GET" and status == 200 and self.headers.get("If-None-Match") == etag:
+                    status, body = 304, b""
+                with server._lock:
+                    server.requests += 1
+                    server.bytes_sent += len(body)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                if method == "GET" and status in (200, 304):
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def point_crawlers_at(url):
+    """Route every crawler host through the transport layer to `url`."""
+    try:
+        from crawler import transport
+    except ImportError:
+        import transport
+    for host in HOSTS:
+        transport.configure(host, base_url=url, verify=False)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Replay server for the crawler benchmarks")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    ap.add_argument("--recorded", help="directory of recorded responses (see the layout above)")
+    args = ap.parse_args()
+
+    server = ReplayServer(args.port, args.latency, args.recorded)
+    print(f"Serving on {server.url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
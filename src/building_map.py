@@ -0,0 +1,114 @@
+import os
+import bisect
+import hashlib
+import pickle
+
+import numpy as np
+import pandas as pd
+
+# Compiled index over 台大台電獨立電號表 for building -> (campus, feeder, subject).
+#
+# Same matching rules as the old iterrows scans: the first row (in file order)
+# whose normalized 館舍名稱 contains the building name, else the first row whose
+# 地點 contains it. "Contains" is answered with a sorted suffix list per column
+# (binary search for the suffixes starting with the name) plus a sparse-table
+# minimum over their row numbers, so a lookup is O(log n) instead of a scan.
+# The compiled index is pickled under data/.cache, keyed by the source file hash.
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(SRC_DIR)
+MAPPING_CSV = os.path.join(BASE_DIR, '台大台電獨立電號表.csv')
+CACHE_DIR = os.path.join(BASE_DIR, 'data', '.cache')
+INDEX_VERSION = 1
+
+
+def normalize(s):
+    return s.replace('台', '臺').replace('(', '').replace(')', '').replace(' ', '')
+
+
+def clean_building_name(name):
+    return name.replace('-', '').replace('台', '臺').replace(' ', '').replace('(', '').replace(')', '')
+
+
+class SubstringIndex:
+    def __init__(self, texts):
+        pairs = []
+        for row, text in enumerate(texts):
+            for j in range(len(text)):
+                pairs.append((text[j:], row))
+        pairs.sort()
+        self.suffixes = [p[0] for p in pairs]
+        owners = np.array([p[1] for p in pairs], dtype=np.int32)
+        # Sparse table: level k holds the minimum row of owners[i:i + 2**k]
+        self.table = [owners]
+        k = 1
+        while (1 << k) <= len(owners):
+            prev = self.table[-1]
+            half = 1 << (k - 1)
+            self.table.append(np.minimum(prev[:-half], prev[half:]))
+            k += 1
+        self.n_rows = len(texts)
+
+    def first_row_containing(self, query):
+        if not query:
+            return 0 if self.n_rows else None
+        lo = bisect.bisect_left(self.suffixes, query)
+        hi = bisect.bisect_left(self.suffixes, query + '\U0010ffff')
+        if lo >= hi:
+            return None
+        k = (hi - lo).bit_length() - 1
+        level = self.table[k]
+        return int(min(level[lo], level[hi - (1 << k)]))
+
+
+class TaipowerMapIndex:
+    def __init__(self, df):
+        match_name = df['館舍名稱'].fillna('').astype(str).map(normalize).tolist()
+        match_loc = df['地點'].fillna('').astype(str).map(normalize).tolist()
+        self.values = list(zip(df['校區別'], df['饋線代號'], df['科目']))
+        self.by_name = SubstringIndex(match_name)
+        self.by_loc = SubstringIndex(match_loc)
+        self._memo = {}
+
+    def lookup(self, building_name):
+        """(campus, feeder, subject) for a building, or None when nothing matches."""
+        clean_name = clean_building_name(building_name)
+        if clean_name in self._memo:
+            return self._memo[clean_name]
+        row = self.by_name.first_row_containing(clean_name)
+        if row is None:
+            row = self.by_loc.first_row_containing(clean_name)
+        result = self.values[row] if row is not None else None
+        self._memo[clean_name] = result
+        return result
+
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_index(csv_path=MAPPING_CSV, cache_dir=CACHE_DIR):
+    """Load the compiled index, rebuilding it only when the mapping CSV changed."""
+    digest = file_hash(csv_path)
+    cache_path = os.path.join(cache_dir, f"taipower_map_v{INDEX_VERSION}_{digest[:16]}.pkl")
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f"Warning: Could not read mapping index cache, rebuilding: {e}")
+
+    index = TaipowerMapIndex(pd.read_csv(csv_path, low_memory=False))
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        print(f"Warning: Could not write mapping index cache: {e}")
+    return index
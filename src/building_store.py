@@ -0,0 +1,477 @@
+import os
+import json
+import time
+import queue
+import base64
+import threading
+
+import numpy as np
+import pandas as pd
+
+import frame_cache
+import series_meta
+
+# Storage for the NTU building data (data/ntu_building/{campus}/{feeder}/{subject}.csv).
+#
+# Each {subject}.csv holds all buildings of one feeder/subject as columns with an
+# hourly Datetime index. New data does not rewrite that file: it is appended to
+#
+#   {subject}.log.csv    Datetime,Building,Value   (one row per building-hour, later rows win)
+#
+# and folded back into the CSV when the log grows past COMPACT_RATIO of the CSV,
+# so the bytes written per run follow the amount of new data. Readers outside
+# this class should use load_building_file(), which applies the log.
+#
+#   {subject}.days.json  one bit per building-day: all 24 hours present
+#   {subject}.meta.json  first/last timestamp, row and day counts per building (series_meta)
+#
+# Both sidecars are updated on every write, so deciding where to resume and which
+# days to fetch never needs the data itself. They record the size/mtime of the
+# CSV and log they were saved with and are rebuilt from the data when they no
+# longer match.
+
+LOG_SUFFIX = ".log.csv"
+DAYS_SUFFIX = ".days.json"
+LOG_COLUMNS = ["Datetime", "Building", "Value"]
+# Compact a file once its log is this large relative to the CSV
+COMPACT_RATIO = 0.5
+# Append pending rows to the logs when this many are buffered or this many seconds passed
+FLUSH_ROWS = 24 * 1000
+FLUSH_INTERVAL = 30.0
+
+
+def log_path(file_path):
+    return file_path[:-len(".csv")] + LOG_SUFFIX
+
+
+def days_path(file_path):
+    return file_path[:-len(".csv")] + DAYS_SUFFIX
+
+
+def source_signature(file_path):
+    # (size, mtime_ns) of the CSV and its log; None for a missing file
+    return series_meta.file_signature([file_path, log_path(file_path)])
+
+
+def complete_days(series):
+    """Boolean Series indexed by day: True where all 24 hours of the day have a value."""
+    counts = series.notna().groupby(series.index.normalize()).sum()
+    return counts == 24
+
+
+class DayBitmap:
+    """Per-building, per-year bitmaps of complete days."""
+
+    def __init__(self, source=None):
+        self.source = source
+        self.years = {} # building -> {year: bool array (one entry per day of the year)}
+
+    @staticmethod
+    def _year_bits(year):
+        return np.zeros(366 if pd.Timestamp(year=year, month=1, day=1).is_leap_year else 365, dtype=bool)
+
+    def mark(self, building, days, complete):
+        """Set the bits of `days` (midnight timestamps) to `complete`."""
+        days = pd.DatetimeIndex(days)
+        complete = np.asarray(complete, dtype=bool)
+        by_year = self.years.setdefault(building, {})
+        for year in np.unique(days.year):
+            in_year = days.year == year
+            bits = by_year.setdefault(int(year), self._year_bits(int(year)))
+            bits[days[in_year].dayofyear - 1] = complete[in_year]
+
+    def is_complete(self, building, days):
+        """Boolean array, one entry per day in `days`."""
+        days = pd.DatetimeIndex(days)
+        result = np.zeros(len(days), dtype=bool)
+        by_year = self.years.get(building)
+        if not by_year:
+            return result
+        for year in np.unique(days.year):
+            bits = by_year.get(int(year))
+            if bits is not None:
+                in_year = days.year == year
+                result[in_year] = bits[days[in_year].dayofyear - 1]
+        return result
+
+    def first_complete(self, building):
+        """First complete day of a building, or None."""
+        for year, bits in sorted(self.years.get(building, {}).items()):
+            hits = np.flatnonzero(bits)
+            if len(hits):
+                return pd.Timestamp(year=year, month=1, day=1) + pd.Timedelta(days=int(hits[0]))
+        return None
+
+    @classmethod
+    def from_frame(cls, df, source=None):
+        bitmap = cls(source)
+        if df.empty:
+            return bitmap
+        for building in df.columns:
+            complete = complete_days(df[building])
+            if complete.any():
+                bitmap.mark(building, complete.index, complete.to_numpy())
+        return bitmap
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        bitmap = cls(data.get("source"))
+        for building, years in data.get("buildings", {}).items():
+            by_year = bitmap.years.setdefault(building, {})
+            for year, packed in years.items():
+                n = len(cls._year_bits(int(year)))
+                bits = np.unpackbits(np.frombuffer(base64.b64decode(packed), dtype=np.uint8), count=n)
+                by_year[int(year)] = bits.astype(bool)
+        return bitmap
+
+    def save(self, path):
+        data = {
+            "source": self.source,
+            "buildings": {
+                building: {str(year): base64.b64encode(np.packbits(bits).tobytes()).decode('ascii') for year, bits in years.items()}
+                for building, years in self.years.items()
+            },
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def apply_log(df, log_df):
+    """Overlay log rows (Datetime, Building, Value) onto a wide DataFrame; later rows win."""
+    if log_df.empty:
+        return df
+    log_df = log_df.drop_duplicates(subset=["Datetime", "Building"], keep="last")
+    combined_idx = df.index.union(pd.DatetimeIndex(log_df["Datetime"].unique())).sort_values()
+    df = df.reindex(combined_idx)
+    df.index.name = "Datetime"
+    for building, rows in log_df.groupby("Building", sort=False):
+        values = pd.Series(rows["Value"].to_numpy(dtype=float), index=pd.DatetimeIndex(rows["Datetime"]))
+        if building in df.columns:
+            df.loc[values.index, building] = values
+        else:
+            df[building] = values
+    return df
+
+
+def read_log(path):
+    # A run killed mid-append can leave a torn last line; skip it
+    log_df = pd.read_csv(path, on_bad_lines="skip")
+    log_df["Datetime"] = pd.to_datetime(log_df["Datetime"], errors="coerce")
+    log_df["Value"] = pd.to_numeric(log_df["Value"], errors="coerce")
+    return log_df.dropna(subset=["Datetime", "Building"])
+
+
+def _parse_building_csv(file_path):
+    df = pd.read_csv(file_path)
+    if "Datetime" in df.columns:
+        df["Datetime"] = pd.to_datetime(df["Datetime"])
+        df.set_index("Datetime", inplace=True)
+    return df
+
+
+def load_building_file(file_path, float_dtype=None, mmap=False):
+    """
+    Read a {subject}.csv together with its pending log. The CSV itself comes from
+    frame_cache while it is unchanged (float_dtype / mmap as in cached_frame).
+    """
+    if os.path.exists(file_path):
+        df = frame_cache.cached_frame(file_path, "building", _parse_building_csv, float_dtype, mmap)
+    else:
+        df = pd.DataFrame()
+    path = log_path(file_path)
+    if os.path.exists(path):
+        if df.empty:
+            df = pd.DataFrame(index=pd.DatetimeIndex([], name="Datetime"))
+        df = apply_log(df, read_log(path))
+    return df
+
+
+class BuildingDataManager:
+    def __init__(self, base_dir="data/ntu_building"):
+        self.base_dir = base_dir
+        # Cache for loaded DataFrames: key=(campus, feeder, subject), value=DataFrame
+        self.cache = {}
+        # Track modified files
+        self.modified = set()
+        # Rows not yet appended to the logs: key -> [DataFrame(Datetime, Building, Value)]
+        self.pending = {}
+        self.pending_rows = 0
+        self.last_flush = time.monotonic()
+        self.bytes_written = 0
+        # Day-completeness bitmaps: key -> DayBitmap
+        self.days = {}
+        # Per-building summaries (series_meta): key -> {building: summary}
+        self.meta = {}
+
+    def _clean(self, s):
+        # Remove invalid characters for filenames
+        s = str(s).strip().replace('/', '_').replace('\\', '_').replace(':', '_')
+        if not s or s.lower() == 'nan':
+            return "Unknown"
+        return s
+
+    def _get_key(self, campus, feeder, subject):
+        return (self._clean(campus), self._clean(feeder), self._clean(subject))
+
+    def _get_file_path(self, key):
+        campus, feeder, subject = key
+        # Determine specific save directory
+        save_dir = os.path.join(self.base_dir, campus, feeder)
+        if not os.path.exists(save_dir):
+            os.makedirs(save_dir)
+        return os.path.join(save_dir, f"{subject}.csv")
+
+    def load(self, campus, feeder, subject):
+        key = self._get_key(campus, feeder, subject)
+        if key in self.cache:
+            return
+
+        file_path = self._get_file_path(key)
+        try:
+            self.cache[key] = load_building_file(file_path)
+        except Exception as e:
+            print(f"Error reading {file_path}: {e}")
+            self.cache[key] = pd.DataFrame()
+
+    def day_bitmap(self, campus, feeder, subject):
+        key = self._get_key(campus, feeder, subject)
+        if key in self.days:
+            return self.days[key]
+        file_path = self._get_file_path(key)
+        signature = source_signature(file_path)
+        bitmap = None
+        path = days_path(file_path)
+        if os.path.exists(path):
+            try:
+                bitmap = DayBitmap.load(path)
+            except Exception as e:
+                print(f"Warning: Could not read {path}, rebuilding: {e}")
+        if bitmap is None or bitmap.source != signature:
+            # Missing or out of date (files changed outside this class): rebuild from the data
+            self.load(campus, feeder, subject)
+            bitmap = DayBitmap.from_frame(self.cache[key], signature)
+            if signature != [None, None]:
+                bitmap.save(path)
+        self.days[key] = bitmap
+        return bitmap
+
+    def _save_day_bitmap(self, key):
+        if key not in self.days:
+            return
+        file_path = self._get_file_path(key)
+        bitmap = self.days[key]
+        bitmap.source = source_signature(file_path)
+        bitmap.save(days_path(file_path))
+
+    def series_info(self, campus, feeder, subject):
+        """{building: {"first", "last", "rows", "days", "complete_days"}} from the sidecar."""
+        key = self._get_key(campus, feeder, subject)
+        if key not in self.meta:
+            file_path = self._get_file_path(key)
+
+            def build():
+                # Missing or out of date: summarize the data once
+                self.load(campus, feeder, subject)
+                return series_meta.summarize_frame(self.cache[key])
+
+            self.meta[key] = series_meta.cached(file_path, source_signature(file_path), build)
+        return self.meta[key]
+
+    def _save_series_meta(self, key, buildings=None):
+        # Refresh the summaries of the written buildings (all of them if not known yet)
+        df = self.cache[key]
+        if key not in self.meta or buildings is None:
+            series = series_meta.summarize_frame(df)
+        else:
+            series = dict(self.meta[key])
+            for building in buildings:
+                if building in df.columns:
+                    series[building] = series_meta.summarize(df[building])
+        self.meta[key] = series
+        file_path = self._get_file_path(key)
+        series_meta.save(file_path, source_signature(file_path), series)
+
+    def missing_days(self, campus, feeder, subject, building_name, start, end):
+        """Days in [start, end] (midnight timestamps) that do not have all 24 hours of building_name."""
+        days = pd.date_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize(), freq='D')
+        complete = self.day_bitmap(campus, feeder, subject).is_complete(building_name, days)
+        return days[~complete]
+
+    def get_last_date(self, campus, feeder, subject, building_name):
+        # Read from the summary sidecar, so planning an update does not load the CSV
+        return series_meta.last_timestamp(self.series_info(campus, feeder, subject), building_name)
+
+    def add_data(self, campus, feeder, subject, building_name, new_series):
+        key = self._get_key(campus, feeder, subject)
+        self.load(campus, feeder, subject)
+        df = self.cache[key]
+
+        new_df = pd.DataFrame(new_series)
+        new_df.columns = [building_name]
+        new_df.index.name = 'Datetime'
+
+        if df.empty:
+            df = new_df
+        else:
+            # Merge logic: align indices and update/append
+            combined_idx = df.index.union(new_df.index).sort_values()
+            df = df.reindex(combined_idx)
+            if building_name in df.columns:
+                df.loc[new_df.index, building_name] = new_df[building_name]
+            else:
+                df[building_name] = new_df[building_name]
+
+        self.cache[key] = df
+        self.modified.add(key)
+
+        # Re-evaluate the touched days from the merged column
+        bitmap = self.day_bitmap(campus, feeder, subject)
+        days = new_df.index.normalize().unique()
+        column = df[building_name]
+        window = column[(column.index >= days.min()) & (column.index < days.max() + pd.Timedelta(days=1))]
+        complete = complete_days(window).reindex(days, fill_value=False)
+        bitmap.mark(building_name, days, complete.to_numpy())
+        self.pending.setdefault(key, []).append(pd.DataFrame({
+            "Datetime": new_df.index,
+            "Building": building_name,
+            "Value": new_df[building_name].to_numpy(dtype=float),
+        }))
+        self.pending_rows += len(new_df)
+
+    def flush(self, force=False):
+        """Append buffered rows to the logs once FLUSH_ROWS or FLUSH_INTERVAL is reached (or force)."""
+        if not self.pending:
+            return
+        if not force and self.pending_rows < FLUSH_ROWS and time.monotonic() - self.last_flush < FLUSH_INTERVAL:
+            return
+
+        for key, frames in self.pending.items():
+            file_path = self._get_file_path(key)
+            if not os.path.exists(file_path):
+                # Nothing to append to yet: the first write is the full (new) file
+                self.compact(key)
+                continue
+            rows = pd.concat(frames, ignore_index=True)
+            path = log_path(file_path)
+            new_log = not os.path.exists(path)
+            # One write per flush so a crash tears at most the last line
+            text = rows.to_csv(index=False, header=new_log, columns=LOG_COLUMNS, date_format="%Y-%m-%d %H:%M:%S")
+            with open(path, 'a', encoding='utf-8', newline='') as f:
+                f.write(text)
+            self.bytes_written += len(text.encode('utf-8'))
+            if os.path.getsize(path) > COMPACT_RATIO * os.path.getsize(file_path):
+                self.compact(key)
+            else:
+                self.modified.discard(key)
+                self._save_day_bitmap(key)
+                self._save_series_meta(key, rows["Building"].unique())
+
+        self.pending = {}
+        self.pending_rows = 0
+        self.last_flush = time.monotonic()
+
+    def compact(self, key):
+        """Rewrite {subject}.csv from the cache and drop its log."""
+        file_path = self._get_file_path(key)
+        df = self.cache[key]
+        df.sort_index(inplace=True)
+        tmp_path = file_path + ".tmp"
+        df.reset_index().to_csv(tmp_path, index=False)
+        self.bytes_written += os.path.getsize(tmp_path)
+        os.replace(tmp_path, file_path)
+        path = log_path(file_path)
+        if os.path.exists(path):
+            os.remove(path)
+        self.modified.discard(key)
+        self._save_day_bitmap(key)
+        self._save_series_meta(key)
+
+    def compact_all(self):
+        """Fold every pending log under base_dir into its CSV."""
+        self.flush(force=True)
+        count = 0
+        for root, _, files in os.walk(self.base_dir):
+            for name in files:
+                if not name.endswith(LOG_SUFFIX):
+                    continue
+                campus, feeder = os.path.relpath(root, self.base_dir).split(os.sep)[-2:]
+                key = (campus, feeder, name[:-len(LOG_SUFFIX)])
+                self.load(*key)
+                self.compact(key)
+                count += 1
+        return count
+
+    def save_all(self):
+        # Persist everything added so far (appends to the logs, compacting where due)
+        self.flush(force=True)
+
+
+class BuildingWriter:
+    """
+    Single writer thread that owns a BuildingDataManager. Fetchers put
+    (campus, feeder, subject, building, series) results on a queue; the writer
+    batches them per building, merges them into the manager and flushes, so
+    the manager is never touched from more than one thread.
+    """
+
+    def __init__(self, manager, batch_rows=FLUSH_ROWS, idle_timeout=1.0):
+        self.manager = manager
+        self.batch_rows = batch_rows
+        self.idle_timeout = idle_timeout
+        self.queue = queue.Queue()
+        self.error = None
+        self._buffer = {} # (campus, feeder, subject, building) -> [Series]
+        self._buffered_rows = 0
+        self._thread = threading.Thread(target=self._run, name="building-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, campus, feeder, subject, building, series):
+        self.queue.put((campus, feeder, subject, building, series))
+
+    def _merge(self):
+        for (campus, feeder, subject, building), parts in self._buffer.items():
+            series = pd.concat(parts) if len(parts) > 1 else parts[0]
+            series = series[~series.index.duplicated(keep='last')].sort_index()
+            self.manager.add_data(campus, feeder, subject, building, series)
+        self._buffer = {}
+        self._buffered_rows = 0
+        self.manager.flush()
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                # Idle: merge what we have so the logs keep up with the fetchers
+                if self._buffer and self.error is None:
+                    self._safe(self._merge)
+                continue
+            if item is None:
+                break
+            if self.error is not None:
+                continue # Drain after a failure; close() reports it
+            campus, feeder, subject, building, series = item
+            self._buffer.setdefault((campus, feeder, subject, building), []).append(series)
+            self._buffered_rows += len(series)
+            if self._buffered_rows >= self.batch_rows:
+                self._safe(self._merge)
+        if self.error is None:
+            self._safe(self._merge)
+            self._safe(self.manager.save_all)
+
+    def _safe(self, fn):
+        try:
+            fn()
+        except Exception as e:
+            self.error = e
+
+    def close(self):
+        """Merge and persist everything queued so far, then stop the thread."""
+        self.queue.put(None)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
@@ -1,70 +1,133 @@
-import requests
 import os
 import sys
-import shutil
-from datetime import datetime
+import json
+import hashlib
 
 # Add src to path to import process script
 current_dir = os.path.dirname(os.path.abspath(__file__))
 src_dir = os.path.dirname(current_dir)
 sys.path.append(src_dir)
 
-from process.organize_taipower_data import main as organize_data
+from process.organize_taipower_data import process_directory, DEFAULT_BACKEND
+from crawler import transport
 
 root_dir = os.path.dirname(src_dir)
 
 # Define directories
-raw_gen_dir = os.path.join(root_dir, "data", "taipower_generators", "raw")
-raw_flow_dir = os.path.join(root_dir, "data", "taipower_flow", "raw")
 proc_gen_dir = os.path.join(root_dir, "data", "taipower_generators")
 proc_flow_dir = os.path.join(root_dir, "data", "taipower_flow")
 
-# Ensure raw directories exist
-os.makedirs(raw_gen_dir, exist_ok=True)
-os.makedirs(raw_flow_dir, exist_ok=True)
-
-# Temp filenames for processing
-temp_filename1 = os.path.join(proc_gen_dir, "temp_download.json")
-temp_filename2 = os.path.join(proc_flow_dir, "temp_download.json")
+# Snapshot registry: conditional-request validators and hashes of merged snapshots
+registry_path = os.path.join(root_dir, "data", ".cache", "opendata_snapshots.json")
+# Hashes kept per URL; the feed only ever cycles through recent snapshots
+KEEP_HASHES = 50
 
 url1 = "https://service.taipower.com.tw/data/opendata/apply/file/d006010/001.json"
 url2 = "https://service.taipower.com.tw/data/opendata/apply/file/d006009/001.json"
 
-print("START")
-
-# Download Generator Data
-try:
-    response = requests.get(url1, verify=False)
-    if response.status_code == 200:
-        # Save directly to temp for processing
-        with open(temp_filename1, "wb") as file:
-            file.write(response.content)
-        print(f"Generator data ready for processing at {temp_filename1}")
-    else:
-        print(f"Generator download failed: {response.status_code}")
-except Exception as e:
-    print(f"Generator download error: {e}")
-
-# Download Flow Data
-try:
-    response = requests.get(url2, verify=False)
-    if response.status_code == 200:
-        # Save directly to temp for processing
-        with open(temp_filename2, "wb") as file:
-            file.write(response.content)
-        print(f"Flow data ready for processing at {temp_filename2}")
-    else:
-        print(f"Flow download failed: {response.status_code}")
-except Exception as e:
-    print(f"Flow download error: {e}")
-
-# Run Organization
-print("Running organization and merging...")
-try:
-    organize_data()
-    print("Organization complete.")
-except Exception as e:
-    print(f"Organization failed: {e}")
+
+def load_registry(path=registry_path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_registry(registry, path=registry_path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(registry, f, indent=2)
+    os.replace(tmp, path)
+
+
+def download_snapshot(url, temp_path, entry):
+    """
+    Conditional GET of one opendata file. Writes temp_path and returns its sha256
+    only when the server sent a snapshot that has not been merged before.
+    """
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    response = transport.get(url, headers=headers)
+    if response.status_code == 304:
+        print(f"Not modified: {url}")
+        return None
+    if response.status_code != 200:
+        entry["error"] = f"HTTP {response.status_code}"
+        print(f"Download failed: {response.status_code} {url}")
+        return None
+
+    digest = hashlib.sha256(response.content).hexdigest()
+    # Validators are stored only after a successful merge, see update_dataset
+    entry["pending"] = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+    try:
+        entry["pending"]["end_date"] = json.loads(response.content)["records"]["END_DATE"]
+    except (ValueError, KeyError, TypeError):
+        pass
+    if digest in entry.get("hashes", []):
+        print(f"Unchanged snapshot (already merged): {url}")
+        pending = entry.pop("pending")
+        pending.pop("end_date", None)
+        entry.update(pending)
+        return None
+
+    with open(temp_path, "wb") as file:
+        file.write(response.content)
+    return digest
+
+
+def update_dataset(url, directory, list_key, file_prefix, registry, backend=DEFAULT_BACKEND, cache=None):
+    """
+    Download url into directory and merge it, unless the snapshot is unchanged. Returns True if merged;
+    registry[url]["error"] holds the reason of a failed attempt.
+    """
+    os.makedirs(os.path.join(directory, "raw"), exist_ok=True)
+    temp_path = os.path.join(directory, "temp_download.json")
+    entry = registry.setdefault(url, {})
+    entry.pop("error", None)
+    try:
+        digest = download_snapshot(url, temp_path, entry)
+    except Exception as e:
+        entry.pop("pending", None)
+        entry["error"] = f"download: {e}"
+        print(f"Download error: {e}")
+        return False
+    if digest is None:
+        return False
+
+    print(f"{file_prefix} data ready for processing at {temp_path}")
+    try:
+        process_directory(directory, list_key, file_prefix, backend=backend, cache=cache)
+    except Exception as e:
+        # Keep the old validators so the next poll downloads the snapshot again
+        entry.pop("pending", None)
+        entry["error"] = f"merge: {e}"
+        print(f"Organization failed: {e}")
+        return False
+    entry.update(entry.pop("pending"))
+    entry["hashes"] = (entry.get("hashes", []) + [digest])[-KEEP_HASHES:]
+    return True
+
+
+def main(backend=DEFAULT_BACKEND):
+    print("START")
+    registry = load_registry()
+    try:
+        # Only changed snapshots are written, parsed and merged
+        update_dataset(url1, proc_gen_dir, "NET_P", "generator", registry, backend)
+        update_dataset(url2, proc_flow_dir, "FLOW_P", "flow", registry, backend)
+    finally:
+        save_registry(registry)
+    print("Done.")
+
+
+if __name__ == "__main__":
+    main()
 
 
 # import json
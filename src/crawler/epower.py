@@ -0,0 +1,246 @@
+import re
+import html
+import asyncio
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+try:
+    from crawler import transport
+except ImportError:
+    import transport
+
+# Fetch layer for the NTU epower report pages.
+#
+# report2.aspx returns, for one category (ctg) and one day, a table with the
+# hourly demand of every building in that category. We request each
+# (ctg, date) page once and let the caller fan the table out to all buildings.
+
+REPORT_URL = 'https://epower.ga.ntu.edu.tw/fn4/report2.aspx'
+METER_URL = 'https://epower.ga.ntu.edu.tw/fn2/dataq.aspx'
+# Upper bound only: transport's adaptive limiter decides how many requests are in flight
+DEFAULT_CONCURRENCY = 16
+
+
+# --- Table extraction ---
+#
+# Both pages are ASP.NET forms whose data sit in the second <table> of the
+# document (the first is the page layout). pd.read_html builds every table on
+# the page through lxml before we slice one out, so the parsers below locate
+# that table with regexes, read its cells as strings and convert them to
+# float in one pass. Cell positions follow read_html (header rows made of <th>
+# are not data rows, colspan/rowspan are expanded) so the same iloc offsets
+# apply. Anything the fast path cannot shape falls back to pd.read_html.
+
+_TABLE_TAG = re.compile(r'<(/?)table\b[^>]*>', re.I)
+_TR = re.compile(r'<tr\b[^>]*>(.*?)</tr\s*>', re.I | re.S)
+_CELL = re.compile(r'<(t[dh])\b([^>]*)>(.*?)</t[dh]\s*>', re.I | re.S)
+_SPAN = re.compile(r'\b(colspan|rowspan)\s*=\s*["\']?(\d+)', re.I)
+_THEAD = re.compile(r'<thead\b[^>]*>(.*?)</thead\s*>', re.I | re.S)
+_TAG = re.compile(r'<[^>]*>')
+
+
+def _tables(page):
+    """(start, end, inner) of every <table> in document order, nested tables cut out of inner."""
+    spans = []
+    stack = []
+    for m in _TABLE_TAG.finditer(page):
+        if not m.group(1):
+            stack.append((m.start(), m.end(), []))
+        elif stack:
+            start, inner_start, children = stack.pop()
+            spans.append((start, m.end(), inner_start, m.start(), children))
+            if stack:
+                stack[-1][2].append((start, m.end()))
+    spans.sort()
+    tables = []
+    for start, end, inner_start, inner_end, children in spans:
+        parts = []
+        pos = inner_start
+        for c_start, c_end in children:
+            parts.append(page[pos:c_start])
+            pos = c_end
+        parts.append(page[pos:inner_end])
+        inner = ''.join(parts)
+        # read_html skips tables without any text
+        if _TAG.sub('', inner).strip():
+            tables.append(inner)
+    return tables
+
+
+def _cell_text(raw):
+    if '<' in raw:
+        raw = _TAG.sub('', raw)
+    if '&' in raw:
+        raw = html.unescape(raw)
+    # str.split() also splits on \xa0, like read_html's whitespace cleanup
+    return ' '.join(raw.split())
+
+
+def _parse_rows(fragment):
+    rows = []
+    for tr in _TR.finditer(fragment):
+        cells = []
+        for tag, attrs, raw in _CELL.findall(tr.group(1)):
+            colspan = rowspan = 1
+            if 'span' in attrs.lower():
+                spans = {k.lower(): int(v) for k, v in _SPAN.findall(attrs)}
+                colspan = max(spans.get('colspan', 1), 1)
+                rowspan = max(spans.get('rowspan', 1), 1)
+            cells.append((tag.lower() == 'th', _cell_text(raw), colspan, rowspan))
+        rows.append(cells)
+    return rows
+
+
+def _expand(rows):
+    # Same colspan/rowspan expansion as read_html: spanned text is repeated
+    grid = []
+    pending = {} # column -> (text, rows left)
+    for cells in rows:
+        out = []
+        col = 0
+        queue = list(cells)
+        while queue or col in pending:
+            if col in pending:
+                text, left = pending.pop(col)
+                out.append(text)
+                if left > 1:
+                    pending[col] = (text, left - 1)
+                col += 1
+                continue
+            _, text, colspan, rowspan = queue.pop(0)
+            for _ in range(colspan):
+                out.append(text)
+                if rowspan > 1:
+                    pending[col] = (text, rowspan - 1)
+                col += 1
+        grid.append(out)
+    return grid
+
+
+def extract_table(page, n=1):
+    """
+    Body rows of the n-th table with text, as a 2-D array of str (rows padded
+    with ''), or None when the page has no such table.
+    """
+    tables = _tables(page)
+    if len(tables) <= n:
+        return None
+    inner = tables[n]
+    thead = _THEAD.search(inner)
+    if thead:
+        body = _parse_rows(inner[:thead.start()] + inner[thead.end():])
+    else:
+        body = _parse_rows(inner)
+        while body and body[0] and all(is_th for is_th, _, _, _ in body[0]):
+            body.pop(0)
+    if any(colspan > 1 or rowspan > 1 for row in body for _, _, colspan, rowspan in row):
+        grid = _expand(body)
+    else:
+        grid = [[text for _, text, _, _ in row] for row in body]
+    grid = [row for row in grid if len(row) > 1 or (row and row[0])]
+    if not grid:
+        return None
+    width = max(len(row) for row in grid)
+    return np.array([row + [''] * (width - len(row)) for row in grid], dtype=object)
+
+
+def to_float(cells):
+    """Convert an array of cell strings to float in bulk ('---' and non-numbers -> NaN)."""
+    flat = pd.Series(np.asarray(cells, dtype=object).ravel())
+    flat = flat.str.replace(',', '', regex=False)
+    values = pd.to_numeric(flat.where(flat != '---'), errors='coerce').to_numpy(dtype=float)
+    return values.reshape(np.shape(cells))
+
+
+def _read_html_table(page):
+    dfs = pd.read_html(StringIO(page))
+    if len(dfs) <= 1:
+        return None
+    return dfs[1].astype(object).where(dfs[1].notna(), '').astype(str).to_numpy(dtype=object)
+
+
+def parse_report_page(page):
+    """Parse a report2.aspx page into a 24-row DataFrame (one column per building), or None."""
+    cells = extract_table(page)
+    if cells is None or len(cells) < 2:
+        cells = _read_html_table(page)
+        if cells is None:
+            return None
+    # Row 1 holds the building names, rows 3..26 the hours 00..23
+    return pd.DataFrame(to_float(cells[3:27]), columns=list(cells[1]))
+
+
+def fetch_report_page(session, ctg, date_str):
+    payload = {
+        'ctg': ctg,
+        'dt1': date_str.replace("-", "/"),
+        'ok': '確定',
+    }
+    resp = session.post(REPORT_URL, data=payload)
+    return parse_report_page(resp.text)
+
+
+def parse_meter_page(page):
+    """Parse a dataq.aspx page into a float array of hourly values (NaN for '---'), or None."""
+    cells = extract_table(page)
+    if cells is None or cells.shape[1] < 4:
+        cells = _read_html_table(page)
+        if cells is None:
+            return None
+    # Column 3 holds the value, row 0 is the column title
+    return to_float(cells[1:, 3])
+
+
+def fetch_meter_range(session, meter, first_day, last_day):
+    """Hourly values of one meter from first_day 00:00 to last_day 23:00 ('YYYY/MM/DD')."""
+    payload = {
+        'dtype': 'h',
+        'build': str(meter),
+        'dt1': f"{first_day} 00:00",
+        'dt2': f"{last_day} 23:00",
+    }
+    resp = session.post(METER_URL, data=payload)
+    return parse_meter_page(resp.text)
+
+
+def day_values(table, building):
+    """Hourly values of one building from a parsed report page (NaN when missing)."""
+    if table is None or building not in table.columns:
+        return [np.nan] * 24
+    col = table[building]
+    if isinstance(col, pd.DataFrame): # Duplicated header, keep the first
+        col = col.iloc[:, 0]
+    values = col.tolist()
+    return values + [np.nan] * (24 - len(values))
+
+
+async def _fetch_pages(pages, concurrency, session, on_page):
+    semaphore = asyncio.Semaphore(concurrency)
+    results = {}
+
+    async def fetch(ctg, date_str):
+        async with semaphore:
+            try:
+                table = await asyncio.to_thread(fetch_report_page, session, ctg, date_str)
+            except Exception as e:
+                print(f"\nError fetching {ctg} {date_str}: {e}")
+                table = None
+        results[(ctg, date_str)] = table
+        if on_page:
+            on_page(ctg, date_str, table)
+
+    await asyncio.gather(*(fetch(ctg, date_str) for ctg, date_str in pages))
+    return results
+
+
+def fetch_report_pages(pages, concurrency=DEFAULT_CONCURRENCY, session=None, on_page=None):
+    """
+    Fetch each (ctg, 'YYYY-MM-DD') page once with at most `concurrency` requests in flight.
+    on_page(ctg, date_str, table) is called from the event loop as pages arrive;
+    table is None when the request or parsing failed.
+    """
+    pages = list(dict.fromkeys(pages))
+    session = session or transport.get_session(REPORT_URL)
+    return asyncio.run(_fetch_pages(pages, concurrency, session, on_page))
@@ -0,0 +1,162 @@
+import os
+import sys
+import json
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Hourly store for all NTU meters, one partition per year:
+#
+#   data/ntu_meter/meters_2026.npy   float32 (hours_in_year x meters), column-major,
+#                                    NaN where no data; opened as a memmap
+#   data/ntu_meter/meters_2026.json  {"start": "2026-01-01T00:00:00", "freq": "h", "columns": [...]}
+#
+# Row i is hour i of the year, so timestamps are explicit from start/freq and
+# an update only writes the hours it fetched into the memmap (each meter's
+# column is contiguous on disk). Loading a full year is a single np.load.
+
+DTYPE = np.float32
+
+
+def hours_in_year(year):
+    return int((datetime(year + 1, 1, 1) - datetime(year, 1, 1)).total_seconds() // 3600)
+
+
+class MeterStore:
+    def __init__(self, base_dir, year):
+        self.base_dir = base_dir
+        self.year = year
+        self.data_path = os.path.join(base_dir, f"meters_{year}.npy")
+        self.meta_path = os.path.join(base_dir, f"meters_{year}.json")
+        self.columns = []
+        self._col_index = {}
+        self._data = None
+        self._lock = threading.Lock()
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            self._set_columns(meta["columns"])
+
+    def _set_columns(self, columns):
+        self.columns = list(columns)
+        self._col_index = {c: i for i, c in enumerate(self.columns)}
+
+    @property
+    def index(self):
+        return pd.date_range(datetime(self.year, 1, 1), periods=hours_in_year(self.year), freq='h')
+
+    def exists(self):
+        return os.path.exists(self.data_path) and os.path.exists(self.meta_path)
+
+    def _save_meta(self):
+        meta = {"start": f"{self.year}-01-01T00:00:00", "freq": "h", "dtype": "float32", "columns": self.columns}
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, self.meta_path)
+
+    def _open(self):
+        if self._data is None and self.exists():
+            self._data = np.load(self.data_path, mmap_mode='r+')
+        return self._data
+
+    def ensure_columns(self, meters):
+        """Add columns for unknown meters (rewrites the partition only when meters are added)."""
+        with self._lock:
+            new_cols = [m for m in dict.fromkeys(meters) if m not in self._col_index]
+            if not new_cols and self.exists():
+                return
+            os.makedirs(self.base_dir, exist_ok=True)
+            old = self._open()
+            columns = self.columns + new_cols
+            tmp_path = self.data_path + ".tmp.npy"
+            data = np.lib.format.open_memmap(
+                tmp_path, mode='w+', dtype=DTYPE, shape=(hours_in_year(self.year), len(columns)), fortran_order=True
+            )
+            data[:] = np.nan
+            if old is not None:
+                data[:, :old.shape[1]] = old
+            data.flush()
+            del data
+            self._data = None
+            del old
+            os.replace(tmp_path, self.data_path)
+            self._set_columns(columns)
+            self._save_meta()
+
+    def write(self, meter, start_hour, values):
+        """Write hourly values of one meter starting at hour-of-year start_hour."""
+        if meter not in self._col_index:
+            self.ensure_columns([meter])
+        data = self._open()
+        col = self._col_index[meter]
+        values = np.asarray(values, dtype=DTYPE)
+        data[start_hour:start_hour + len(values), col] = values
+
+    def read(self, meter):
+        data = self._open()
+        if data is None or meter not in self._col_index:
+            return np.full(hours_in_year(self.year), np.nan, dtype=DTYPE)
+        return np.array(data[:, self._col_index[meter]])
+
+    def flush(self):
+        if self._data is not None:
+            self._data.flush()
+
+    def close(self):
+        self.flush()
+        self._data = None
+
+
+def load_year(base_dir, year, meters=None):
+    """All (or the given) meters of a year as a DataFrame with an hourly DatetimeIndex."""
+    store = MeterStore(base_dir, year)
+    if not store.exists():
+        return pd.DataFrame()
+    data = np.load(store.data_path, mmap_mode='r')
+    columns = store.columns
+    if meters is not None:
+        cols = [store._col_index[m] for m in meters if m in store._col_index]
+        columns = [store.columns[i] for i in cols]
+        data = data[:, cols]
+    return pd.DataFrame(np.asarray(data), index=store.index.rename('Datetime'), columns=columns)
+
+
+def export_xlsx(base_dir, year, out_dir=None, name_map=None, meters=None):
+    """Write one {name}_{year}.xlsx per meter with Datetime and value columns."""
+    df = load_year(base_dir, year, meters)
+    if df.empty:
+        print(f"No meter store for {year} in {base_dir}")
+        return
+    out_dir = out_dir or os.path.join(base_dir, "xlsx")
+    os.makedirs(out_dir, exist_ok=True)
+    name_map = name_map or {}
+    # Drop trailing hours that have no data for any meter (e.g. the rest of the current year)
+    valid = df.notna().any(axis=1).to_numpy()
+    if valid.any():
+        df = df.iloc[:np.flatnonzero(valid)[-1] + 1]
+    for meter in df.columns:
+        name = str(name_map.get(meter, meter))
+        for ch in '/\\:*?"<>|':
+            name = name.replace(ch, '_')
+        path = os.path.join(out_dir, f"{name}_{year}.xlsx")
+        df[[meter]].reset_index().to_excel(path, index=False)
+    print(f"Exported {len(df.columns)} meters to {out_dir}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="NTU meter store utilities")
+    ap.add_argument("--export-xlsx", type=int, metavar="YEAR", required=True, help="export YEAR to per-meter .xlsx files")
+    ap.add_argument("--dir", default="data/ntu_meter", help="meter store directory")
+    ap.add_argument("--out", help="output directory (default: <dir>/xlsx)")
+    ap.add_argument("--meter", action="append", help="only export these meter codes")
+    args = ap.parse_args()
+
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from meter_config import meter_name_map
+
+    export_xlsx(args.dir, args.export_xlsx, args.out, meter_name_map, args.meter)
@@ -4,6 +4,11 @@ import glob
 import json
 from pathlib import Path
 
+try:
+    from crawler.update_monthly_settlement import load_existing
+except ImportError:
+    from update_monthly_settlement import load_existing
+
 def migrate():
     data_dir = Path("data/taipower_ancillary")
     
@@ -38,14 +43,14 @@ def migrate():
         if yearly_csv.exists():
             print(f"  Loading existing yearly file: {yearly_csv}")
             try:
-                dfs.append(pd.read_csv(yearly_csv, dtype={"date": str, "hour": str}))
+                dfs.append(load_existing(yearly_csv))
             except Exception as e:
                 print(f"  Error reading existing yearly file: {e}")
 
         # Load monthly files
         for f in files:
             try:
-                dfs.append(pd.read_csv(f, dtype={"date": str, "hour": str}))
+                dfs.append(load_existing(f))
             except Exception as e:
                 print(f"  Error reading {f}: {e}")
         
@@ -0,0 +1,254 @@
+import os
+import json
+import calendar
+import threading
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+try:
+    from crawler import transport
+    from crawler.epower import METER_URL, fetch_meter_range
+    from crawler.meter_store import MeterStore
+except ImportError:
+    import transport
+    from epower import METER_URL, fetch_meter_range
+    from meter_store import MeterStore
+
+# Parallel, resumable crawler for the NTU meter endpoint (dataq.aspx).
+#
+# Every meter keeps a checkpoint of the days it has fetched completely:
+#   data/ntu_meter/.checkpoints/{meter}_{year}.json  ->  {"done": [["2026-01-01", "2026-01-05"], ...]}
+# A day is only marked done once the server returned all of its hours (or it is
+# older than SETTLE_DAYS), so an interrupted or failed run resumes exactly at
+# the missing chunks. Values go to the yearly MeterStore (meter_store.py) by
+# hour of the year, so a failed chunk leaves NaN in place instead of shifting
+# the rest of the year.
+
+CHECKPOINT_DIRNAME = ".checkpoints"
+# Upper bound only: transport's adaptive limiter decides how many requests are in flight
+DEFAULT_WORKERS = 16
+# Days with missing hours are refetched until they are this old, then accepted as final
+SETTLE_DAYS = 3
+
+
+def safe_filename(name):
+    for ch in '/\\:*?"<>|':
+        name = name.replace(ch, '_')
+    return name
+
+
+def chunk_days(year):
+    # Same request size as before: 5 days (6 in leap years, so chunks tile the year)
+    return 6 if calendar.isleap(year) else 5
+
+
+def day_index(d, year):
+    return (d - date(year, 1, 1)).days
+
+
+# --- Checkpoints ---
+
+def checkpoint_path(out_dir, meter, year):
+    return os.path.join(out_dir, CHECKPOINT_DIRNAME, f"{safe_filename(str(meter))}_{year}.json")
+
+
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class MeterCheckpoint:
+    def __init__(self, path):
+        self.path = path
+        self.done = [] # Sorted, merged [start, end] date ranges
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.done = merge_ranges(
+                [date.fromisoformat(s), date.fromisoformat(e)] for s, e in data.get("done", [])
+            )
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def is_done(self, d):
+        return any(start <= d <= end for start, end in self.done)
+
+    def mark_done(self, start, end, save=True):
+        self.done = merge_ranges(self.done + [[start, end]])
+        if save:
+            self.save()
+
+    def clear(self, start, end):
+        # Forget [start, end] so it is fetched again
+        kept = []
+        for s, e in self.done:
+            if s < start:
+                kept.append([s, min(e, start - timedelta(days=1))])
+            if e > end:
+                kept.append([max(s, end + timedelta(days=1)), e])
+        self.done = merge_ranges(kept)
+        self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"done": [[s.isoformat(), e.isoformat()] for s, e in self.done]}, f)
+        os.replace(tmp_path, self.path)
+
+
+def reopen_days(out_dir, meter, year, ranges):
+    """Forget the ISO date ranges [[start, end], ...] in a meter's checkpoint so they are crawled again."""
+    checkpoint = MeterCheckpoint(checkpoint_path(out_dir, meter, year))
+    for start, end in ranges:
+        checkpoint.clear(date.fromisoformat(start), date.fromisoformat(end))
+
+
+# --- Legacy per-meter .xlsx (one column, one row per hour from Jan 1, -1 = missing) ---
+
+def meter_file_path(out_dir, meter_name, year):
+    return os.path.join(out_dir, f"{safe_filename(str(meter_name))}_{year}.xlsx")
+
+
+def load_meter_values(path):
+    if not os.path.exists(path):
+        return np.array([], dtype=float)
+    df = pd.read_excel(path)
+    if df.empty:
+        return np.array([], dtype=float)
+    values = pd.to_numeric(df.iloc[:, 0], errors='coerce').to_numpy(dtype=float)
+    values[values == -1] = np.nan
+    return values
+
+
+def legacy_checkpoint(checkpoint, values, year):
+    # Files written before checkpoints existed: trust days whose 24 hours are all present
+    n_days = len(values) // 24
+    if n_days == 0:
+        return
+    complete = ~np.isnan(values[:n_days * 24].reshape(n_days, 24)).any(axis=1)
+    jan1 = date(year, 1, 1)
+    ranges = [[jan1 + timedelta(days=i), jan1 + timedelta(days=i)] for i in np.flatnonzero(complete)]
+    checkpoint.done = merge_ranges(ranges)
+    checkpoint.save()
+
+
+# --- Crawl ---
+
+def pending_chunks(checkpoint, first_day, last_day, step):
+    # Split the not-yet-done days in [first_day, last_day] into runs of at most `step` days
+    chunks = []
+    run_start = None
+    d = first_day
+    while d <= last_day + timedelta(days=1):
+        missing = d <= last_day and not checkpoint.is_done(d)
+        if missing and run_start is None:
+            run_start = d
+        if run_start is not None and (not missing or (d - run_start).days == step):
+            chunk_end = d - timedelta(days=1)
+            chunks.append((run_start, chunk_end))
+            run_start = d if missing else None
+        d += timedelta(days=1)
+    return chunks
+
+
+def crawl_meter(meter, meter_name, store, first_day, last_day, out_dir, force=False, session=None):
+    """Fetch the missing chunks of one meter between first_day and last_day (dates within store.year)."""
+    session = session or transport.get_session(METER_URL)
+    year = store.year
+    checkpoint = MeterCheckpoint(checkpoint_path(out_dir, meter, year))
+
+    if not checkpoint.exists():
+        # First run on this meter/year: import the old per-meter .xlsx if there is one
+        legacy_values = load_meter_values(meter_file_path(out_dir, meter_name, year))
+        if len(legacy_values):
+            store.write(meter, 0, legacy_values)
+        legacy_checkpoint(checkpoint, legacy_values, year)
+    if force:
+        checkpoint.clear(first_day, last_day)
+
+    chunks = pending_chunks(checkpoint, first_day, last_day, chunk_days(year))
+    if not chunks:
+        return 0, 0
+
+    fetched = []
+    for chunk_start, chunk_end in chunks:
+        expected = ((chunk_end - chunk_start).days + 1) * 24
+        try:
+            chunk = fetch_meter_range(session, meter, chunk_start.strftime("%Y/%m/%d"), chunk_end.strftime("%Y/%m/%d"))
+        except Exception as e:
+            print(f"\nError fetching {meter} {chunk_start}~{chunk_end}: {e}")
+            chunk = None
+
+        if chunk is not None and len(chunk) == expected:
+            store.write(meter, day_index(chunk_start, year) * 24, chunk)
+            fetched.append((chunk_start, chunk_end, chunk))
+
+    # Flush data before the checkpoint so a crash never marks unsaved days done
+    store.flush()
+    settled = date.today() - timedelta(days=SETTLE_DAYS)
+    for chunk_start, chunk_end, chunk in fetched:
+        complete = ~np.isnan(chunk.reshape(-1, 24)).any(axis=1)
+        for i in range((chunk_end - chunk_start).days + 1):
+            d = chunk_start + timedelta(days=i)
+            if d < settled or complete[i]:
+                checkpoint.mark_done(d, d, save=False)
+    checkpoint.save()
+    return len(fetched), len(chunks) - len(fetched)
+
+
+def crawl_meters(meters, out_dir, first_day, last_day, workers=DEFAULT_WORKERS, force=False):
+    """
+    Crawl [(meter_code, meter_name), ...] between first_day and last_day on a thread pool.
+    Meters run in parallel; the shared epower session rate-limits and adapts concurrency per host.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = []
+    stores = []
+    for year in range(first_day.year, last_day.year + 1):
+        start = max(first_day, date(year, 1, 1))
+        end = min(last_day, date(year, 12, 31))
+        store = MeterStore(out_dir, year)
+        # Add all columns up front; threads then only write their own column
+        store.ensure_columns([meter for meter, _ in meters])
+        stores.append(store)
+        for meter, meter_name in meters:
+            jobs.append((meter, meter_name, store, start, end))
+
+    total = len(jobs)
+    done = 0
+    failed_meters = []
+    print_lock = threading.Lock()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(crawl_meter, meter, name, store, start, end, out_dir, force): (meter, store.year)
+            for meter, name, store, start, end in jobs
+        }
+        for future in as_completed(futures):
+            meter, year = futures[future]
+            try:
+                ok, failed = future.result()
+                if failed:
+                    failed_meters.append(meter)
+            except Exception as e:
+                print(f"\nFailed meter {meter} ({year}): {e}")
+                failed_meters.append(meter)
+            with print_lock:
+                done += 1
+                print(f"\r[{done}/{total}] Processed {meter} ({year})", end="", flush=True)
+
+    for store in stores:
+        store.close()
+    if failed_meters:
+        print(f"\n{len(failed_meters)} meter(s) have failed chunks; they will be retried on the next run.")
+    return failed_meters
@@ -0,0 +1,258 @@
+import time
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Shared HTTP transport for all crawlers.
+#
+# One pooled, keep-alive requests.Session per host, with the retry/backoff
+# policy and timeouts configured in HOST_CONFIG. Tune pool sizes here rather
+# than in the individual crawlers.
+#
+# Every request to a host passes two gates shared by all threads:
+#   TokenBucket      at most `rate` request starts per second (bursts of `burst`)
+#   AdaptiveLimiter  at most `limit` requests in flight, adjusted AIMD-style:
+#                    +1 per round of fast successful responses, x0.5 on
+#                    429/5xx, retries, errors or latency above target_latency
+# so crawler pools can be sized generously and throughput settles at what the
+# server tolerates instead of at fixed sleeps.
+
+DEFAULT_CONFIG = {
+    "pool_maxsize": 10,
+    "timeout": (20, 60),  # (connect timeout, read timeout)
+    "verify": True,
+    "retries": 5,
+    "backoff_factor": 1.2,
+    "status_forcelist": (429, 500, 502, 503, 504),
+    "retry_methods": ("GET",),
+    "headers": {},
+    "rate": 0.0,  # Request starts per second to this host (all threads), 0 = unlimited
+    "burst": 10,
+    "initial_concurrency": 4,
+    "min_concurrency": 1,
+    "max_concurrency": 10,
+    "target_latency": 5.0,  # Seconds; slower responses count as congestion
+    "base_url": None,  # Send this host's requests to another server instead (e.g. a local replay server)
+}
+
+HOST_CONFIG = {
+    # NTU campus power monitoring (report2.aspx / dataq.aspx are read-only POST forms)
+    "epower.ga.ntu.edu.tw": {
+        "pool_maxsize": 16,
+        "timeout": (10, 60),
+        "retries": 3,
+        "backoff_factor": 0.5,
+        "retry_methods": ("GET", "POST"),
+        "rate": 50.0,
+        "burst": 16,
+        "max_concurrency": 16,
+        "target_latency": 3.0,
+    },
+    # Ancillary services settlement API
+    "etp.taipower.com.tw": {
+        "retries": 8,
+        "headers": {"User-Agent": "Mozilla/5.0 (compatible; GitHubActionsBot/1.0)"},
+        "rate": 10.0,
+        "initial_concurrency": 2,
+        "max_concurrency": 8,
+    },
+    # Opendata snapshots (generator / flow)
+    "service.taipower.com.tw": {
+        "pool_maxsize": 2,
+        "verify": False,
+        "initial_concurrency": 1,
+        "max_concurrency": 2,
+    },
+}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def host_config(host):
+    config = dict(DEFAULT_CONFIG)
+    config.update(HOST_CONFIG.get(host, {}))
+    return config
+
+
+def configure(host, **overrides):
+    """Override the config of one host; takes effect for sessions created afterwards."""
+    HOST_CONFIG.setdefault(host, {}).update(overrides)
+    with _sessions_lock:
+        session = _sessions.pop(host, None)
+    if session is not None:
+        session.close()
+
+
+class TokenBucket:
+    # Request starts per second across all threads; rate <= 0 disables it
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            # Take the token now (possibly going negative) and sleep off the debt outside the lock
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    # AIMD limit on requests in flight to one host
+    def __init__(self, initial, minimum, maximum, target_latency, decrease=0.5):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.target_latency = target_latency
+        self.decrease = decrease
+        self.in_flight = 0
+        self.requests = 0
+        self.congested = 0
+        self.latency = None # Smoothed latency (s)
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency, congested=False):
+        with self._cond:
+            self.in_flight -= 1
+            self.requests += 1
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            if congested or latency > self.target_latency:
+                self.congested += 1
+                now = time.monotonic()
+                # Back off at most once per round trip, not once per failed request of the same burst
+                if now - self._last_decrease > (self.latency or 0.0):
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._last_decrease = now
+            else:
+                # +1 per limit successes, i.e. about +1 per round trip
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "requests": self.requests,
+                "congested": self.congested,
+                "latency": round(self.latency, 3) if self.latency is not None else None,
+            }
+
+
+def _was_congested(resp, status_forcelist):
+    if resp.status_code in status_forcelist:
+        return True
+    # urllib3 retried 429/5xx or connection errors before this response
+    retries = getattr(resp.raw, "retries", None)
+    return bool(retries is not None and retries.history)
+
+
+class PooledSession(requests.Session):
+    # requests has no session-wide timeout; apply the host default per request
+    def __init__(self, timeout, verify, bucket=None, limiter=None, status_forcelist=(), base_url=None):
+        super().__init__()
+        self.default_timeout = timeout
+        self.verify = verify
+        self.bucket = bucket or TokenBucket(0, 1)
+        self.limiter = limiter or AdaptiveLimiter(1 << 20, 1, 1 << 20, float("inf"))
+        self.status_forcelist = set(status_forcelist)
+        self.base_url = base_url.rstrip("/") if base_url else None
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.default_timeout)
+        if self.base_url:
+            parts = urlsplit(url)
+            url = self.base_url + parts.path + (f"?{parts.query}" if parts.query else "")
+        self.limiter.acquire()
+        started = time.monotonic()
+        try:
+            self.bucket.acquire()
+            resp = super().request(method, url, **kwargs)
+        except Exception:
+            self.limiter.release(time.monotonic() - started, congested=True)
+            raise
+        self.limiter.release(time.monotonic() - started, _was_congested(resp, self.status_forcelist))
+        return resp
+
+
+def build_session(host=None, **overrides):
+    config = host_config(host)
+    config.update(overrides)
+    retry = Retry(
+        total=config["retries"],
+        connect=config["retries"],
+        read=config["retries"],
+        backoff_factor=config["backoff_factor"],
+        status_forcelist=list(config["status_forcelist"]),
+        allowed_methods=list(config["retry_methods"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=config["pool_maxsize"])
+    s = PooledSession(
+        config["timeout"],
+        config["verify"],
+        bucket=TokenBucket(config["rate"], config["burst"]),
+        limiter=AdaptiveLimiter(
+            config["initial_concurrency"], config["min_concurrency"], config["max_concurrency"], config["target_latency"]
+        ),
+        status_forcelist=config["status_forcelist"],
+        base_url=config["base_url"],
+    )
+    s.headers.update(config["headers"])
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+def get_session(url_or_host):
+    """Shared session for a host (or the host of a URL), created on first use."""
+    host = urlsplit(url_or_host).hostname if "://" in url_or_host else url_or_host
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = build_session(host)
+            _sessions[host] = session
+        return session
+
+
+def get(url, **kwargs):
+    return get_session(url).get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    return get_session(url).post(url, **kwargs)
+
+
+def stats():
+    """Limiter state per host with an open session."""
+    with _sessions_lock:
+        sessions = dict(_sessions)
+    return {host: s.limiter.stats() for host, s in sessions.items()}
+
+
+def close_all():
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for s in sessions:
+        s.close()
@@ -1,42 +1,40 @@
+import os
+import sys
 import json
 import time
 from pathlib import Path
 from datetime import datetime, timedelta, date
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import requests
 import pandas as pd
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+
+try:
+    from crawler import transport
+except ImportError:
+    import transport
+
+try:
+    import frame_cache
+    import series_meta
+except ImportError:
+    # Run as a script from src/crawler
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import frame_cache
+    import series_meta
 
 API_URL = "https://etp.taipower.com.tw/api/infoboard/settle_value/query"
 
 
 def build_session() -> requests.Session:
-    retry = Retry(
-        total=8,
-        connect=8,
-        read=8,
-        backoff_factor=1.2,
-        status_forcelist=[429, 500, 502, 503, 504],
-        allowed_methods=["GET"],
-        raise_on_status=False,
-    )
-    adapter = HTTPAdapter(max_retries=retry, pool_connections=10, pool_maxsize=10)
-    s = requests.Session()
-    s.mount("https://", adapter)
-    s.mount("http://", adapter)
-    return s
-
-
-def fetch_one_day(date_str: str, sleep_sec: float = 0.3, session: requests.Session | None = None, raw_dir: Path | None = None):
+    # Retry/backoff, timeouts and headers for this host live in transport.HOST_CONFIG
+    return transport.get_session(API_URL)
+
+
+def fetch_one_day(date_str: str, sleep_sec: float = 0.0, session: requests.Session | None = None, raw_dir: Path | None = None):
     session = session or build_session()
 
-    resp = session.get(
-        API_URL,
-        params={"startDate": date_str},
-        timeout=(20, 60),  # (connect timeout, read timeout)
-        headers={"User-Agent": "Mozilla/5.0 (compatible; GitHubActionsBot/1.0)"},
-    )
+    resp = session.get(API_URL, params={"startDate": date_str})
     resp.raise_for_status()
     obj = resp.json()
 
@@ -57,7 +55,9 @@ def fetch_one_day(date_str: str, sleep_sec: float = 0.3, session: requests.Sessi
         out.update(row)
         rows.append(out)
 
-    time.sleep(sleep_sec)
+    # Pacing is left to the transport rate limiter; sleep_sec is only an extra manual delay
+    if sleep_sec:
+        time.sleep(sleep_sec)
     return rows
 
 
@@ -73,12 +73,32 @@ def yearly_paths(out_dir: Path, d: date):
     return csv_path, json_path
 
 
+def read_settlement_csv(csv_path) -> pd.DataFrame:
+    return pd.read_csv(csv_path, dtype={"date": str, "hour": str})
+
+
 def load_existing(csv_path: Path) -> pd.DataFrame:
     if csv_path.exists():
-        return pd.read_csv(csv_path, dtype={"date": str, "hour": str})
+        # Typed copy from the frame cache unless the file changed since the last read
+        return frame_cache.cached_frame(str(csv_path), "settlement", read_settlement_csv)
     return pd.DataFrame()
 
 
+def summarize_settlement(df: pd.DataFrame) -> dict:
+    # One series per file: the hours that have a row
+    if df.empty:
+        return {"settlement": series_meta.summarize(pd.Series(dtype=float, index=pd.DatetimeIndex([])))}
+    times = pd.to_datetime(df["date"].astype(str)) + pd.to_timedelta(df["hour"].astype(int), unit="h")
+    return {"settlement": series_meta.summarize(pd.Series(1.0, index=pd.DatetimeIndex(times)))}
+
+
+def settlement_info(csv_path) -> dict:
+    """Summary sidecar of a yearly file ({"settlement": {"first", "last", ...}}), rebuilt when stale."""
+    csv_path = Path(csv_path)
+    signature = series_meta.file_signature([str(csv_path)])
+    return series_meta.cached(str(csv_path), signature, lambda: summarize_settlement(load_existing(csv_path)))
+
+
 def merge_and_save(df_old: pd.DataFrame, new_rows: list[dict], csv_path: Path, json_path: Path):
     df_new = pd.DataFrame(new_rows)
 
@@ -102,6 +122,7 @@ def merge_and_save(df_old: pd.DataFrame, new_rows: list[dict], csv_path: Path, j
     with open(json_path, "w", encoding="utf-8") as f:
         json.dump(records, f, ensure_ascii=False)
 
+    series_meta.save(str(csv_path), series_meta.file_signature([str(csv_path)]), summarize_settlement(df))
     return len(df), len(df_new)
 
 
@@ -109,46 +130,93 @@ def parse_date(s: str) -> date:
     return datetime.strptime(s, "%Y-%m-%d").date()
 
 
-def main(run_date: str, out_dir: str, fallback_yesterday: bool = False):
-    d = parse_date(run_date)
-    csv_path, json_path = yearly_paths(Path(out_dir), d)
-    
-    # Save raw data inside the item's directory
-    raw_dir = Path(out_dir) / "raw"
-    # If the user provided a custom absolute out_dir that isn't in this project, 
-    # we might still want to save raw locally? 
-    # Let's assume standard project structure for now.
-
-    sess = build_session()
-
-    try:
-        print(f"[INFO] fetching {run_date}")
-        rows = fetch_one_day(run_date, session=sess)
-    except Exception as e:
-        if not fallback_yesterday:
-            raise
-        yd = d - timedelta(days=1)
-        yd_str = yd.strftime("%Y-%m-%d")
-        print(f"[WARN] failed fetching {run_date}: {e}")
-        print(f"[INFO] fallback fetching {yd_str}")
-        rows = fetch_one_day(yd_str, session=sess)
-        csv_path, json_path = yearly_paths(Path(out_dir), yd)
-
-    df_old = load_existing(csv_path)
-    total_rows, new_rows_cnt = merge_and_save(df_old, rows, csv_path, json_path)
-
-    print(f"[DONE] appended {new_rows_cnt} rows; total {total_rows} rows")
-    print(f"[DONE] saved CSV : {csv_path}")
-    print(f"[DONE] saved JSON: {json_path}")
+def fetch_days(days: list[str], max_workers: int = 4, session: requests.Session | None = None, raw_dir: Path | None = None):
+    """Fetch the given 'YYYY-MM-DD' days concurrently. Returns ({date_str: rows}, [failed date_str])."""
+    session = session or build_session()
+    rows_by_day = {}
+    failed = []
+    # The pool bounds concurrency, so no per-request sleep
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch_one_day, d_str, 0, session, raw_dir): d_str for d_str in days}
+        for future in as_completed(futures):
+            d_str = futures[future]
+            try:
+                rows_by_day[d_str] = future.result()
+                print(f"[INFO] fetched {d_str}")
+            except Exception as e:
+                print(f"[WARN] failed fetching {d_str}: {e}")
+                failed.append(d_str)
+    return rows_by_day, sorted(failed)
+
+
+def fetch_range(start: date, end: date, max_workers: int = 4, session: requests.Session | None = None, raw_dir: Path | None = None):
+    """Fetch every day in [start, end] concurrently. Returns ({date_str: rows}, [failed date_str])."""
+    days = []
+    d = start
+    while d <= end:
+        days.append(d.strftime("%Y-%m-%d"))
+        d += timedelta(days=1)
+    return fetch_days(days, max_workers=max_workers, session=session, raw_dir=raw_dir)
+
+
+def save_rows(rows_by_day: dict, out_dir: Path):
+    """Merge fetched rows into the yearly files, reading and writing each file once."""
+    rows_by_year = {}
+    for d_str in sorted(rows_by_day):
+        rows_by_year.setdefault(parse_date(d_str).year, []).extend(rows_by_day[d_str])
+
+    for year, rows in sorted(rows_by_year.items()):
+        csv_path, json_path = yearly_paths(out_dir, date(year, 1, 1))
+        df_old = load_existing(csv_path)
+        total_rows, new_rows_cnt = merge_and_save(df_old, rows, csv_path, json_path)
+        print(f"[DONE] appended {new_rows_cnt} rows; total {total_rows} rows")
+        print(f"[DONE] saved CSV : {csv_path}")
+        print(f"[DONE] saved JSON: {json_path}")
+
+
+def update_range(start: date, end: date, out_dir: str, max_workers: int = 4, fallback_yesterday: bool = False):
+    rows_by_day, failed = fetch_range(start, end, max_workers=max_workers)
+
+    if fallback_yesterday and not rows_by_day and start == end:
+        # Today's data is usually not ready yet, take yesterday instead
+        yd = start - timedelta(days=1)
+        print(f"[INFO] fallback fetching {yd.strftime('%Y-%m-%d')}")
+        rows_by_day, failed = fetch_range(yd, yd, max_workers=1)
+
+    if rows_by_day:
+        save_rows(rows_by_day, Path(out_dir))
+    if failed:
+        print(f"[WARN] {len(failed)} day(s) failed: {', '.join(failed)}")
+    return sorted(rows_by_day), failed
+
+
+def update_days(days: list[str], out_dir: str, max_workers: int = 4):
+    """Fetch and save an arbitrary set of days (e.g. the holes found by the gap planner)."""
+    rows_by_day, failed = fetch_days(sorted(set(days)), max_workers=max_workers)
+    if rows_by_day:
+        save_rows(rows_by_day, Path(out_dir))
+    if failed:
+        print(f"[WARN] {len(failed)} day(s) failed: {', '.join(failed)}")
+    return sorted(rows_by_day), failed
+
+
+def main(run_date: str, out_dir: str, fallback_yesterday: bool = False, end_date: str | None = None, max_workers: int = 4):
+    start = parse_date(run_date)
+    end = parse_date(end_date) if end_date else start
+    _, failed = update_range(start, end, out_dir, max_workers=max_workers, fallback_yesterday=fallback_yesterday)
+    if failed and start == end and not fallback_yesterday:
+        raise RuntimeError(f"failed fetching {run_date}")
 
 
 if __name__ == "__main__":
     import argparse
 
     ap = argparse.ArgumentParser()
-    ap.add_argument("--date", required=True, help="YYYY-MM-DD")
+    ap.add_argument("--date", required=True, help="YYYY-MM-DD (start date when --end is given)")
+    ap.add_argument("--end", help="YYYY-MM-DD, fetch the whole range [--date, --end]")
     ap.add_argument("--outdir", default="data", help="output directory")
+    ap.add_argument("--workers", type=int, default=4, help="concurrent day fetches")
     ap.add_argument("--fallback-yesterday", action="store_true", help="if today not ready, fetch yesterday")
     args = ap.parse_args()
 
-    main(args.date, args.outdir, args.fallback_yesterday)
+    main(args.date, args.outdir, args.fallback_yesterday, args.end, args.workers)
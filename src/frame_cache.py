@@ -0,0 +1,221 @@
+import os
+import json
+import shutil
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# Binary cache of parsed source files (CSV / xlsx -> typed DataFrame).
+#
+# The same building and settlement CSVs are parsed from text by every run and
+# every analysis script. cached_frame(path, name, parse) returns parse(path)
+# and keeps a typed copy under data/.cache/frames/:
+#
+#   <stem>-<key>/meta.json     source path, size/mtime_ns/hash, columns, dtypes
+#   <stem>-<key>/index.npy     datetime64[ns] index (or nothing for a RangeIndex)
+#   <stem>-<key>/values.npy    all float columns, one (rows x cols) array, column-major
+#   <stem>-<key>/col_<i>.npy   every other column (int / bool / datetime / fixed-width str)
+#
+# so a repeat load is a few np.load calls (memory-mapped with mmap=True) instead
+# of a CSV parse. An entry is valid while the source size and mtime match; if
+# only the mtime changed (copied / touched file) the content hash decides.
+# `name` tells different parses of the same file apart. Frames with columns
+# that cannot be stored (mixed objects, non-datetime indexes) are just parsed.
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(SRC_DIR)
+CACHE_DIR = os.path.join(BASE_DIR, 'data', '.cache', 'frames')
+FORMAT_VERSION = 1
+HASH_CHUNK = 1 << 20
+
+
+def file_hash(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def entry_dir(path, name, float_dtype=None, cache_dir=CACHE_DIR):
+    key = json.dumps([os.path.abspath(path), name, np.dtype(float_dtype).str if float_dtype else None], ensure_ascii=False)
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{stem}-{digest}")
+
+
+# --- Encoding ---
+
+def _encode(df, float_dtype):
+    # {file name: array} and the meta describing them; None if the frame cannot be stored
+    arrays = {}
+    if isinstance(df.index, pd.DatetimeIndex):
+        index = {"kind": "datetime", "name": df.index.name}
+        arrays["index.npy"] = df.index.values.astype("datetime64[ns]")
+    elif isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1:
+        index = {"kind": "range", "name": df.index.name}
+    else:
+        return None
+
+    columns = []
+    floats = []
+    for i, col in enumerate(df.columns):
+        s = df.iloc[:, i]
+        dtype = s.dtype
+        if pd.api.types.is_float_dtype(dtype):
+            columns.append({"name": col, "kind": "float", "pos": len(floats)})
+            floats.append(s.to_numpy(dtype=float_dtype or dtype))
+        elif pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+            if not isinstance(dtype, np.dtype):
+                return None # Nullable extension types
+            columns.append({"name": col, "kind": "plain", "file": f"col_{i}.npy"})
+            arrays[f"col_{i}.npy"] = s.to_numpy()
+        elif pd.api.types.is_datetime64_dtype(dtype):
+            columns.append({"name": col, "kind": "datetime", "file": f"col_{i}.npy"})
+            arrays[f"col_{i}.npy"] = s.to_numpy().astype("datetime64[ns]")
+        elif pd.api.types.is_string_dtype(dtype):
+            values = s.to_numpy(dtype=object)
+            missing = pd.isna(values)
+            if not all(isinstance(v, str) for v in values[~missing]):
+                return None
+            filled = np.where(missing, "", values).astype(str) if len(values) else np.array([], dtype="<U1")
+            columns.append({"name": col, "kind": "str", "file": f"col_{i}.npy", "dtype": str(dtype), "na": bool(missing.any())})
+            arrays[f"col_{i}.npy"] = filled
+            if missing.any():
+                arrays[f"col_{i}.na.npy"] = missing
+        else:
+            return None
+    if floats:
+        arrays["values.npy"] = np.asfortranarray(np.column_stack(floats))
+    return arrays, {"index": index, "columns": columns, "rows": len(df)}
+
+
+def _decode(directory, meta, mmap):
+    mode = 'r' if mmap else None
+
+    def load(name):
+        return np.load(os.path.join(directory, name), mmap_mode=mode, allow_pickle=False)
+
+    if meta["index"]["kind"] == "datetime":
+        index = pd.DatetimeIndex(load("index.npy"), name=meta["index"]["name"])
+    else:
+        index = pd.RangeIndex(meta["rows"], name=meta["index"]["name"])
+    columns = meta["columns"]
+    float_cols = [c for c in columns if c["kind"] == "float"]
+    if float_cols:
+        # One 2D block straight from values.npy (no copy, so mmap stays a memory map)
+        df = pd.DataFrame(load("values.npy"), index=index, columns=[c["name"] for c in float_cols], copy=False)
+    else:
+        df = pd.DataFrame(index=index)
+    others = [c for c in columns if c["kind"] != "float"]
+    for c in others:
+        if c["kind"] == "str":
+            col = load(c["file"]).astype(object)
+            if c["na"]:
+                col[load(c["file"][:-len(".npy")] + ".na.npy")] = np.nan
+            df[c["name"]] = pd.array(col, dtype=c["dtype"])
+        else:
+            df[c["name"]] = load(c["file"])
+    if others:
+        df = df[[c["name"] for c in columns]]
+    return df
+
+
+# --- Entries ---
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, "meta.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return meta if meta.get("version") == FORMAT_VERSION else None
+    except (OSError, ValueError):
+        return None
+
+
+def _write_entry(directory, arrays, meta):
+    os.makedirs(os.path.dirname(directory), exist_ok=True)
+    tmp = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp, name), array, allow_pickle=False)
+    with open(os.path.join(tmp, "meta.json"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    # Swap the whole directory so readers never see a half-written entry
+    old = f"{directory}.old-{os.getpid()}"
+    if os.path.exists(directory):
+        os.replace(directory, old)
+    os.replace(tmp, directory)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def _touch_meta(directory, meta):
+    tmp = os.path.join(directory, f"meta.json.tmp-{os.getpid()}")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp, os.path.join(directory, "meta.json"))
+
+
+def cached_frame(path, name, parse, float_dtype=None, mmap=False, cache_dir=CACHE_DIR):
+    """
+    parse(path) as a DataFrame, served from the binary cache while the file is unchanged.
+    float_dtype: store float columns as this dtype (e.g. np.float32 for read-only analysis).
+    mmap: back the frame by read-only memory maps (do not modify it in place).
+    """
+    st = os.stat(path)
+    directory = entry_dir(path, name, float_dtype, cache_dir)
+    meta = _read_meta(directory)
+    if meta is not None:
+        source = meta["source"]
+        valid = source["size"] == st.st_size and source["mtime_ns"] == st.st_mtime_ns
+        if not valid and source["size"] == st.st_size and source["hash"] == file_hash(path):
+            # Same bytes, new mtime: keep the entry
+            meta["source"]["mtime_ns"] = st.st_mtime_ns
+            try:
+                _touch_meta(directory, meta)
+            except OSError:
+                pass
+            valid = True
+        if valid:
+            try:
+                return _decode(directory, meta, mmap)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Warning: Dropping broken cache entry {directory}: {e}")
+
+    source = {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": file_hash(path)}
+    df = parse(path)
+    encoded = _encode(df, float_dtype)
+    if encoded is None:
+        return df
+    arrays, meta = encoded
+    meta.update({"version": FORMAT_VERSION, "name": name, "source": source})
+    # The file may have changed while it was parsed; then do not cache this version
+    st = os.stat(path)
+    if st.st_size != source["size"] or st.st_mtime_ns != source["mtime_ns"]:
+        return df
+    try:
+        _write_entry(directory, arrays, meta)
+    except OSError as e:
+        print(f"Warning: Could not write cache entry {directory}: {e}")
+        return df
+    # Same dtypes / backing as a cache hit
+    return _decode(directory, meta, mmap)
+
+
+def prune(cache_dir=CACHE_DIR):
+    """Drop entries whose source file no longer exists. Returns the number removed."""
+    removed = 0
+    if not os.path.isdir(cache_dir):
+        return removed
+    for name in os.listdir(cache_dir):
+        directory = os.path.join(cache_dir, name)
+        meta = _read_meta(directory)
+        if meta is None or not os.path.exists(meta["source"]["path"]):
+            shutil.rmtree(directory, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+def clear(cache_dir=CACHE_DIR):
+    shutil.rmtree(cache_dir, ignore_errors=True)
@@ -0,0 +1,362 @@
+import os
+import json
+import glob
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from series_meta import file_signature
+from crawler.meter_store import MeterStore
+from crawler.ntu_meters import MeterCheckpoint, checkpoint_path, merge_ranges, CHECKPOINT_DIRNAME
+from process.taipower_store import TaipowerStore
+from process.taipower_stream import iter_batches
+
+# Gap detection across all datasets and the re-crawl plan that fills them.
+#
+# The normal updates only resume from "last date + 1", so holes in the middle
+# of the history (failed days, NaN days, unfinished meter chunks) stay. The
+# planner builds a gap map per series from small per-file summaries instead of
+# the data itself:
+#
+#   buildings   {subject}.days.json bitmaps (building_store)
+#   meters      .checkpoints/{meter}_{year}.json done ranges (ntu_meters), plus
+#               days with NaN hours in meters_{year}.npy (days older than
+#               SETTLE_DAYS are marked done even when hours are missing)
+#   settlement  complete days of settlement_{year}.csv
+#   generator / flow   timestamps of the yearly store / parquet / master
+#
+# Summaries that need the data (meters, settlement, generator, flow) are cached in
+# data/.cache/gap_summaries.json keyed by file size/mtime, so only changed
+# files are read again. Gaps are date ranges [[start, end], ...] (ISO strings).
+#
+# The fetch plan batches gaps the way the crawlers fetch: building gaps become
+# (ctg, date) report pages shared by all buildings of the page, meter gaps one
+# crawl per year, settlement gaps a list of days. Generator/flow snapshots
+# cannot be fetched for past times, so their gaps are only reported.
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(SRC_DIR)
+CACHE_PATH = os.path.join(BASE_DIR, 'data', '.cache', 'gap_summaries.json')
+SUMMARY_VERSION = 1
+
+
+# --- Date ranges ---
+
+def to_ranges(days):
+    """Sorted dates/Timestamps -> [[start, end], ...] of consecutive days (ISO strings)."""
+    ranges = []
+    for d in days:
+        d = pd.Timestamp(d).date()
+        if ranges and d == ranges[-1][1] + timedelta(days=1):
+            ranges[-1][1] = d
+        else:
+            ranges.append([d, d])
+    return [[s.isoformat(), e.isoformat()] for s, e in ranges]
+
+
+def expand(ranges):
+    days = []
+    for s, e in ranges:
+        days.extend(pd.date_range(s, e, freq='D'))
+    return days
+
+
+def complement(covered, start, end):
+    """Days of [start, end] not covered by the sorted, merged [[start, end], ...] date ranges."""
+    gaps = []
+    cursor = start
+    for s, e in covered:
+        s, e = max(s, start), min(e, end)
+        if s > e:
+            continue
+        if s > cursor:
+            gaps.append([cursor, s - timedelta(days=1)])
+        cursor = max(cursor, e + timedelta(days=1))
+    if cursor <= end:
+        gaps.append([cursor, end])
+    return [[s.isoformat(), e.isoformat()] for s, e in gaps]
+
+
+def range_days(ranges):
+    return sum((date.fromisoformat(e) - date.fromisoformat(s)).days + 1 for s, e in ranges)
+
+
+# --- Per-file summary cache ---
+
+class SummaryCache:
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("version") == SUMMARY_VERSION:
+                    self.entries = data.get("entries", {})
+            except Exception as e:
+                print(f"Warning: Could not read {path}: {e}")
+
+    def get(self, name, paths, compute):
+        """Summary of the files in `paths`, recomputed with compute() only when they changed."""
+        signature = file_signature(paths)
+        entry = self.entries.get(name)
+        if entry is not None and entry["signature"] == signature:
+            return entry["summary"]
+        summary = compute()
+        self.entries[name] = {"signature": signature, "summary": summary}
+        self.dirty = True
+        return summary
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": SUMMARY_VERSION, "entries": self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+
+# --- Buildings ---
+
+def building_gaps(manager, buildings, until):
+    """
+    buildings: [(ctg, building, (campus, feeder, subject)), ...]
+    Gaps between each building's first complete day and `until`, from the day bitmaps.
+    Returns {building: (ctg, ranges)}; a building listed under several categories is planned once.
+    """
+    gaps = {}
+    end = pd.Timestamp(until).normalize()
+    for ctg, building, (campus, feeder, subject) in buildings:
+        if building in gaps:
+            continue
+        bitmap = manager.day_bitmap(campus, feeder, subject)
+        first = bitmap.first_complete(building)
+        if first is None or first > end:
+            continue # Never fetched: the regular update handles it
+        missing = manager.missing_days(campus, feeder, subject, building, first, end)
+        if len(missing):
+            gaps[building] = (ctg, to_ranges(missing))
+    return gaps
+
+
+# --- Meters ---
+
+def _meter_nan_summary(store):
+    """Days with at least one NaN hour, per meter column of a MeterStore year."""
+    data = np.load(store.data_path, mmap_mode='r')
+    incomplete = np.isnan(data).reshape(-1, 24, data.shape[1]).any(axis=1)
+    first = date(store.year, 1, 1)
+    summary = {}
+    for j, meter in enumerate(store.columns):
+        days = np.flatnonzero(incomplete[:, j])
+        if not len(days):
+            continue
+        # Runs of consecutive day indexes
+        breaks = np.flatnonzero(np.diff(days) > 1)
+        starts = np.concatenate([days[:1], days[breaks + 1]])
+        ends = np.concatenate([days[breaks], days[-1:]])
+        summary[meter] = [
+            [(first + timedelta(days=int(s))).isoformat(), (first + timedelta(days=int(e))).isoformat()]
+            for s, e in zip(starts, ends)
+        ]
+    return summary
+
+
+def meter_gaps(meters, out_dir, until, cache):
+    """
+    Days without a completed checkpoint or with NaN hours in the meter store,
+    per meter and year, for every meter/year that has a checkpoint.
+    Returns {year: {meter: ranges}}.
+    """
+    years = set()
+    pattern = os.path.join(out_dir, CHECKPOINT_DIRNAME, "*_*.json")
+    for path in glob.glob(pattern):
+        stem = os.path.basename(path)[:-len(".json")]
+        year = stem.rsplit("_", 1)[-1]
+        if year.isdigit():
+            years.add(int(year))
+
+    gaps = {}
+    for year in sorted(years):
+        start = date(year, 1, 1)
+        end = min(until, date(year, 12, 31))
+        if start > end:
+            continue
+        store = MeterStore(out_dir, year)
+        nan_days = {}
+        if store.exists():
+            nan_days = cache.get(
+                f"meters:{os.path.abspath(store.data_path)}",
+                [store.data_path, store.meta_path],
+                lambda: _meter_nan_summary(store),
+            )
+        for meter in meters:
+            path = checkpoint_path(out_dir, meter, year)
+            if not os.path.exists(path):
+                continue # Never crawled this year: the regular update handles it
+            checkpoint = MeterCheckpoint(path)
+            missing = [
+                [date.fromisoformat(s), date.fromisoformat(e)]
+                for s, e in complement(checkpoint.done, start, end) + nan_days.get(meter, [])
+            ]
+            missing = [[s, min(e, end)] for s, e in merge_ranges(missing) if s <= end]
+            if missing:
+                gaps.setdefault(year, {})[meter] = [[s.isoformat(), e.isoformat()] for s, e in missing]
+    return gaps
+
+
+# --- Settlement ---
+
+def _settlement_summary(csv_path):
+    df = pd.read_csv(csv_path, usecols=["date", "hour"], dtype=str)
+    counts = df.drop_duplicates().groupby("date").size()
+    complete = sorted(counts.index[counts >= 24])
+    return {"complete": to_ranges(complete), "first": min(counts.index) if len(counts) else None}
+
+
+def settlement_gaps(out_dir, until, cache):
+    """Days between the first stored day and `until` without all 24 hours."""
+    covered = []
+    first = None
+    for csv_path in sorted(glob.glob(os.path.join(out_dir, "settlement_*.csv"))):
+        summary = cache.get(f"settlement:{os.path.abspath(csv_path)}", [csv_path], lambda: _settlement_summary(csv_path))
+        covered.extend([date.fromisoformat(s), date.fromisoformat(e)] for s, e in summary["complete"])
+        if summary["first"] and (first is None or summary["first"] < first):
+            first = summary["first"]
+    if first is None:
+        return []
+    covered.sort()
+    return complement(covered, date.fromisoformat(first), until)
+
+
+# --- Generator / flow snapshots (report only) ---
+
+def _snapshot_sources(directory, list_key, file_prefix, year):
+    # The files the readers would use for this year (TaipowerStore.year_source)
+    store = TaipowerStore(directory, list_key, file_prefix)
+    kind, source = store.year_source(year)
+    if kind == "store":
+        return kind, [store.index_path(p) for p in source]
+    return kind, [source]
+
+
+def _snapshot_times(kind, paths, list_key, file_prefix, year):
+    if kind == "store":
+        times = set()
+        for path in paths:
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    times.update(line.split("\t", 1)[0] for line in f)
+        return pd.DatetimeIndex(sorted(times))
+    if kind == "parquet":
+        try:
+            from process.taipower_columnar import load_frame
+        except ImportError:
+            from taipower_columnar import load_frame
+        df = load_frame(os.path.dirname(paths[0]), file_prefix, year, columns=["DATETIME"])
+        return pd.DatetimeIndex(df["DATETIME"].unique()).sort_values()
+    # Streamed: only the distinct timestamps of the master are kept
+    times = set()
+    for batch in iter_batches(paths[0], list_key):
+        times.update(rec["DATETIME"] for rec in batch)
+    return pd.DatetimeIndex(sorted(times))
+
+
+def _snapshot_summary(kind, paths, list_key, file_prefix, year):
+    times = _snapshot_times(kind, paths, list_key, file_prefix, year)
+    if len(times) < 2:
+        return {"first": None, "last": None, "step": None, "missing": []}
+    diffs = times[1:] - times[:-1]
+    step = pd.Series(diffs).mode().iloc[0]
+    missing = []
+    for prev, gap in zip(times[:-1], diffs):
+        if gap > step:
+            missing.append([(prev + step).isoformat(), (prev + gap - step).isoformat()])
+    return {"first": times[0].isoformat(), "last": times[-1].isoformat(), "step": int(step.total_seconds()), "missing": missing}
+
+
+def snapshot_gaps(directory, list_key, file_prefix, cache):
+    """{year: summary} with the missing timestamp ranges inside each stored year."""
+    years = set()
+    for path in glob.glob(os.path.join(directory, f"{file_prefix}_*.*")) + glob.glob(os.path.join(directory, "store", "*-*")):
+        token = os.path.basename(path).split("_")[-1].split(".")[0].split("-")[0]
+        if token.isdigit() and len(token) == 4:
+            years.add(int(token))
+    gaps = {}
+    for year in sorted(years):
+        kind, paths = _snapshot_sources(directory, list_key, file_prefix, year)
+        try:
+            gaps[year] = cache.get(
+                f"{file_prefix}:{os.path.abspath(directory)}:{year}:{kind}", paths,
+                lambda: _snapshot_summary(kind, paths, list_key, file_prefix, year),
+            )
+        except Exception as e:
+            print(f"Warning: Could not summarize {file_prefix} {year}: {e}")
+    return gaps
+
+
+# --- Plan ---
+
+def build_plan(manager, buildings, meters, meter_dir, settlement_dir, snapshot_dirs, until=None, cache=None):
+    """
+    Gap map and batched fetch plan for every dataset.
+    snapshot_dirs: [(directory, list_key, file_prefix), ...] for generator/flow.
+    """
+    until = until or (date.today() - timedelta(days=1))
+    own_cache = cache is None
+    cache = cache or SummaryCache()
+
+    b_gaps = building_gaps(manager, buildings, until)
+    m_gaps = meter_gaps(meters, meter_dir, until, cache)
+    s_gaps = settlement_gaps(settlement_dir, until, cache)
+    snapshots = {prefix: snapshot_gaps(directory, list_key, prefix, cache) for directory, list_key, prefix in snapshot_dirs}
+    if own_cache:
+        cache.save()
+
+    # One report page serves every building of its category on that day
+    pages = {}
+    for building, (ctg, ranges) in b_gaps.items():
+        for d in expand(ranges):
+            pages.setdefault((ctg, d.strftime("%Y-%m-%d")), []).append(building)
+
+    # One crawl per year over the union span; the crawler skips days already done
+    meter_batches = []
+    for year, per_meter in sorted(m_gaps.items()):
+        starts = [ranges[0][0] for ranges in per_meter.values()]
+        ends = [ranges[-1][1] for ranges in per_meter.values()]
+        meter_batches.append({"year": year, "start": min(starts), "end": max(ends), "meters": sorted(per_meter)})
+
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "until": until.isoformat(),
+        "gaps": {
+            "buildings": {b: ranges for b, (_, ranges) in b_gaps.items()},
+            "meters": {str(year): per_meter for year, per_meter in m_gaps.items()},
+            "settlement": s_gaps,
+            **{prefix: {str(year): summary for year, summary in per_year.items()} for prefix, per_year in snapshots.items()},
+        },
+        "fetch": {
+            "buildings": [{"ctg": ctg, "date": d, "buildings": bs} for (ctg, d), bs in sorted(pages.items())],
+            "meters": meter_batches,
+            "settlement": s_gaps,
+        },
+    }
+
+
+def print_plan(plan):
+    gaps = plan["gaps"]
+    fetch = plan["fetch"]
+    print(f"Gap map up to {plan['until']}:")
+    b_days = sum(range_days(r) for r in gaps["buildings"].values())
+    print(f"  buildings : {len(gaps['buildings'])} building(s), {b_days} building-day(s) -> {len(fetch['buildings'])} page(s)")
+    m_count = sum(len(per_meter) for per_meter in gaps["meters"].values())
+    m_days = sum(range_days(r) for per_meter in gaps["meters"].values() for r in per_meter.values())
+    print(f"  meters    : {m_count} meter-year(s), {m_days} meter-day(s) -> {len(fetch['meters'])} crawl(s)")
+    print(f"  settlement: {range_days(gaps['settlement'])} day(s) in {len(gaps['settlement'])} range(s)")
+    for prefix in ("generator", "flow"):
+        for year, summary in gaps.get(prefix, {}).items():
+            print(f"  {prefix} {year}: {len(summary['missing'])} missing range(s) (report only, snapshots cannot be refetched)")
@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import signal
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from crawler import crawler_generate, transport
+from process.organize_taipower_data import MasterCache, DEFAULT_BACKEND
+
+# Long-running poller for the Taipower generator / flow opendata snapshots.
+#
+#   python src/run.py --daemon [PORT]
+#
+# The opendata files only hold the latest 10-minute snapshot, so every interval
+# that is not fetched while it is published is lost for good. Instead of running
+# crawler_generate.py from cron, the daemon polls each source in-process:
+#
+#   - conditional requests (crawler_generate.update_dataset), so a poll before
+#     the next snapshot is out costs one 304,
+#   - merges into masters kept in memory between polls (MasterCache), so the
+#     yearly master is not re-read on every merge,
+#   - after a merge the source sleeps one interval, then re-polls every
+#     RETRY_INTERVAL until the next snapshot appears; errors back off
+#     exponentially up to MAX_BACKOFF.
+#
+# Health (per-source counters, last merge, missed intervals, transport limiter
+# state) is written to data/.cache/daemon_health.json after every poll and
+# served as JSON on http://127.0.0.1:PORT/health when a port is given
+# (HTTP 503 while a source is stale).
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(SRC_DIR)
+HEALTH_PATH = os.path.join(BASE_DIR, 'data', '.cache', 'daemon_health.json')
+RETRY_INTERVAL = 60  # Seconds between polls while the next snapshot is not published yet
+MAX_BACKOFF = 900  # Longest wait after repeated errors (s)
+STALE_INTERVALS = 3  # A source is stale after this many intervals without a merge
+
+SOURCES = [
+    {"name": "generator", "url": crawler_generate.url1, "directory": crawler_generate.proc_gen_dir,
+     "list_key": "NET_P", "file_prefix": "generator", "interval": 600},
+    {"name": "flow", "url": crawler_generate.url2, "directory": crawler_generate.proc_flow_dir,
+     "list_key": "FLOW_P", "file_prefix": "flow", "interval": 600},
+]
+
+
+def parse_snapshot_time(value):
+    try:
+        return datetime.fromisoformat(value.replace(" ", "T"))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _stamp(ts):
+    return datetime.fromtimestamp(ts).isoformat(timespec="seconds") if ts else None
+
+
+class PollDaemon:
+    def __init__(self, sources=SOURCES, backend=DEFAULT_BACKEND,
+                 registry_path=crawler_generate.registry_path, health_path=HEALTH_PATH):
+        self.sources = sources
+        self.backend = backend
+        self.registry_path = registry_path
+        self.health_path = health_path
+        self.registry = crawler_generate.load_registry(registry_path)
+        self.cache = MasterCache()
+        self.started = time.time()
+        self.state = {
+            src["name"]: {
+                "polls": 0, "merges": 0, "unchanged": 0, "errors": 0, "consecutive_errors": 0,
+                "missed_intervals": 0, "last_poll": None, "last_merge": None, "last_error": None,
+                "last_snapshot": None, "merge_seconds": None, "next_poll": 0.0,
+            }
+            for src in sources
+        }
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def poll(self, src):
+        st = self.state[src["name"]]
+        entry = self.registry.get(src["url"], {})
+        previous = parse_snapshot_time(entry.get("end_date"))
+
+        t0 = time.time()
+        merged = crawler_generate.update_dataset(
+            src["url"], src["directory"], src["list_key"], src["file_prefix"],
+            self.registry, self.backend, cache=self.cache,
+        )
+        now = time.time()
+        entry = self.registry.get(src["url"], {})
+
+        with self._lock:
+            st["polls"] += 1
+            st["last_poll"] = now
+            if merged:
+                st["merges"] += 1
+                st["consecutive_errors"] = 0
+                st["last_merge"] = now
+                st["merge_seconds"] = round(now - t0, 3)
+                latest = parse_snapshot_time(entry.get("end_date"))
+                if latest:
+                    st["last_snapshot"] = latest.isoformat()
+                    if previous and latest > previous:
+                        # Snapshots published between two merges that we never saw
+                        missed = int((latest - previous).total_seconds() // src["interval"]) - 1
+                        st["missed_intervals"] += max(missed, 0)
+                st["next_poll"] = now + src["interval"]
+            elif entry.get("error"):
+                st["errors"] += 1
+                st["consecutive_errors"] += 1
+                st["last_error"] = f"{_stamp(now)} {entry['error']}"
+                st["next_poll"] = now + min(MAX_BACKOFF, RETRY_INTERVAL * 2 ** (st["consecutive_errors"] - 1))
+            else:
+                st["unchanged"] += 1
+                st["consecutive_errors"] = 0
+                st["next_poll"] = now + RETRY_INTERVAL
+
+        crawler_generate.save_registry(self.registry, self.registry_path)
+
+    def health(self):
+        now = time.time()
+        sources = {}
+        healthy = True
+        with self._lock:
+            for src in self.sources:
+                st = dict(self.state[src["name"]])
+                last = st["last_merge"] or self.started
+                st["stale"] = now - last > STALE_INTERVALS * src["interval"]
+                healthy = healthy and not st["stale"]
+                for key in ("last_poll", "last_merge", "next_poll"):
+                    st[key] = _stamp(st[key])
+                sources[src["name"]] = st
+        return {
+            "healthy": healthy,
+            "started": _stamp(self.started),
+            "uptime": round(now - self.started),
+            "backend": self.backend,
+            "sources": sources,
+            "transport": transport.stats(),
+        }
+
+    def write_health(self):
+        os.makedirs(os.path.dirname(self.health_path), exist_ok=True)
+        tmp = self.health_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.health(), f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.health_path)
+
+    def run(self):
+        print(f"Polling {', '.join(s['name'] for s in self.sources)} (backend {self.backend}). Ctrl+C to stop.")
+        self.write_health()
+        while not self._stop.is_set():
+            now = time.time()
+            for src in self.sources:
+                if self.state[src["name"]]["next_poll"] <= now and not self._stop.is_set():
+                    try:
+                        self.poll(src)
+                    except Exception as e:
+                        # Never let one bad poll end the daemon
+                        st = self.state[src["name"]]
+                        with self._lock:
+                            st["errors"] += 1
+                            st["consecutive_errors"] += 1
+                            st["last_error"] = f"{_stamp(time.time())} {e}"
+                            st["next_poll"] = time.time() + RETRY_INTERVAL
+                        print(f"[{src['name']}] poll failed: {e}")
+            self.write_health()
+            next_due = min(st["next_poll"] for st in self.state.values())
+            self._stop.wait(max(0.0, next_due - time.time()))
+        print("Daemon stopped.")
+
+    def stop(self):
+        self._stop.set()
+
+
+def serve_health(daemon, port):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") not in ("", "/health"):
+                self.send_error(404)
+                return
+            health = daemon.health()
+            body = json.dumps(health, ensure_ascii=False, indent=1).encode("utf-8")
+            self.send_response(200 if health["healthy"] else 503)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="daemon-health", daemon=True).start()
+    print(f"Health on http://127.0.0.1:{port}/health")
+    return httpd
+
+
+def run_daemon(port=None, backend=DEFAULT_BACKEND):
+    daemon = PollDaemon(backend=backend)
+    httpd = serve_health(daemon, port) if port else None
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        daemon.stop()
+    finally:
+        if httpd:
+            httpd.shutdown()
+        crawler_generate.save_registry(daemon.registry, daemon.registry_path)
+        transport.close_all()
@@ -4,11 +4,26 @@ import glob
 from datetime import datetime
 import re
 
+try:
+    from process.taipower_store import TaipowerStore, BACKEND_SOURCES
+    from process.taipower_records import RecordTable
+    from process import taipower_columnar
+except ImportError:
+    from taipower_store import TaipowerStore, BACKEND_SOURCES
+    from taipower_records import RecordTable
+    import taipower_columnar
+
 # Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 FLOW_DIR = os.path.join(BASE_DIR, "data", "taipower_flow")
 GEN_DIR = os.path.join(BASE_DIR, "data", "taipower_generators")
 
+# "json": rewrite the yearly {prefix}_{year}.json master on every merge
+# "segments": append new rows to the partitioned store (see taipower_store.py)
+# "parquet": columnar {prefix}_{year}.parquet (see taipower_columnar.py, needs pyarrow)
+BACKENDS = ("json", "segments", "parquet")
+DEFAULT_BACKEND = "json"
+
 def parse_date(date_str):
     # Formats: "2025-06-01T00:00:00", "2025-06-01 00:00:00", "2025-06-01", "2022-01-01 00:00"
     try:
@@ -33,8 +48,123 @@ def save_json(path, data):
     with open(path, 'w', encoding='utf-8') as f:
         json.dump(data, f, ensure_ascii=False, separators=(',', ':')) # Minified to save space
 
-def process_directory(directory, list_key, file_prefix):
+class MasterCache:
+    # Masters kept in memory between merges of a long-running process (run.py --daemon).
+    # An entry is only used while the file on disk is the one we last wrote or read.
+    def __init__(self):
+        self._entries = {} # path -> ((mtime_ns, size), records / DataFrame)
+        self._stores = {}
+
+    @staticmethod
+    def _signature(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def get(self, path):
+        entry = self._entries.get(path)
+        if entry is None or entry[0] != self._signature(path):
+            return None
+        return entry[1]
+
+    def put(self, path, value):
+        self._entries[path] = (self._signature(path), value)
+
+    def drop(self, path):
+        self._entries.pop(path, None)
+
+    def store(self, directory, list_key, file_prefix):
+        # Segment stores keep their partition indexes loaded themselves
+        key = (directory, file_prefix)
+        if key not in self._stores:
+            self._stores[key] = TaipowerStore(directory, list_key, file_prefix)
+        return self._stores[key]
+
+def write_master_json(directory, list_key, file_prefix, year, new_records, metadata, cache=None):
+    master_filename = f"{file_prefix}_{year}.json"
+    master_path = os.path.join(directory, master_filename)
+
+    print(f"Updating master file for {year}: {master_filename}")
+
+    # The master is held as a RecordTable (interned codes + typed arrays), not as dicts
+    table = cache.get(master_path) if cache else None
+
+    # Load existing master if it exists to preserve manual edits or other data
+    if table is not None:
+        print(f"  Using in-memory master {master_filename} ({len(table)} records)")
+    elif os.path.exists(master_path):
+        print(f"  Loading existing master {master_filename}...")
+        try:
+            table = RecordTable.load(master_path, list_key)
+        except Exception as e:
+            print(f"  Error loading master {master_filename}, starting fresh: {e}")
+
+    if table is None:
+        table = RecordTable()
+    if cache:
+        # The merge works in place; a failed save must not leave a half-merged table cached
+        cache.drop(master_path)
+
+    # Merge new records (the master is normally sorted already, see RecordTable.merge)
+    print("  Merging records...")
+    table.merge(new_records)
+
+    # Save
+    print(f"  Saving {master_filename}...")
+    table.write_json(master_path, list_key, metadata)
+    if cache:
+        cache.put(master_path, table)
+    print(f"  Saved {master_filename} with {len(table)} records.")
+
+def write_store(directory, list_key, file_prefix, records_by_year, metadata_by_year, store=None):
+    store = store or TaipowerStore(directory, list_key, file_prefix)
+    for year, new_records in records_by_year.items():
+        # Seed the store from the master on first use, and pick up rows merged into the
+        # master by the json backend since the store was last written
+        if not store.master_synced(year):
+            master_path = store.master_path(year)
+            print(f"  Importing master {os.path.basename(master_path)} into store...")
+            try:
+                written = store.sync_master(year)
+                print(f"  Imported {written} new/changed records.")
+            except Exception as e:
+                print(f"  Error importing master {master_path}: {e}")
+
+        store.set_year_meta(year, metadata_by_year[year])
+        written = store.append(new_records)
+        print(f"  Store {file_prefix} {year}: {written} new/changed of {len(new_records)} records.")
+    return store
+
+def switch_backend(store, year, backend):
+    # Before `backend` merges a year another backend wrote last, bring its copy up to date.
+    # The JSON master is the common format: refresh it from the current source, then
+    # convert it for parquet (the segments backend imports it itself, see write_store).
+    kind, source = store.year_source(year)
+    target = BACKEND_SOURCES[backend]
+    if kind == target or (kind != "store" and not os.path.exists(source)):
+        return
+    print(f"  {store.file_prefix} {year} was last merged as {kind}, updating the {target} copy...")
+    master_path = store.master_path(year)
+    if kind == "store":
+        store.export_json(year)
+    elif kind == "parquet":
+        df = taipower_columnar.load_frame(store.directory, store.file_prefix, year)
+        metadata = taipower_columnar.read_metadata(source)
+        save_json(master_path, taipower_columnar.frame_to_master(df, store.list_key, metadata))
+    if target == "parquet":
+        taipower_columnar.convert_master(master_path, store.list_key, taipower_columnar.parquet_path(store.directory, store.file_prefix, year))
+
+def export_master(directory, list_key, file_prefix, year):
+    store = TaipowerStore(directory, list_key, file_prefix)
+    path, count = store.export_json(year)
+    print(f"Exported {count} records to {path}")
+
+def process_directory(directory, list_key, file_prefix, backend=DEFAULT_BACKEND, cache=None):
     print(f"Processing directory: {directory}")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
     
     # 1. Identify and Rename Files
     json_files = glob.glob(os.path.join(directory, "*.json"))
@@ -126,56 +256,20 @@ def process_directory(directory, list_key, file_prefix):
             print(f"Error reading {os.path.basename(fp)}: {e}")
             
     # 3. Write Master Files
-    for year, new_records in records_by_year.items():
-        master_filename = f"{file_prefix}_{year}.json"
-        master_path = os.path.join(directory, master_filename)
-        
-        print(f"Updating master file for {year}: {master_filename}")
-        
-        master_data = {
-            "records": {
-                "CATALOG": metadata_by_year[year]["CATALOG"],
-                "START_DATE": "9999-12-31T23:59:59",
-                "END_DATE": "0000-01-01T00:00:00",
-                "UNIT_OF_MEASUREMENT": metadata_by_year[year]["UNIT_OF_MEASUREMENT"],
-                "INTERVAL": metadata_by_year[year]["INTERVAL"],
-                list_key: []
-            }
-        }
-        
-        existing_records_dict = {} # Key: (DATETIME, UNIT_NAME) -> Record
-        
-        # Load existing master if it exists to preserve manual edits or other data
-        if os.path.exists(master_path):
-            print(f"  Loading existing master {master_filename}...")
-            try:
-                existing_master = load_json(master_path)
-                for rec in existing_master["records"][list_key]:
-                    key = (rec["DATETIME"], rec["UNIT_NAME"])
-                    existing_records_dict[key] = rec
-            except Exception as e:
-                print(f"  Error loading master {master_filename}, starting fresh: {e}")
-        
-        # Merge new records
-        for rec in new_records:
-            key = (rec["DATETIME"], rec["UNIT_NAME"])
-            existing_records_dict[key] = rec
-            
-        # Reconstruct list and sort
-        print("  Reconstructing and sorting records...")
-        all_records = list(existing_records_dict.values())
-        all_records.sort(key=lambda x: (x["DATETIME"], x["UNIT_NAME"]))
-        
-        # Update Dates
-        if all_records:
-            master_data["records"][list_key] = all_records
-            master_data["records"]["START_DATE"] = all_records[0]["DATETIME"]
-            master_data["records"]["END_DATE"] = all_records[-1]["DATETIME"]
-        
-        # Save
-        print(f"  Saving {master_filename}...")
-        save_json(master_path, master_data)
-        print(f"  Saved {master_filename} with {len(all_records)} records.")
+    store = cache.store(directory, list_key, file_prefix) if cache else TaipowerStore(directory, list_key, file_prefix)
+    for year in records_by_year:
+        switch_backend(store, year, backend)
+    if backend == "segments":
+        write_store(directory, list_key, file_prefix, records_by_year, metadata_by_year, store)
+    elif backend == "parquet":
+        for year, new_records in records_by_year.items():
+            taipower_columnar.write_parquet(directory, file_prefix, year, new_records, metadata_by_year[year], cache)
+    else:
+        for year, new_records in records_by_year.items():
+            write_master_json(directory, list_key, file_prefix, year, new_records, metadata_by_year[year], cache)
+    # Readers (query, gap_planner) use the copy of the backend that merged last
+    for year in records_by_year:
+        store.record_backend(year, backend)
 
     # 4. Cleanup: Move processed fragment files to raw directory
     if files_to_process:
@@ -208,12 +302,27 @@ def process_directory(directory, list_key, file_prefix):
                 except Exception as e:
                     print(f"    Error moving {fp}: {e}")
 
-def main():
+def main(backend=DEFAULT_BACKEND):
     # Process Flow
-    process_directory(FLOW_DIR, "FLOW_P", "flow")
+    process_directory(FLOW_DIR, "FLOW_P", "flow", backend=backend)
     
     # Process Generators
-    process_directory(GEN_DIR, "NET_P", "generator")
+    process_directory(GEN_DIR, "NET_P", "generator", backend=backend)
 
 if __name__ == "__main__":
-    main()
+    import argparse
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND, help="master storage backend")
+    ap.add_argument("--export", type=int, metavar="YEAR", help="export the segment store of YEAR to {prefix}_{YEAR}.json and exit")
+    ap.add_argument("--convert-parquet", action="store_true", help="convert existing JSON masters to Parquet and exit")
+    args = ap.parse_args()
+
+    if args.convert_parquet:
+        taipower_columnar.convert_masters(FLOW_DIR, "FLOW_P", "flow")
+        taipower_columnar.convert_masters(GEN_DIR, "NET_P", "generator")
+    elif args.export:
+        export_master(FLOW_DIR, "FLOW_P", "flow", args.export)
+        export_master(GEN_DIR, "NET_P", "generator", args.export)
+    else:
+        main(args.backend)
@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import inspect
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+# Batch figure rendering for the process_* scripts.
+#
+# A job is (fn, path, kwargs): fn(path, **kwargs) draws one figure and saves it
+# to path. render(jobs) spreads the jobs over a process pool (Agg backend, CJK
+# fonts set once per worker by configure()), so rendering all dorms scales with
+# the number of cores:
+#
+#   jobs = [(plot_trend, f"plots/full_series/{name}_trend.png", {"name": name, "series": s}) for ...]
+#   plot_batch.render(jobs)
+#
+# fn must be a module-level function and kwargs picklable (Series, arrays, ...),
+# since both are sent to the workers. With skip_unchanged, a job whose inputs
+# (kwargs + the source of fn) hash the same as when its file was last written is
+# not rendered again; the hashes are kept in data/.cache/plot_hashes.json and
+# updated after every render, forced (skip_unchanged=False) or not.
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASE_DIR = os.path.dirname(SRC_DIR)
+STATE_PATH = os.path.join(BASE_DIR, 'data', '.cache', 'plot_hashes.json')
+# Common CJK fonts (macOS names first), falling back to the default sans-serif
+FONT_FAMILY = ['Arial Unicode MS', 'PingFang TC', 'Heiti TC', 'Noto Sans CJK TC', 'sans-serif']
+
+
+def configure():
+    """Non-interactive backend and CJK fonts (per process, before drawing anything)."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    plt.rcParams['font.sans-serif'] = FONT_FAMILY
+    plt.rcParams['axes.unicode_minus'] = False
+
+
+# --- Input hashes ---
+
+def _feed(h, value):
+    if isinstance(value, pd.DataFrame):
+        h.update(repr((list(value.columns), [str(t) for t in value.dtypes])).encode("utf-8"))
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, (pd.Series, pd.Index)):
+        h.update(repr((value.name, str(value.dtype))).encode("utf-8"))
+        h.update(pd.util.hash_pandas_object(value, index=isinstance(value, pd.Series)).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        h.update(repr((value.dtype.str, value.shape)).encode("utf-8"))
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        for key in sorted(value, key=str):
+            h.update(repr(key).encode("utf-8"))
+            _feed(h, value[key])
+    elif isinstance(value, (list, tuple)):
+        h.update(f"{type(value).__name__}{len(value)}".encode("utf-8"))
+        for item in value:
+            _feed(h, item)
+    else:
+        h.update(repr(value).encode("utf-8"))
+
+
+def input_hash(fn, kwargs):
+    """Digest of what a figure is drawn from: the plotting function's source and its inputs."""
+    h = hashlib.blake2b(digest_size=16)
+    try:
+        h.update(inspect.getsource(fn).encode("utf-8"))
+    except (OSError, TypeError):
+        h.update(f"{fn.__module__}.{fn.__qualname__}".encode("utf-8"))
+    _feed(h, kwargs)
+    return h.hexdigest()
+
+
+def load_state(path=STATE_PATH):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+# --- Rendering ---
+
+def _render_one(fn, path, kwargs):
+    import matplotlib.pyplot as plt
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    try:
+        fn(path, **kwargs)
+    finally:
+        plt.close("all")
+    return os.path.exists(path)
+
+
+def render(jobs, workers=None, skip_unchanged=True, state_path=STATE_PATH):
+    """
+    Render [(fn, path, kwargs), ...]; workers=None uses every core, 1 renders in this process.
+    Returns {"rendered": [...], "skipped": [...], "failed": {path: error}}.
+    """
+    state = load_state(state_path)
+    todo = []
+    skipped = []
+    for fn, path, kwargs in jobs:
+        key = os.path.abspath(path)
+        digest = input_hash(fn, kwargs)
+        if skip_unchanged and state.get(key) == digest and os.path.exists(path):
+            skipped.append(path)
+        else:
+            todo.append((fn, path, kwargs, key, digest))
+
+    workers = min(workers or os.cpu_count() or 1, max(len(todo), 1))
+    print(f"Rendering {len(todo)} figure(s) on {workers} process(es), {len(skipped)} unchanged...")
+    t0 = time.perf_counter()
+    rendered = []
+    failed = {}
+
+    def done(item, ok, error=None):
+        fn, path, kwargs, key, digest = item
+        if error is not None:
+            failed[path] = error
+            print(f"  !! {path}: {error}")
+        elif ok:
+            rendered.append(path)
+            state[key] = digest
+            print(f"  -> {path}")
+
+    if workers == 1:
+        configure()
+        for item in todo:
+            try:
+                done(item, _render_one(*item[:3]))
+            except Exception as e:
+                done(item, False, e)
+    elif todo:
+        with ProcessPoolExecutor(max_workers=workers, initializer=configure) as executor:
+            futures = {executor.submit(_render_one, *item[:3]): item for item in todo}
+            for future in as_completed(futures):
+                try:
+                    done(futures[future], future.result())
+                except Exception as e:
+                    done(futures[future], False, e)
+
+    if rendered:
+        save_state(state, state_path)
+    print(f"Rendered {len(rendered)} figure(s) in {time.perf_counter() - t0:.1f} s"
+          + (f", {len(failed)} failed" if failed else ""))
+    return {"rendered": rendered, "skipped": skipped, "failed": failed}
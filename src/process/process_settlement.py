@@ -1,78 +1,83 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
+import sys
 
-# 設定中文字型
-plt.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'PingFang TC', 'Heiti TC', 'sans-serif'] 
-plt.rcParams['axes.unicode_minus'] = False
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from query import query, list_series
 
-def process_settlement():
-    file_path = 'settlement_202601.csv'
-    
-    if not os.path.exists(file_path):
-        print(f"找不到檔案: {file_path}")
-        return
+try:
+    from process import plot_batch
+except ImportError:
+    import plot_batch
 
-    print(f"正在讀取 {file_path} ...")
-    
-    # 讀取 CSV，header 在第 2 行 (index=1)
-    df = pd.read_csv(file_path, header=1)
-    
-    # 處理時間欄位
-    try:
-        df['Datetime'] = pd.to_datetime(df['date']) + pd.to_timedelta(df['hour'], unit='h')
-        df.set_index('Datetime', inplace=True)
-    except Exception as e:
-        print(f"時間格式轉換錯誤: {e}")
-        return
 
-    # 找出所有包含 'Price' 的欄位
-    price_cols = [col for col in df.columns if 'Price' in col]
+# 1. 單一價格欄位的圖
+def plot_price(path, title, col, series):
+    plt.figure(figsize=(12, 6))
+    plt.plot(series.index, series, label=col, color='tab:blue', linewidth=1)
     
-    if not price_cols:
-        print("未找到任何包含 'Price' 的欄位。")
-        return
-        
-    print(f"找到以下價格欄位: {price_cols}")
-
-    # 建立輸出資料夾
-    output_dir = os.path.join('plots', 'settlement_prices')
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    # 1. 為每個價格欄位畫獨立的圖
-    for col in price_cols:
-        plt.figure(figsize=(12, 6))
-        plt.plot(df.index, df[col], label=col, color='tab:blue', linewidth=1)
-        
-        plt.title(f'Settlement 202601 - {col}')
-        plt.xlabel('時間')
-        plt.ylabel('價格')
-        plt.legend()
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        
-        output_img = os.path.join(output_dir, f'{col}.png')
-        plt.savefig(output_img, dpi=100)
-        plt.close()
-        print(f"  -> 已儲存單獨圖表: {output_img}")
+    plt.title(f'{title} - {col}')
+    plt.xlabel('時間')
+    plt.ylabel('價格')
+    plt.legend()
+    plt.grid(True, alpha=0.3)
+    plt.tight_layout()
+    
+    plt.savefig(path, dpi=100)
+    plt.close()
 
-    # 2. 畫一張合併圖表 (比較用)
+# 2. 合併圖表 (比較用)
+def plot_all_prices(path, title, df):
     plt.figure(figsize=(15, 8))
-    for col in price_cols:
+    for col in df.columns:
         plt.plot(df.index, df[col], label=col, linewidth=1.5, alpha=0.8)
     
-    plt.title('Settlement 202601 - 所有價格比較 (All Prices)')
+    plt.title(f'{title} - 所有價格比較 (All Prices)')
     plt.xlabel('時間')
     plt.ylabel('價格')
     plt.legend()
     plt.grid(True, alpha=0.3)
     plt.tight_layout()
     
-    combined_img = os.path.join(output_dir, 'ALL_Prices_Combined.png')
-    plt.savefig(combined_img, dpi=150)
+    plt.savefig(path, dpi=150)
     plt.close()
-    print(f"  -> 已儲存合併圖表: {combined_img}")
+
+def process_settlement(month="2026-01", workers=None, force=False):
+    period = pd.Period(month, freq="M")
+    print(f"正在讀取 {month} 結算資料 ...")
+
+    # 找出所有包含 'Price' 的欄位
+    price_cols = [col for col in list_series("settlement") if 'Price' in col]
+    
+    if not price_cols:
+        print("未找到任何包含 'Price' 的欄位。")
+        return
+
+    # 只讀取該月份的價格欄位
+    df = query([f"settlement:{col}" for col in price_cols], period.start_time, period.end_time)
+    df.columns = price_cols
+    df = df.dropna(how="all")
+    if df.empty:
+        print(f"找不到 {month} 的結算資料")
+        return
+        
+    print(f"找到以下價格欄位: {price_cols}")
+
+    # 為每個價格欄位畫獨立的圖，再畫一張合併圖表 (plot_batch 平行繪製，輸入未變動的圖表會跳過)
+    output_dir = os.path.join('plots', 'settlement_prices')
+    title = f'Settlement {period.strftime("%Y%m")}'
+    jobs = [(plot_price, os.path.join(output_dir, f'{col}.png'), {"title": title, "col": col, "series": df[col]}) for col in price_cols]
+    jobs.append((plot_all_prices, os.path.join(output_dir, 'ALL_Prices_Combined.png'), {"title": title, "df": df[price_cols]}))
+    plot_batch.render(jobs, workers=workers, skip_unchanged=not force)
 
 if __name__ == "__main__":
-    process_settlement()
+    # python src/process/process_settlement.py [YYYY-MM] [--workers N] [--force]
+    import argparse
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("month", nargs="?", default="2026-01", help="YYYY-MM")
+    ap.add_argument("--workers", type=int, help="繪圖 process 數 (預設: CPU 核心數)")
+    ap.add_argument("--force", action="store_true", help="重新繪製所有圖表")
+    args = ap.parse_args()
+    process_settlement(args.month, args.workers, args.force)
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+# Rolling means and seasonal week profiles of many hourly series at once.
+#
+# compute(df) takes a wide frame (DatetimeIndex, one column per building /
+# meter / dorm), puts it on a regular hourly grid and returns
+#
+#   index      the hourly DatetimeIndex (T rows)
+#   columns    df.columns
+#   first/last row of each column's first / last value (-1 if it has none)
+#   rolling    {days: (T, C) trailing mean over days*24 hours}, NaN ignored,
+#              i.e. series.rolling(days*24, min_periods=1).mean() per column
+#   profiles   (4, 168, C) mean per season (SEASONS order) x (weekday*24 + hour)
+#
+# as float32 arrays. Both are done for all columns in one pass: the rolling
+# means from cumulative sums (sum and count of values) along the time axis,
+# the profiles by sorting the rows by slot (season*168 + weekday*24 + hour)
+# once and summing every slot with np.add.reduceat. Columns are processed in
+# blocks of `block` to bound the float64 temporaries.
+
+SEASONS = ['Spring (春)', 'Summer (夏)', 'Autumn (秋)', 'Winter (冬)']
+# Season code of months 1..12 (index 0 unused): Mar-May spring, Jun-Aug summer, Sep-Nov autumn, Dec-Feb winter
+SEASON_OF_MONTH = np.array([3, 3, 3, 0, 0, 0, 1, 1, 1, 2, 2, 2, 3], dtype=np.int16)
+WEEK_HOURS = 7 * 24
+BLOCK = 256
+
+
+def to_hourly(df):
+    """df on a regular hourly grid (mean of the values within each hour, NaN where there are none)."""
+    if not isinstance(df.index, pd.DatetimeIndex):
+        raise TypeError("profiles need a DatetimeIndex")
+    if df.empty:
+        return df
+    if df.index.is_monotonic_increasing and df.index.is_unique and (df.index == df.index.floor("h")).all():
+        return df.reindex(pd.date_range(df.index[0], df.index[-1], freq="h", name=df.index.name))
+    return df.resample("h").mean()
+
+
+def slot_codes(index):
+    """season*168 + weekday*24 + hour of each timestamp (profile row in the flattened (4*168) layout)."""
+    season = SEASON_OF_MONTH[index.month.to_numpy()].astype(np.int64)
+    return season * WEEK_HOURS + index.dayofweek.to_numpy() * 24 + index.hour.to_numpy()
+
+
+def _cumulative(filled, counts):
+    # Running sum and count of values down each column, with a leading zero row (column-major: contiguous per column)
+    rows, cols = filled.shape
+    total = np.zeros((rows + 1, cols), order="F")
+    np.cumsum(filled, axis=0, out=total[1:])
+    n = np.zeros((rows + 1, cols), dtype=np.int32, order="F")
+    np.cumsum(counts, axis=0, out=n[1:])
+    return total, n
+
+
+def _rolling(total, n, window):
+    # Trailing window means from the cumulative sums: rows [i - window + 1, i]
+    rows = len(total) - 1
+    lo = np.maximum(np.arange(1, rows + 1) - window, 0)
+    sums = total[1:] - total[lo]
+    n = n[1:] - n[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, sums / n, np.nan)
+
+
+def _profiles(filled, counts, order, starts, present):
+    sums = np.add.reduceat(filled[order], starts, axis=0)
+    n = np.add.reduceat(counts[order], starts, axis=0)
+    out = np.full((len(SEASONS) * WEEK_HOURS, filled.shape[1]), np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out[present] = np.where(n > 0, sums / n, np.nan)
+    return out
+
+
+def compute(df, windows=(7, 30), block=BLOCK):
+    """Rolling means (window lengths in days) and seasonal week profiles of every column of df."""
+    hourly = to_hourly(df)
+    index = hourly.index
+    rows, cols = hourly.shape
+    result = {
+        "index": index,
+        "columns": hourly.columns,
+        "first": np.full(cols, -1, dtype=np.int64),
+        "last": np.full(cols, -1, dtype=np.int64),
+        "rolling": {days: np.full((rows, cols), np.nan, dtype=np.float32) for days in windows},
+        "profiles": np.full((len(SEASONS), WEEK_HOURS, cols), np.nan, dtype=np.float32),
+    }
+    if not rows or not cols:
+        return result
+
+    slot = slot_codes(index)
+    order = np.argsort(slot, kind="stable")
+    sorted_slot = slot[order]
+    starts = np.flatnonzero(np.r_[True, sorted_slot[1:] != sorted_slot[:-1]])
+    present = sorted_slot[starts]
+
+    for lo in range(0, cols, block):
+        hi = min(lo + block, cols)
+        values = np.asfortranarray(hourly.iloc[:, lo:hi].to_numpy(dtype=np.float64))
+        counts = ~np.isnan(values)
+        filled = np.where(counts, values, 0.0)
+
+        has_any = counts.any(axis=0)
+        result["first"][lo:hi] = np.where(has_any, counts.argmax(axis=0), -1)
+        result["last"][lo:hi] = np.where(has_any, rows - 1 - counts[::-1].argmax(axis=0), -1)
+        total, n = _cumulative(filled, counts)
+        for days in windows:
+            result["rolling"][days][:, lo:hi] = _rolling(total, n, days * 24)
+        profile = _profiles(filled, counts, order, starts, present)
+        result["profiles"][:, :, lo:hi] = profile.reshape(len(SEASONS), WEEK_HOURS, hi - lo)
+    return result
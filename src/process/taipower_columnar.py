@@ -0,0 +1,196 @@
+import os
+import json
+import glob
+import re
+
+import numpy as np
+import pandas as pd
+
+try:
+    from process.taipower_stream import iter_batches
+except ImportError:
+    from taipower_stream import iter_batches
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Columnar (Parquet) storage for Taipower NET_P / FLOW_P records.
+#
+# One file per year, {prefix}_{year}.parquet, with:
+#   DATETIME             timestamp (int64, seconds)
+#   UNIT_NAME, FUEL_TYPE dictionary-encoded strings (any non-numeric field)
+#   NET_P / FLOW_P       float32 (any field whose values are all numeric)
+# The master metadata (CATALOG, UNIT_OF_MEASUREMENT, INTERVAL) is kept in the
+# Parquet schema metadata under b"taipower".
+
+KEY_COLUMNS = ["DATETIME", "UNIT_NAME"]
+META_KEYS = ("CATALOG", "UNIT_OF_MEASUREMENT", "INTERVAL")
+CONVERT_BATCH = 1_000_000  # Records per slice when converting a JSON master
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("The parquet backend needs pyarrow: pip install pyarrow")
+
+
+def parquet_path(directory, file_prefix, year):
+    return os.path.join(directory, f"{file_prefix}_{year}.parquet")
+
+
+def records_to_frame(records):
+    df = pd.DataFrame.from_records(records)
+    if df.empty:
+        return df
+
+    df["DATETIME"] = pd.to_datetime(df["DATETIME"], format="ISO8601").astype("datetime64[s]")
+
+    for col in df.columns:
+        if col == "DATETIME":
+            continue
+        values = df[col]
+        numeric = pd.to_numeric(values, errors="coerce")
+        # Numeric if every non-empty value parsed
+        non_empty = values.notna() & (values.astype(str).str.strip() != "")
+        if non_empty.any() and numeric[non_empty].notna().all():
+            df[col] = numeric.astype(np.float32)
+        else:
+            df[col] = values.astype("category")
+    return df
+
+
+def concat_frames(frames):
+    """Concatenate record frames (later frames win on duplicate keys), sorted by KEY_COLUMNS."""
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    first = frames[0]
+    for col in {c for f in frames for c in f.columns} - {"DATETIME"}:
+        # The first frame that has the column decides its type
+        base = next(f[col].dtype for f in frames if col in f.columns)
+        for f in frames:
+            if col not in f.columns:
+                continue
+            if base == np.float32 and f[col].dtype != np.float32:
+                f[col] = pd.to_numeric(f[col].astype(object), errors="coerce").astype(np.float32)
+            elif base != np.float32 and f[col].dtype == np.float32:
+                f[col] = f[col].astype(str).astype("category")
+        # Align the dictionary encoding so concat keeps it
+        if base != np.float32 and len(frames) > 1:
+            cats = None
+            for f in frames:
+                if col in f.columns:
+                    c = f[col].astype("category").cat.categories
+                    cats = c if cats is None else cats.union(c)
+            for f in frames:
+                if col in f.columns:
+                    f[col] = f[col].astype(pd.CategoricalDtype(cats))
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else first
+    df = df.drop_duplicates(subset=KEY_COLUMNS, keep="last")
+    return df.sort_values(KEY_COLUMNS, kind="stable").reset_index(drop=True)
+
+
+def merge_frames(old, new):
+    return concat_frames([old, new])
+
+
+def write_frame(path, df, metadata):
+    require_pyarrow()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    schema_meta = dict(table.schema.metadata or {})
+    schema_meta[b"taipower"] = json.dumps(metadata, ensure_ascii=False).encode("utf-8")
+    table = table.replace_schema_metadata(schema_meta)
+    tmp_path = path + ".tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+def read_metadata(path):
+    require_pyarrow()
+    schema_meta = pq.read_schema(path).metadata or {}
+    raw = schema_meta.get(b"taipower")
+    return json.loads(raw) if raw else {}
+
+
+def load_frame(directory, file_prefix, year, columns=None):
+    """Load one year of generator/flow history as a DataFrame."""
+    require_pyarrow()
+    path = parquet_path(directory, file_prefix, year)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    return pd.read_parquet(path, columns=columns)
+
+
+def write_parquet(directory, file_prefix, year, new_records, metadata, cache=None):
+    path = parquet_path(directory, file_prefix, year)
+    print(f"Updating parquet master for {year}: {os.path.basename(path)}")
+
+    # cache: organize_taipower_data.MasterCache, keeps the frame between merges
+    old = cache.get(path) if cache else None
+    if old is None and os.path.exists(path):
+        try:
+            old = pd.read_parquet(path)
+        except Exception as e:
+            print(f"  Error loading {path}, starting fresh: {e}")
+
+    df = merge_frames(old, records_to_frame(new_records))
+    write_frame(path, df, {k: metadata.get(k, "") for k in META_KEYS})
+    if cache:
+        cache.put(path, df)
+    print(f"  Saved {os.path.basename(path)} with {len(df)} records.")
+    return len(df)
+
+
+def frame_to_master(df, list_key, metadata):
+    """Rebuild the legacy {"records": {...}} JSON layout from a frame."""
+    out = df.copy()
+    out["DATETIME"] = out["DATETIME"].dt.strftime("%Y-%m-%dT%H:%M:%S")
+    for col in out.columns:
+        if out[col].dtype == np.float32:
+            # Round-trip through str to get the shortest float32 repr (123.4, not 123.40000153)
+            out[col] = out[col].astype(str).astype(np.float64)
+        out[col] = out[col].astype(object).where(out[col].notna(), None)
+    records = out.to_dict(orient="records")
+    return {
+        "records": {
+            "CATALOG": metadata.get("CATALOG", ""),
+            "START_DATE": records[0]["DATETIME"] if records else "9999-12-31T23:59:59",
+            "END_DATE": records[-1]["DATETIME"] if records else "0000-01-01T00:00:00",
+            "UNIT_OF_MEASUREMENT": metadata.get("UNIT_OF_MEASUREMENT", ""),
+            "INTERVAL": metadata.get("INTERVAL", ""),
+            list_key: records,
+        }
+    }
+
+
+def convert_master(master_path, list_key, out_path):
+    print(f"Converting {os.path.basename(master_path)}...")
+    # Stream the master and convert it in slices: only the compact frames are held
+    meta = {}
+    frames = []
+    pending = []
+    for batch in iter_batches(master_path, list_key, meta=meta):
+        pending.extend(batch)
+        if len(pending) >= CONVERT_BATCH:
+            frames.append(records_to_frame(pending))
+            pending = []
+    if pending:
+        frames.append(records_to_frame(pending))
+    df = concat_frames(frames)
+    del frames
+    metadata = {k: meta.get(k, "") for k in META_KEYS}
+    write_frame(out_path, df, metadata)
+    print(f"  {os.path.getsize(master_path) / 1e6:.1f} MB -> {os.path.getsize(out_path) / 1e6:.1f} MB ({len(df)} records)")
+
+
+def convert_masters(directory, list_key, file_prefix):
+    """One-shot conversion of every {prefix}_{year}.json master to Parquet."""
+    require_pyarrow()
+    master_pattern = re.compile(rf"{file_prefix}_(\d{{4}})\.json$")
+    for path in sorted(glob.glob(os.path.join(directory, f"{file_prefix}_*.json"))):
+        m = master_pattern.search(os.path.basename(path))
+        if m:
+            convert_master(path, list_key, parquet_path(directory, file_prefix, m.group(1)))
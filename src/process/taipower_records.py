@@ -0,0 +1,289 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+try:
+    from process.taipower_stream import iter_batches
+except ImportError:
+    from taipower_stream import iter_batches
+
+# Compact in-memory table of Taipower NET_P / FLOW_P records.
+#
+# A year of generator data is ~17M records; as dicts that is several GB, almost
+# all of it the same keys, unit names and fuel types repeated. RecordTable keeps
+#
+#   ts       int64 seconds (DATETIME)
+#   codes    one int32 array per other field, indexes into a ValuePool of the
+#            distinct values of that field (-1 = null / absent)
+#   layout   int32 index into a pool of key tuples, so each record is written
+#            back with exactly its own keys in its own order
+#
+# i.e. ~20 bytes per record. merge() keeps the table sorted by (DATETIME,
+# UNIT_NAME) with new records winning on duplicate keys, done with numpy on
+# the overlapping tail only (appends for snapshots past the end), and
+# write_json() streams the master layout back out without building dicts.
+# DATETIME is normalised to YYYY-MM-DDTHH:MM:SS.
+
+WRITE_CHUNK = 20_000  # Records serialised per write
+
+
+class ValuePool:
+    # Interned distinct values <-> int codes
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    @staticmethod
+    def _key(value):
+        # 1, 1.0 and True hash alike; keep them apart so they are written back as read.
+        # Strings and key layouts (tuples of strings) are used as they are.
+        if type(value) is str or type(value) is tuple:
+            return value
+        if type(value) in (int, float, bool):
+            return (type(value).__name__, repr(value)) # repr keeps -0.0 and gives every NaN the same key
+        return (type(value).__name__, json.dumps(value, sort_keys=True))
+
+    def code(self, value):
+        key = self._key(value)
+        code = self._codes.get(key)
+        if code is None:
+            code = self._codes[key] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def codes(self, values):
+        """Global codes for a batch of values (None -> -1)."""
+        values = np.fromiter(values, dtype=object, count=len(values))
+        types = pd.unique(np.fromiter(map(type, values), dtype=object, count=len(values)))
+        if len(types) == 1 and types[0] is type(None):
+            return np.full(len(values), -1, dtype=np.int32)
+        if len(types) == 1 and not (types[0] is float and np.signbit(values.astype(float)[values == 0]).any()):
+            # One type (and no -0.0): values that compare equal are the same value, factorize them as they are
+            local, uniques = pd.factorize(values, use_na_sentinel=False)
+        else:
+            # 1 / 1.0 / True, None / NaN, 0.0 / -0.0 compare (or factorize) alike: factorize on the pool keys
+            local, _ = pd.factorize(np.fromiter(map(self._key, values), dtype=object, count=len(values)))
+            uniques = values[np.unique(local, return_index=True)[1]]
+        mapping = np.fromiter((-1 if v is None else self.code(v) for v in uniques), dtype=np.int32, count=len(uniques))
+        return mapping[local]
+
+    def __len__(self):
+        return len(self.values)
+
+
+def _to_seconds(texts):
+    return pd.to_datetime(pd.Index(texts, dtype=object), format="ISO8601").values.astype("datetime64[s]").astype(np.int64)
+
+
+class RecordTable:
+    def __init__(self):
+        self.fields = [] # Fields other than DATETIME, first-seen order
+        self.pools = {}
+        self.layouts = ValuePool()
+        self.ts = np.empty(0, dtype=np.int64)
+        self.layout = np.empty(0, dtype=np.int32)
+        self.codes = {}
+        self._pending = []
+
+    def __len__(self):
+        self._consolidate()
+        return len(self.ts)
+
+    # --- Building ---
+
+    def extend(self, records):
+        """Append records as they are (no sorting / deduplication, see merge)."""
+        if not records:
+            return
+        inverse, stamps = pd.factorize(np.asarray([rec["DATETIME"] for rec in records], dtype=object))
+        ts = _to_seconds(stamps)[inverse]
+        # Almost every record has a known layout: plain dict lookups, the pool only for new ones
+        known = self.layouts._codes
+        layout = [known.get(k) for k in map(tuple, records)]
+        if None in layout:
+            layout = [self.layouts.code(tuple(rec)) for rec in records]
+        layout = np.asarray(layout, dtype=np.int32)
+        chunk = {"ts": ts, "layout": layout}
+        for field in {k for lay in set(layout.tolist()) for k in self.layouts.values[lay]} - {"DATETIME"}:
+            if field not in self.pools:
+                self.fields.append(field)
+                self.pools[field] = ValuePool()
+            chunk[field] = self.pools[field].codes([rec.get(field) for rec in records])
+        self._pending.append(chunk)
+
+    def _consolidate(self):
+        if not self._pending:
+            return
+        n = [len(self.ts)] + [len(c["ts"]) for c in self._pending]
+        self.ts = np.concatenate([self.ts] + [c["ts"] for c in self._pending])
+        self.layout = np.concatenate([self.layout] + [c["layout"] for c in self._pending])
+        for field in self.fields:
+            parts = [self.codes.get(field, np.full(n[0], -1, dtype=np.int32))]
+            for size, c in zip(n[1:], self._pending):
+                parts.append(c.get(field, np.full(size, -1, dtype=np.int32)))
+            self.codes[field] = np.concatenate(parts)
+        self._pending = []
+
+    @classmethod
+    def load(cls, path, list_key, start=None, end=None, units=None, meta=None):
+        """Read a master/snapshot file (streamed, see taipower_stream) into a table."""
+        table = cls()
+        for batch in iter_batches(path, list_key, start, end, units, meta):
+            table.extend(batch)
+        table._consolidate()
+        return table
+
+    # --- Ordering ---
+
+    def _unit_rank(self, codes):
+        # Rank of each unit name in string order, so the sort matches (DATETIME, UNIT_NAME)
+        pool = self.pools.get("UNIT_NAME")
+        if pool is None:
+            return np.full(len(codes), -1, dtype=np.int64)
+        order = sorted(range(len(pool)), key=lambda i: str(pool.values[i]))
+        rank = np.empty(len(pool) + 1, dtype=np.int64)
+        rank[order] = np.arange(len(pool))
+        rank[-1] = -1 # code -1 (no unit) sorts first
+        return rank[codes]
+
+    def is_sorted(self, stop=None):
+        """Strictly increasing (DATETIME, UNIT_NAME) over the first `stop` records."""
+        ts = self.ts[:stop]
+        if len(ts) < 2:
+            return True
+        rank = self._unit_rank(self.codes.get("UNIT_NAME", np.full(len(self.ts), -1, np.int32))[:stop])
+        dt = np.diff(ts)
+        return bool(np.all((dt > 0) | ((dt == 0) & (np.diff(rank) > 0))))
+
+    def _take(self, index):
+        self.ts = self.ts[index]
+        self.layout = self.layout[index]
+        for field in self.fields:
+            self.codes[field] = self.codes[field][index]
+
+    def _sort_tail(self, start):
+        # Sort records [start:] by key, keeping the last record of each key
+        units = self.codes.get("UNIT_NAME", np.full(len(self.ts), -1, np.int32))
+        ts = self.ts[start:]
+        rank = self._unit_rank(units[start:])
+        order = np.lexsort((np.arange(len(ts)), rank, ts))
+        ts, rank = ts[order], rank[order]
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = (ts[1:] != ts[:-1]) | (rank[1:] != rank[:-1])
+        self._take(np.concatenate([np.arange(start), start + order[last]]))
+
+    def merge(self, records):
+        """Merge records into the (sorted) table; new records win on duplicate keys."""
+        self._consolidate()
+        n = len(self.ts)
+        sorted_before = self.is_sorted()
+        self.extend(records)
+        self._consolidate()
+        if len(self.ts) == n:
+            if not sorted_before:
+                self._sort_tail(0)
+            return self
+        if not sorted_before:
+            print("  Master is not sorted, falling back to full sort...")
+            self._sort_tail(0)
+            return self
+        # Everything before the first new timestamp stays where it is
+        start = int(np.searchsorted(self.ts[:n], self.ts[n:].min(), side="left"))
+        self._sort_tail(start)
+        return self
+
+    # --- Output ---
+
+    def datetimes(self, index):
+        return np.datetime_as_string(self.ts[index].astype("datetime64[s]"), unit="s")
+
+    def iter_json(self, chunk=WRITE_CHUNK):
+        """Serialised records (minified, as json.dumps with ensure_ascii=False), one string per chunk."""
+        self._consolidate()
+        # Pre-encoded values; index -1 (null) hits the trailing "null"
+        encoded = {}
+        for field in self.fields:
+            vals = [json.dumps(v, ensure_ascii=False) for v in self.pools[field].values] + ["null"]
+            encoded[field] = np.array(vals, dtype=object)
+        key_text = {k: json.dumps(k, ensure_ascii=False) + ":" for lay in self.layouts.values for k in lay}
+        for lo in range(0, len(self.ts), chunk):
+            hi = min(lo + chunk, len(self.ts))
+            stamps, inverse = np.unique(self.ts[lo:hi], return_inverse=True)
+            ts_text = np.array(['"' + s + '"' for s in np.datetime_as_string(stamps.astype("datetime64[s]"), unit="s")], dtype=object)[inverse]
+            out = np.empty(hi - lo, dtype=object)
+            layouts = self.layout[lo:hi]
+            for lay in np.unique(layouts):
+                mask = layouts == lay
+                parts = None
+                for i, field in enumerate(self.layouts.values[lay]):
+                    value = ts_text[mask] if field == "DATETIME" else encoded[field][self.codes[field][lo:hi][mask]]
+                    piece = ("{" if i == 0 else ",") + key_text[field]
+                    parts = piece + value if parts is None else parts + piece + value
+                out[mask] = "{}" if parts is None else parts + "}"
+            yield ",".join(out.tolist())
+
+    def write_json(self, path, list_key, metadata):
+        """Write the {prefix}_{year}.json master layout (same bytes as save_json of the dicts)."""
+        self._consolidate()
+        head = {
+            "CATALOG": metadata.get("CATALOG", ""),
+            "START_DATE": str(self.datetimes(0)) if len(self.ts) else "9999-12-31T23:59:59",
+            "END_DATE": str(self.datetimes(-1)) if len(self.ts) else "0000-01-01T00:00:00",
+            "UNIT_OF_MEASUREMENT": metadata.get("UNIT_OF_MEASUREMENT", ""),
+            "INTERVAL": metadata.get("INTERVAL", ""),
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('{"records":{')
+            for k, v in head.items():
+                f.write(json.dumps(k, ensure_ascii=False) + ":" + json.dumps(v, ensure_ascii=False) + ",")
+            f.write(json.dumps(list_key, ensure_ascii=False) + ":[")
+            for i, text in enumerate(self.iter_json()):
+                if i:
+                    f.write(",")
+                f.write(text)
+            f.write("]}}")
+
+    def records(self, start=0, stop=None):
+        """Records [start:stop] as dicts (for small slices)."""
+        self._consolidate()
+        stop = len(self.ts) if stop is None else stop
+        stamps = self.datetimes(slice(start, stop))
+        out = []
+        for j, i in enumerate(range(start, stop)):
+            rec = {}
+            for field in self.layouts.values[self.layout[i]]:
+                if field == "DATETIME":
+                    rec[field] = str(stamps[j])
+                else:
+                    code = self.codes[field][i]
+                    rec[field] = self.pools[field].values[code] if code >= 0 else None
+            out.append(rec)
+        return out
+
+    def to_frame(self):
+        """
+        DataFrame for analysis, built from the codes without any dicts: DATETIME as
+        datetime64[s], numeric fields as float32, other fields as categoricals.
+        """
+        self._consolidate()
+        df = pd.DataFrame({"DATETIME": self.ts.astype("datetime64[s]")})
+        for field in self.fields:
+            values = pd.Index(self.pools[field].values, dtype=object)
+            codes = self.codes[field]
+            numeric = pd.to_numeric(values, errors="coerce")
+            non_empty = ~values.isna() & (values.astype(str).str.strip() != "")
+            if len(values) and non_empty.any() and not np.isnan(numeric[non_empty]).any():
+                table = np.append(np.asarray(numeric, dtype=np.float32), np.float32("nan"))
+                df[field] = table[codes]
+            else:
+                # Values that print alike (1 and "1") share a category
+                remap, cats = pd.factorize(values.astype(str))
+                remap = np.append(remap, -1).astype(np.int32)
+                df[field] = pd.Categorical.from_codes(remap[codes], categories=cats)
+        return df
+
+
+def load_frame_json(path, list_key, start=None, end=None, units=None):
+    """Load a JSON master (filtered while streaming) as a compact DataFrame."""
+    return RecordTable.load(path, list_key, start, end, units).to_frame()
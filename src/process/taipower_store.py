@@ -0,0 +1,366 @@
+import os
+import json
+import heapq
+import zlib
+import re
+
+try:
+    from process.taipower_stream import iter_batches
+    from process.taipower_columnar import parquet_path
+except ImportError:
+    from taipower_stream import iter_batches
+    from taipower_columnar import parquet_path
+
+# Append-only store for Taipower NET_P / FLOW_P records.
+#
+# Layout (under <directory>/store):
+#   meta.json                 # per-year CATALOG / UNIT_OF_MEASUREMENT / INTERVAL
+#   2025-06/index.tsv         # DATETIME \t UNIT_NAME \t crc32 (one line per stored row)
+#   2025-06/seg_000001.jsonl  # one record per line, sorted by (DATETIME, UNIT_NAME)
+#
+# A merge only touches the month partitions present in the new snapshot: rows
+# whose key is new (or whose content changed) are written as a new segment and
+# their keys appended to the partition index. Readers merge the sorted segments
+# and keep the last version of each key, so the master JSON layout can still be
+# exported on demand.
+#
+# <directory>/.backends.json records which backend (organize_taipower_data
+# BACKENDS) last merged each year, so readers use the copy that is current
+# (year_source) instead of one a previous backend left behind.
+
+STORE_DIRNAME = "store"
+BACKENDS_FILE = ".backends.json"  # {file_prefix: {year: backend}}
+# Backend -> the source kind year_source returns for it
+BACKEND_SOURCES = {"segments": "store", "parquet": "parquet", "json": "json"}
+COMPACT_SEGMENTS = 32  # Merge a partition into one segment once it has this many
+IMPORT_BATCH = 200_000  # Records per append when importing a master
+
+_segment_pattern = re.compile(r"seg_(\d{6})\.jsonl$")
+_partition_pattern = re.compile(r"^\d{4}-\d{2}$")
+
+
+def record_key(rec):
+    return (rec["DATETIME"], rec["UNIT_NAME"])
+
+
+def record_digest(line):
+    return format(zlib.crc32(line.encode("utf-8")), "08x")
+
+
+def dump_record(rec):
+    return json.dumps(rec, ensure_ascii=False, separators=(',', ':'))
+
+
+class TaipowerStore:
+    def __init__(self, directory, list_key, file_prefix):
+        self.directory = directory
+        self.list_key = list_key
+        self.file_prefix = file_prefix
+        self.root = os.path.join(directory, STORE_DIRNAME)
+        # Loaded partition indexes: partition -> {(DATETIME, UNIT_NAME): crc32}
+        self.indexes = {}
+        self._meta = None
+
+    # --- Metadata ---
+
+    def _meta_path(self):
+        return os.path.join(self.root, "meta.json")
+
+    def get_meta(self):
+        if self._meta is None:
+            path = self._meta_path()
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._meta = json.load(f)
+            else:
+                self._meta = {}
+        return self._meta
+
+    def set_year_meta(self, year, meta):
+        # Updates the given keys; the others (e.g. "master", see master_synced) are kept
+        all_meta = self.get_meta()
+        year = str(year)
+        merged = {**all_meta.get(year, {}), **meta}
+        if all_meta.get(year) == merged:
+            return
+        all_meta[year] = merged
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self._meta_path() + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(all_meta, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self._meta_path())
+
+    # --- Partitions ---
+
+    def _partition_dir(self, partition):
+        return os.path.join(self.root, partition)
+
+    def partitions(self, year=None):
+        if not os.path.isdir(self.root):
+            return []
+        parts = sorted(p for p in os.listdir(self.root) if _partition_pattern.match(p))
+        if year is not None:
+            parts = [p for p in parts if p.startswith(f"{year}-")]
+        return parts
+
+    def years(self):
+        return sorted({int(p[:4]) for p in self.partitions()})
+
+    def index_path(self, partition):
+        return os.path.join(self._partition_dir(partition), "index.tsv")
+
+    def last_write_ns(self, year):
+        """mtime of the newest partition index of a year (every append writes one), 0 if none."""
+        mtimes = [os.stat(self.index_path(p)).st_mtime_ns for p in self.partitions(year) if os.path.exists(self.index_path(p))]
+        return max(mtimes, default=0)
+
+    def segments(self, partition):
+        part_dir = self._partition_dir(partition)
+        if not os.path.isdir(part_dir):
+            return []
+        return sorted(
+            os.path.join(part_dir, f) for f in os.listdir(part_dir) if _segment_pattern.match(f)
+        )
+
+    def _next_segment_path(self, partition):
+        segs = self.segments(partition)
+        n = int(_segment_pattern.search(segs[-1]).group(1)) + 1 if segs else 1
+        return os.path.join(self._partition_dir(partition), f"seg_{n:06d}.jsonl")
+
+    def load_index(self, partition):
+        if partition in self.indexes:
+            return self.indexes[partition]
+        index = {}
+        index_path = self.index_path(partition)
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t")
+                    if len(parts) == 3:
+                        index[(parts[0], parts[1])] = parts[2]
+        self.indexes[partition] = index
+        return index
+
+    # --- JSON master sync ---
+    # The json backend only rewrites {prefix}_{year}.json. The signature of the master
+    # the store last absorbed (or exported) is kept in the year meta, so rows merged into
+    # the master while another backend was active can be imported when the store is used again.
+
+    def master_path(self, year):
+        return os.path.join(self.directory, f"{self.file_prefix}_{year}.json")
+
+    @staticmethod
+    def _file_signature(path):
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime_ns]
+
+    def master_synced(self, year):
+        """True unless the master was written after the store and differs from the one last synced."""
+        path = self.master_path(year)
+        if not os.path.exists(path):
+            return True
+        signature = self._file_signature(path)
+        if self.get_meta().get(str(year), {}).get("master") == signature:
+            return True
+        return signature[1] <= self.last_write_ns(year)
+
+    def sync_master(self, year):
+        """Merge the master into the store if it has rows the store has not seen. Returns rows written."""
+        if self.master_synced(year):
+            return 0
+        path = self.master_path(year)
+        written = self.import_master(path)
+        self.set_year_meta(year, {"master": self._file_signature(path)})
+        return written
+
+    # --- Active backend ---
+
+    def _backends_path(self):
+        return os.path.join(self.directory, BACKENDS_FILE)
+
+    def _load_backends(self):
+        try:
+            with open(self._backends_path(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def active_backend(self, year):
+        """Backend that last merged this year, or None if not recorded."""
+        return self._load_backends().get(self.file_prefix, {}).get(str(year))
+
+    def record_backend(self, year, backend):
+        backends = self._load_backends()
+        if backends.get(self.file_prefix, {}).get(str(year)) == backend:
+            return
+        backends.setdefault(self.file_prefix, {})[str(year)] = backend
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._backends_path() + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(backends, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self._backends_path())
+
+    def year_source(self, year):
+        """
+        Where the current data of a year is read from: ("store", [partition, ...]),
+        ("parquet", path) or ("json", path of the master, which may not exist).
+        That is the copy of the backend that last merged the year; for years without a
+        record (written before backends were recorded) the most recently written copy.
+        """
+        sources = {}
+        parts = self.partitions(year)
+        if parts:
+            sources["store"] = (parts, self.last_write_ns(year))
+        for kind, path in (("parquet", parquet_path(self.directory, self.file_prefix, year)), ("json", self.master_path(year))):
+            if os.path.exists(path):
+                sources[kind] = (path, os.stat(path).st_mtime_ns)
+        kind = BACKEND_SOURCES.get(self.active_backend(year))
+        if kind not in sources:
+            if not sources:
+                return "json", self.master_path(year)
+            kind = max(sources, key=lambda k: sources[k][1])
+        return kind, sources[kind][0]
+
+    # --- Write path ---
+
+    def append(self, records):
+        """Store records, writing only rows that are new or changed. Returns the number written."""
+        by_partition = {}
+        for rec in records:
+            by_partition.setdefault(rec["DATETIME"][:7], []).append(rec)
+
+        written = 0
+        for partition, recs in sorted(by_partition.items()):
+            index = self.load_index(partition)
+
+            # Last occurrence of a key in the batch wins, same as the JSON merge
+            pending = {}
+            for rec in recs:
+                line = dump_record(rec)
+                key = record_key(rec)
+                digest = record_digest(line)
+                if index.get(key) != digest:
+                    pending[key] = (line, digest)
+                else:
+                    pending.pop(key, None)
+
+            if not pending:
+                continue
+
+            part_dir = self._partition_dir(partition)
+            os.makedirs(part_dir, exist_ok=True)
+            seg_path = self._next_segment_path(partition)
+            keys = sorted(pending)
+            tmp_path = seg_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for key in keys:
+                    f.write(pending[key][0])
+                    f.write("\n")
+            os.replace(tmp_path, seg_path)
+
+            # The index is appended after the segment is in place; if we crash in
+            # between, the rows are simply written again on the next merge.
+            with open(self.index_path(partition), 'a', encoding='utf-8') as f:
+                for key in keys:
+                    digest = pending[key][1]
+                    f.write(f"{key[0]}\t{key[1]}\t{digest}\n")
+                    index[key] = digest
+
+            written += len(keys)
+
+            if len(self.segments(partition)) >= COMPACT_SEGMENTS:
+                self.compact(partition)
+
+        return written
+
+    def compact(self, partition):
+        segs = self.segments(partition)
+        if len(segs) <= 1:
+            return
+        part_dir = self._partition_dir(partition)
+        tmp_path = os.path.join(part_dir, "compact.jsonl.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for rec in self._merge_segments(segs):
+                f.write(dump_record(rec))
+                f.write("\n")
+        # Keep the highest segment number so later appends still sort after it
+        os.replace(tmp_path, segs[-1])
+        for seg in segs[:-1]:
+            os.remove(seg)
+
+    def import_master(self, master_path):
+        """Merge a {prefix}_{year}.json master file into the store (master rows win)."""
+        # Streamed in batches so a year never has to be held in memory at once
+        meta = {}
+        written = 0
+        pending = []
+        touched = set()
+        for batch in iter_batches(master_path, self.list_key, meta=meta):
+            pending.extend(batch)
+            if len(pending) >= IMPORT_BATCH:
+                touched.update(rec["DATETIME"][:7] for rec in pending)
+                written += self.append(pending)
+                pending = []
+        if pending:
+            touched.update(rec["DATETIME"][:7] for rec in pending)
+            written += self.append(pending)
+        if touched:
+            year = min(touched)[:4]
+            self.set_year_meta(year, {k: meta.get(k, "") for k in ("CATALOG", "UNIT_OF_MEASUREMENT", "INTERVAL")})
+        # One segment per partition, as a single append would have left it
+        for partition in sorted(touched):
+            self.compact(partition)
+        return written
+
+    # --- Read path ---
+
+    @staticmethod
+    def _iter_segment(seg_no, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    rec = json.loads(line)
+                    yield record_key(rec), seg_no, rec
+
+    def _merge_segments(self, segs):
+        # Each segment is sorted; for equal keys the newest segment wins
+        streams = [self._iter_segment(-i, path) for i, path in enumerate(segs)]
+        last_key = None
+        for key, _, rec in heapq.merge(*streams, key=lambda item: (item[0], item[1])):
+            if key != last_key:
+                last_key = key
+                yield rec
+
+    def iter_partition(self, partition):
+        """Deduplicated records of one month partition ("2025-06") in (DATETIME, UNIT_NAME) order."""
+        return self._merge_segments(self.segments(partition))
+
+    def iter_records(self, year=None):
+        """Yield deduplicated records in (DATETIME, UNIT_NAME) order."""
+        for partition in self.partitions(year):
+            yield from self.iter_partition(partition)
+
+    def to_master(self, year):
+        """Build the legacy {"records": {...}} master layout for one year."""
+        meta = self.get_meta().get(str(year), {})
+        recs = list(self.iter_records(year))
+        return {
+            "records": {
+                "CATALOG": meta.get("CATALOG", ""),
+                "START_DATE": recs[0]["DATETIME"] if recs else "9999-12-31T23:59:59",
+                "END_DATE": recs[-1]["DATETIME"] if recs else "0000-01-01T00:00:00",
+                "UNIT_OF_MEASUREMENT": meta.get("UNIT_OF_MEASUREMENT", ""),
+                "INTERVAL": meta.get("INTERVAL", ""),
+                self.list_key: recs,
+            }
+        }
+
+    def export_json(self, year, path=None):
+        path = path or self.master_path(year)
+        master = self.to_master(year)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(master, f, ensure_ascii=False, separators=(',', ':'))
+        if path == self.master_path(year):
+            # Same rows as the store: nothing to import from it later
+            self.set_year_meta(year, {"master": self._file_signature(path)})
+        return path, len(master["records"][self.list_key])
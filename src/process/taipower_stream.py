@@ -0,0 +1,234 @@
+import os
+import re
+import sys
+import json
+from datetime import date, datetime
+
+# Streaming reader for Taipower {prefix}_{year}.json masters and snapshots.
+#
+# json.load on a year of generator data (~190 MB) builds several GB of dicts.
+# iter_records() walks the {"records": {..., "NET_P": [...]}} layout with a
+# small rolling buffer instead and yields one record at a time, so memory stays
+# at about CHUNK_SIZE plus one batch of records whatever the file size:
+#
+#   for rec in iter_records(path, "NET_P", start="2025-06-01", end="2025-06-30", units={"興達#1"}):
+#       ...
+#
+# Records are decoded in batches: the buffer is cut at the last "},{" and the
+# slice decoded as one JSON list. A cut that falls inside a string leaves an
+# unterminated string, so such a batch fails to decode and the records are
+# read one by one with raw_decode instead. Date and unit filters are applied
+# per batch, before anything is handed to the caller.
+#
+#   python src/process/taipower_stream.py data/taipower_generators/generator_2025.json --start 2025-06-01 -o june.csv
+
+CHUNK_SIZE = 1 << 20  # Characters read per refill
+
+_ws = re.compile(r"\s*")
+_decoder = json.JSONDecoder()
+
+
+class _Scanner:
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.no_cut = False # No decodable batch in the current buffer
+
+    def fill(self):
+        # Drop the consumed text and append the next chunk; False at end of file
+        data = self.f.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        self.no_cut = False
+        return True
+
+    def peek(self):
+        while True:
+            self.pos = _ws.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r}, found {found!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decode one complete JSON value, reading more of the file until it fits."""
+        while True:
+            self.peek()
+            try:
+                val, end = _decoder.raw_decode(self.buf, self.pos)
+                # A number at the very end of the buffer may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return val
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+    def _batch(self, tries=4):
+        # Decode up to the last "},{" that is a record boundary (earlier ones if it was inside a string)
+        cut = len(self.buf)
+        for _ in range(tries):
+            cut = self.buf.rfind("},{", self.pos, cut)
+            if cut <= self.pos:
+                return None
+            try:
+                batch = _decoder.decode("[" + self.buf[self.pos:cut + 1] + "]")
+            except json.JSONDecodeError:
+                continue
+            self.pos = cut + 2
+            return batch
+        return None
+
+    def batches(self):
+        """Lists of records of the array whose "[" was just consumed."""
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            # Refill once at most half a chunk is left, so record-by-record reads stay amortized
+            if len(self.buf) - self.pos < self.chunk_size // 2 and not self.eof:
+                self.fill()
+            batch = None if self.no_cut else self._batch()
+            if batch is not None:
+                yield batch
+                continue
+            self.no_cut = True
+            # Last record of the array, pretty-printed files, or a cut inside a string
+            yield [self.value()]
+            sep = self.peek()
+            self.pos += 1
+            if sep == "]":
+                return
+            if sep != ",":
+                raise ValueError(f"Expected ',' or ']' in record list, found {sep!r}")
+
+
+def _bound(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat(timespec="seconds")
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value).replace(" ", "T")
+
+
+def _timestamp(rec):
+    # Masters use DATETIME; some raw snapshots still carry "2025-06-01 00:00" in DATE
+    ts = rec.get("DATETIME")
+    if ts is None:
+        ts = rec.get("DATE", "").replace(" ", "T")
+    return ts
+
+
+def _walk(path, list_key, meta, chunk_size):
+    # Unfiltered record batches of records[list_key]; scalar fields of "records" go to meta
+    with open(path, "r", encoding="utf-8-sig") as f:
+        scan = _Scanner(f, chunk_size)
+        scan.expect("{")
+        while scan.peek() != "}":
+            key = scan.value()
+            scan.expect(":")
+            if key != "records":
+                scan.value()
+            else:
+                scan.expect("{")
+                while scan.peek() != "}":
+                    field = scan.value()
+                    scan.expect(":")
+                    if field == list_key:
+                        scan.expect("[")
+                        yield from scan.batches()
+                    else:
+                        meta[field] = scan.value()
+                    if scan.peek() == ",":
+                        scan.pos += 1
+                scan.expect("}")
+            if scan.peek() == ",":
+                scan.pos += 1
+
+
+def iter_batches(path, list_key, start=None, end=None, units=None, meta=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield lists of records of records[list_key], keeping only DATETIME in [start, end]
+    (inclusive, ISO strings / dates / datetimes; a date-only end covers the whole day) and
+    UNIT_NAME in units. Scalar fields of "records" (CATALOG, INTERVAL, ...) are put in meta.
+    """
+    start = _bound(start)
+    end = _bound(end)
+    units = set(units) if units is not None else None
+    if meta is None:
+        meta = {}
+
+    def keep(rec):
+        if units is not None and rec.get("UNIT_NAME") not in units:
+            return False
+        ts = _timestamp(rec)
+        if start is not None and ts < start:
+            return False
+        return end is None or ts[:len(end)] <= end
+
+    filtered = start is not None or end is not None or units is not None
+    for batch in _walk(path, list_key, meta, chunk_size):
+        if filtered:
+            batch = [rec for rec in batch if keep(rec)]
+        if batch:
+            yield batch
+
+
+def iter_records(path, list_key, start=None, end=None, units=None, meta=None, chunk_size=CHUNK_SIZE):
+    """Yield the records of a master/snapshot one by one (see iter_batches for the filters)."""
+    for batch in iter_batches(path, list_key, start, end, units, meta, chunk_size):
+        yield from batch
+
+
+def read_meta(path, list_key, keys=("CATALOG", "UNIT_OF_MEASUREMENT", "INTERVAL")):
+    """Scalar fields of a master; stops at the record list once all keys were seen."""
+    meta = {}
+    batches = _walk(path, list_key, meta, CHUNK_SIZE)
+    for _ in batches:
+        if all(k in meta for k in keys):
+            break
+    batches.close()
+    return meta
+
+
+if __name__ == "__main__":
+    import csv
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Filter records of a Taipower master without loading it")
+    ap.add_argument("path")
+    ap.add_argument("--list-key", help="NET_P or FLOW_P (default: from the file name)")
+    ap.add_argument("--start", help="first DATETIME, e.g. 2025-06-01")
+    ap.add_argument("--end", help="last DATETIME (a date includes the whole day)")
+    ap.add_argument("--unit", action="append", help="UNIT_NAME to keep (repeatable)")
+    ap.add_argument("-o", "--output", help="CSV file (default: stdout)")
+    args = ap.parse_args()
+
+    list_key = args.list_key or ("FLOW_P" if os.path.basename(args.path).startswith("flow") else "NET_P")
+    out = open(args.output, "w", newline="", encoding="utf-8-sig") if args.output else sys.stdout
+    writer = None
+    count = 0
+    for batch in iter_batches(args.path, list_key, args.start, args.end, args.unit):
+        if writer is None:
+            writer = csv.DictWriter(out, fieldnames=list(batch[0]), extrasaction="ignore")
+            writer.writeheader()
+        writer.writerows(batch)
+        count += len(batch)
+    if args.output:
+        out.close()
+    print(f"{count} records", file=sys.stderr)
@@ -0,0 +1,460 @@
+import io
+import os
+import sys
+import glob
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from building_store import log_path, read_log
+from series_meta import file_signature
+from crawler.meter_store import MeterStore
+from process.taipower_store import TaipowerStore
+from process.taipower_stream import iter_batches
+
+# One time-series query over every dataset the crawlers collect.
+#
+#   from query import query
+#   df = query(["building:男一舍", "settlement:srPrice"], "2026-01-01", "2026-01-31")
+#
+# Series are "<kind>:<name>":
+#
+#   building:NAME      column NAME of data/ntu_building/{campus}/{feeder}/{subject}.csv
+#                      (+ its .log.csv); "building:{campus}/{feeder}/{subject}/NAME"
+#                      when the name is used by more than one file
+#   meter:CODE         column CODE of data/ntu_meter/meters_{year}.npy
+#   settlement:FIELD   FIELD of data/taipower_ancillary/settlement_{year}.csv
+#   generator:UNIT     NET_P of UNIT_NAME UNIT (data/taipower_generators)
+#   flow:NAME          FLOW_P of UNIT_NAME NAME (data/taipower_flow)
+#
+# The result has one column per series (named as requested) on the hourly index
+# from start to end, resampled to `freq` (mean) when it is not "h".
+#
+# Only the month partitions overlapping [start, end] are read:
+#
+#   - building and settlement CSVs are sorted by their first column, so the
+#     byte range of a month is found by bisecting the file and only that slice
+#     is parsed (usecols = the requested columns),
+#   - meter partitions are memmapped and sliced by hour-of-year,
+#   - generator / flow use the month partitions of the segment store or a
+#     filtered parquet read; a JSON master can only be streamed as a whole, so
+#     there the year is the partition (units are still filtered while reading).
+#
+# Parsed partitions are cached in-process per (file, size/mtime, month, column),
+# so later queries over the same months only parse what they have not seen.
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(SRC_DIR)
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+CACHE_ENTRIES = 4096  # Parsed (partition, column) series kept in memory
+
+KINDS = ("building", "meter", "settlement", "generator", "flow")
+# kind -> (directory under data/, list_key, file_prefix)
+SNAPSHOTS = {
+    "generator": ("taipower_generators", "NET_P", "generator"),
+    "flow": ("taipower_flow", "FLOW_P", "flow"),
+}
+
+_cache = OrderedDict()
+_headers = {}
+
+
+def clear_cache():
+    _cache.clear()
+    _headers.clear()
+
+
+def _signature(paths):
+    # series_meta.file_signature as a tuple, usable in cache keys
+    return tuple(tuple(s) if s is not None else None for s in file_signature(paths))
+
+
+def _bounds(start, end):
+    # [t0, t1) on the hour; an end without a time of day covers the whole day
+    t0 = pd.Timestamp(start).floor("h")
+    end = pd.Timestamp(end)
+    t1 = end + pd.Timedelta(days=1) if end == end.normalize() else end.floor("h") + pd.Timedelta(hours=1)
+    if t1 <= t0:
+        raise ValueError(f"Empty range: {start} .. {end}")
+    return t0, t1
+
+
+def _months(t0, t1):
+    return list(pd.period_range(t0, t1 - pd.Timedelta(seconds=1), freq="M"))
+
+
+# --- Sorted CSV slices ---
+
+def _first_field(line):
+    return line.split(b",", 1)[0].strip().strip(b'"')
+
+
+def _line_at(f, pos, data_start):
+    # Offset and bytes of the first line starting at or after pos
+    if pos <= data_start:
+        f.seek(data_start)
+    else:
+        f.seek(pos - 1)
+        f.readline()
+    offset = f.tell()
+    return offset, f.readline()
+
+
+def _offset(f, size, data_start, key):
+    # Offset of the first line whose first field is >= key
+    lo, hi = data_start, size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        offset, line = _line_at(f, mid, data_start)
+        if not line or _first_field(line) >= key:
+            hi = mid
+        else:
+            lo = offset + 1
+    return _line_at(f, lo, data_start)[0]
+
+
+def read_csv_range(path, lo, hi, usecols=None, **kwargs):
+    """
+    Rows of a CSV sorted by its first column whose first field is in [lo, hi)
+    (string order, so ISO prefixes like "2026-01" work). Only that byte range is read.
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        data_start = f.tell()
+        size = os.fstat(f.fileno()).st_size
+        a = _offset(f, size, data_start, lo.encode("utf-8"))
+        b = _offset(f, size, data_start, hi.encode("utf-8"))
+        f.seek(a)
+        body = f.read(max(b - a, 0))
+    if body and not body.endswith(b"\n"):
+        body += b"\n"
+    return pd.read_csv(io.BytesIO(header + body), usecols=usecols, encoding="utf-8-sig", **kwargs)
+
+
+def _csv_header(path):
+    signature = _signature([path])
+    cached = _headers.get(path)
+    if cached is None or cached[0] != signature:
+        with open(path, "r", encoding="utf-8-sig") as f:
+            columns = f.readline().rstrip("\r\n").split(",")
+        cached = _headers[path] = (signature, columns)
+    return cached[1]
+
+
+# --- Partition cache ---
+
+def _partitions(kind, path, signature, parts, columns, reader):
+    """
+    {column: Series} over the given partitions. reader(part, columns) parses one
+    partition and returns a DataFrame (DatetimeIndex) with any subset of the columns;
+    only (partition, column) pairs not cached yet are read.
+    """
+    pieces = {c: [] for c in columns}
+    for part in parts:
+        keys = {c: (kind, path, signature, str(part), c) for c in columns}
+        missing = [c for c in columns if keys[c] not in _cache]
+        if missing:
+            df = reader(part, missing)
+            for c in missing:
+                s = df[c] if c in df.columns else pd.Series(dtype=float, index=pd.DatetimeIndex([]))
+                _cache[keys[c]] = s.astype(float)
+            while len(_cache) > CACHE_ENTRIES:
+                _cache.popitem(last=False)
+        for c in columns:
+            _cache.move_to_end(keys[c])
+            pieces[c].append(_cache[keys[c]])
+    return {c: pd.concat(p) if p else pd.Series(dtype=float) for c, p in pieces.items()}
+
+
+# --- Buildings ---
+
+def building_files(data_dir=DATA_DIR):
+    return sorted(
+        p for p in glob.glob(os.path.join(data_dir, "ntu_building", "*", "*", "*.csv"))
+        if not p.endswith(".log.csv")
+    )
+
+
+def _log_frame(path, signature):
+    key = ("building-log", path, signature)
+    if key not in _cache:
+        _cache[key] = read_log(path) if os.path.exists(path) else pd.DataFrame(columns=["Datetime", "Building", "Value"])
+    return _cache[key]
+
+
+def _building_columns(path):
+    columns = _csv_header(path)[1:] if os.path.exists(path) else []
+    log = log_path(path)
+    if os.path.exists(log):
+        extra = _log_frame(log, _signature([log]))["Building"].unique()
+        columns = columns + [b for b in extra if b not in columns]
+    return columns
+
+
+def _locate_building(name, data_dir):
+    files = building_files(data_dir)
+    if name.count("/") >= 3:
+        rel, column = name.rsplit("/", 1)
+        path = os.path.join(data_dir, "ntu_building", *rel.split("/")) + ".csv"
+        if path in files:
+            return path, column
+    found = [p for p in files if name in _building_columns(p)]
+    if not found:
+        raise KeyError(f"Unknown building: {name}")
+    if len(found) > 1:
+        options = [os.path.relpath(p, os.path.join(data_dir, "ntu_building"))[:-len(".csv")] + "/" + name for p in found]
+        raise KeyError(f"Building {name} is in several files, use one of: {', '.join(options)}")
+    return found[0], name
+
+
+def _read_buildings(path, months, columns):
+    log = log_path(path)
+    signature = _signature([path, log])
+    header = _csv_header(path) if os.path.exists(path) else []
+
+    def reader(month, cols):
+        lo, hi = str(month), str(month + 1)
+        in_csv = [c for c in cols if c in header]
+        if in_csv:
+            df = read_csv_range(path, lo, hi, usecols=["Datetime"] + in_csv)
+            df.index = pd.DatetimeIndex(pd.to_datetime(df.pop("Datetime")), name="Datetime")
+            df = df.apply(pd.to_numeric, errors="coerce")
+        else:
+            df = pd.DataFrame(index=pd.DatetimeIndex([], name="Datetime"))
+        if os.path.exists(log):
+            # Same overlay as building_store.apply_log, limited to the month and columns
+            rows = _log_frame(log, _signature([log]))
+            rows = rows[rows["Building"].isin(cols) & (rows["Datetime"] >= month.start_time) & (rows["Datetime"] < (month + 1).start_time)]
+            rows = rows.drop_duplicates(subset=["Datetime", "Building"], keep="last")
+            if len(rows):
+                df = df.reindex(df.index.union(pd.DatetimeIndex(rows["Datetime"].unique())).sort_values())
+                for building, part in rows.groupby("Building", sort=False):
+                    df.loc[pd.DatetimeIndex(part["Datetime"]), building] = part["Value"].to_numpy(dtype=float)
+        return df
+
+    return _partitions("building", path, signature, months, columns, reader)
+
+
+# --- Meters ---
+
+def _read_meters(data_dir, year, months, columns):
+    store = MeterStore(os.path.join(data_dir, "ntu_meter"), year)
+    if not store.exists():
+        return {c: pd.Series(dtype=float) for c in columns}
+    signature = _signature([store.data_path, store.meta_path])
+    year_start = pd.Timestamp(year, 1, 1)
+
+    def reader(month, cols):
+        data = np.load(store.data_path, mmap_mode="r")
+        h0 = int((month.start_time - year_start) / pd.Timedelta(hours=1))
+        h1 = int(((month + 1).start_time - year_start) / pd.Timedelta(hours=1))
+        index = pd.date_range(month.start_time, periods=h1 - h0, freq="h", name="Datetime")
+        present = [c for c in cols if c in store._col_index]
+        # Columns are contiguous on disk (column-major), so each slice is one read
+        values = {c: np.array(data[h0:h1, store._col_index[c]], dtype=float) for c in present}
+        return pd.DataFrame(values, index=index)
+
+    return _partitions("meter", store.data_path, signature, months, columns, reader)
+
+
+# --- Settlement ---
+
+def _read_settlement(data_dir, year, months, columns):
+    path = os.path.join(data_dir, "taipower_ancillary", f"settlement_{year}.csv")
+    if not os.path.exists(path):
+        return {c: pd.Series(dtype=float) for c in columns}
+    header = _csv_header(path)
+
+    def reader(month, cols):
+        present = [c for c in cols if c in header]
+        df = read_csv_range(path, str(month), str(month + 1), usecols=["date", "hour"] + present, dtype={"hour": str})
+        index = pd.to_datetime(df.pop("date")) + pd.to_timedelta(df.pop("hour").astype(int), unit="h")
+        df.index = pd.DatetimeIndex(index, name="Datetime")
+        return df.apply(pd.to_numeric, errors="coerce")
+
+    return _partitions("settlement", path, _signature([path]), months, columns, reader)
+
+
+# --- Generator / flow ---
+
+def _hourly_units(df, list_key):
+    # 10-minute records -> hourly mean per unit, one column per UNIT_NAME
+    if df.empty:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name="Datetime"))
+    values = pd.to_numeric(df[list_key].astype(object), errors="coerce")
+    hours = pd.to_datetime(df["DATETIME"]).dt.floor("h")
+    out = values.groupby([hours, df["UNIT_NAME"].astype(str)]).mean().unstack()
+    out.index.name = "Datetime"
+    return out
+
+
+def _records_frame(records, list_key):
+    return pd.DataFrame.from_records(records, columns=["DATETIME", "UNIT_NAME", list_key])
+
+
+def _read_snapshots(data_dir, kind, year, months, columns):
+    sub_dir, list_key, file_prefix = SNAPSHOTS[kind]
+    store = TaipowerStore(os.path.join(data_dir, sub_dir), list_key, file_prefix)
+    source_kind, source = store.year_source(year)
+    if source_kind == "store":
+        stored = set(source)
+
+        def reader(month, cols):
+            if str(month) not in stored:
+                return pd.DataFrame()
+            wanted = set(cols)
+            records = [rec for rec in store.iter_partition(str(month)) if rec.get("UNIT_NAME") in wanted]
+            return _hourly_units(_records_frame(records, list_key), list_key)
+
+        results = {c: [] for c in columns}
+        for month in months:
+            index = store.index_path(str(month))
+            part = _partitions(kind, index, _signature([index]), [month], columns, reader)
+            for c in columns:
+                results[c].append(part[c])
+        return {c: pd.concat(p) for c, p in results.items()}
+
+    if source_kind == "parquet":
+        def reader(month, cols):
+            filters = [
+                ("DATETIME", ">=", month.start_time), ("DATETIME", "<", (month + 1).start_time),
+                ("UNIT_NAME", "in", list(cols)),
+            ]
+            df = pd.read_parquet(source, columns=["DATETIME", "UNIT_NAME", list_key], filters=filters)
+            return _hourly_units(df, list_key)
+
+        return _partitions(kind, source, _signature([source]), months, columns, reader)
+
+    if not os.path.exists(source):
+        return {c: pd.Series(dtype=float) for c in columns}
+
+    def reader(_, cols):
+        frames = [_records_frame(batch, list_key) for batch in iter_batches(source, list_key, units=cols)]
+        return _hourly_units(pd.concat(frames) if frames else _records_frame([], list_key), list_key)
+
+    return _partitions(kind, source, _signature([source]), [year], columns, reader)
+
+
+# --- Query ---
+
+def parse_series(spec):
+    kind, sep, name = spec.partition(":")
+    if not sep or kind not in KINDS or not name:
+        raise ValueError(f"Bad series {spec!r}, expected one of {', '.join(k + ':NAME' for k in KINDS)}")
+    return kind, name
+
+
+def query(series, start, end, freq="h", data_dir=DATA_DIR):
+    """
+    DataFrame of the given series ("kind:name", see module comment) between start
+    and end (inclusive; a date-only end covers the whole day) on a common hourly
+    index, resampled to freq (mean) when freq is not "h". Missing hours are NaN.
+    """
+    if isinstance(series, str):
+        series = [series]
+    t0, t1 = _bounds(start, end)
+    months = _months(t0, t1)
+    years = sorted({m.year for m in months})
+
+    # Group the requested columns per source file so each partition is parsed once
+    groups = {}
+    for spec in series:
+        kind, name = parse_series(spec)
+        if kind == "building":
+            path, column = _locate_building(name, data_dir)
+            groups.setdefault(("building", path), {})[spec] = column
+        else:
+            groups.setdefault((kind, None), {})[spec] = name
+
+    found = {}
+    for (kind, path), wanted in groups.items():
+        columns = list(dict.fromkeys(wanted.values()))
+        if kind == "building":
+            parts = [_read_buildings(path, months, columns)]
+        else:
+            parts = []
+            for year in years:
+                year_months = [m for m in months if m.year == year]
+                if kind == "meter":
+                    parts.append(_read_meters(data_dir, year, year_months, columns))
+                elif kind == "settlement":
+                    parts.append(_read_settlement(data_dir, year, year_months, columns))
+                else:
+                    parts.append(_read_snapshots(data_dir, kind, year, year_months, columns))
+        for spec, column in wanted.items():
+            s = pd.concat([p[column] for p in parts])
+            found[spec] = s[(s.index >= t0) & (s.index < t1)]
+
+    index = pd.date_range(t0, t1, freq="h", inclusive="left", name="Datetime")
+    out = pd.DataFrame(index=index)
+    for spec in series:
+        s = found[spec]
+        if len(s):
+            # Later rows win, timestamps snapped to the hour
+            s = s[~s.index.duplicated(keep="last")]
+            s = s.groupby(s.index.floor("h")).mean()
+        out[spec] = s.reindex(index).to_numpy(dtype=float)
+    if freq not in ("h", "H", "1h"):
+        out = out.resample(freq).mean()
+    return out
+
+
+def list_series(kind, data_dir=DATA_DIR, year=None):
+    """Names available for one kind (units of the given / latest year for generator and flow)."""
+    if kind == "building":
+        return sorted({c for p in building_files(data_dir) for c in _building_columns(p)})
+    if kind == "meter":
+        names = set()
+        for path in glob.glob(os.path.join(data_dir, "ntu_meter", "meters_*.json")):
+            year_token = os.path.basename(path)[len("meters_"):-len(".json")]
+            if year_token.isdigit():
+                names.update(MeterStore(os.path.dirname(path), int(year_token)).columns)
+        return sorted(names)
+    if kind == "settlement":
+        paths = sorted(glob.glob(os.path.join(data_dir, "taipower_ancillary", "settlement_*.csv")))
+        return [c for c in _csv_header(paths[-1])[2:]] if paths else []
+    if kind in SNAPSHOTS:
+        sub_dir, list_key, file_prefix = SNAPSHOTS[kind]
+        directory = os.path.join(data_dir, sub_dir)
+        store = TaipowerStore(directory, list_key, file_prefix)
+        if year is None:
+            tokens = [os.path.basename(p).split("_")[-1].split(".")[0] for p in glob.glob(os.path.join(directory, f"{file_prefix}_*.*"))]
+            years = store.years() + [int(t) for t in tokens if t.isdigit()]
+            if not years:
+                return []
+            year = max(years)
+        units = set()
+        if store.partitions(year):
+            # The partition indexes hold every stored (DATETIME, UNIT_NAME) key
+            for partition in store.partitions(year):
+                units.update(unit for _, unit in store.load_index(partition))
+        elif os.path.exists(os.path.join(directory, f"{file_prefix}_{year}.parquet")):
+            df = pd.read_parquet(os.path.join(directory, f"{file_prefix}_{year}.parquet"), columns=["UNIT_NAME"])
+            units.update(df["UNIT_NAME"].dropna().astype(str))
+        elif os.path.exists(os.path.join(directory, f"{file_prefix}_{year}.json")):
+            for batch in iter_batches(os.path.join(directory, f"{file_prefix}_{year}.json"), list_key):
+                units.update(rec["UNIT_NAME"] for rec in batch if rec.get("UNIT_NAME") is not None)
+        return sorted(units)
+    raise ValueError(f"Unknown kind {kind!r}, expected one of {', '.join(KINDS)}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Query collected time series, e.g. building:男一舍 settlement:srPrice")
+    ap.add_argument("series", nargs="*", help="kind:name (building, meter, settlement, generator, flow)")
+    ap.add_argument("--start", help="first day / time")
+    ap.add_argument("--end", help="last day / time (a date includes the whole day)")
+    ap.add_argument("--freq", default="h", help="h (default), D, W, MS, ...")
+    ap.add_argument("--list", choices=KINDS, help="list the series of one kind instead")
+    ap.add_argument("-o", "--output", help="CSV file (default: stdout)")
+    args = ap.parse_args()
+
+    if args.list:
+        print("\n".join(list_series(args.list)))
+    else:
+        if not args.series or not args.start or not args.end:
+            ap.error("series, --start and --end are required")
+        df = query(args.series, args.start, args.end, args.freq)
+        df.to_csv(args.output or sys.stdout, encoding="utf-8-sig" if args.output else None)
@@ -1,5 +1,4 @@
 import os
-import requests
 import warnings
 from urllib3.exceptions import InsecureRequestWarning
 warnings.filterwarnings('ignore', category=InsecureRequestWarning)
@@ -9,16 +8,21 @@ except ImportError:
     # Fallback if run from different context
     sys.path.append(os.path.dirname(os.path.abspath(__file__)))
     from meter_config import meter_name_map
+import building_map
+import gap_planner
+import poll_daemon
+import series_meta
+from building_store import BuildingDataManager, BuildingWriter
+from crawler.epower import fetch_report_pages, day_values, DEFAULT_CONCURRENCY
+from crawler.update_monthly_settlement import update_range as update_settlement_range, update_days as update_settlement_days, settlement_info
+from crawler.ntu_meters import crawl_meters, reopen_days, DEFAULT_WORKERS as DEFAULT_METER_WORKERS
 import pandas as pd
-import numpy as np
 from datetime import datetime, timedelta, date
-import calendar
-import time
+import json
 import subprocess
 from glob import glob
 import sys
 import shutil
-from io import StringIO
 
 # --- Constants ---
 
@@ -98,12 +102,13 @@ def update_crawler_generate():
     print(">>> Running Crawler Generate (Generators & Flow)...")
     print("Note: This crawler fetches the latest snapshot from Taipower OpenData.")
     print("      Historical date selection is not supported by the source URL.")
+    print("      Use --daemon to poll continuously so no interval is missed.")
     # Execute the script
     script_path = os.path.join(os.path.dirname(__file__), "crawler", "crawler_generate.py")
     subprocess.run([sys.executable, script_path])
     print(">>> Crawler Generate Finished.")
 
-def update_settlement(force_start=None, force_end=None):
+def update_settlement(force_start=None, force_end=None, workers=4):
     print(">>> Running Settlement Update...")
     out_dir = "data/taipower_ancillary"
     if not os.path.exists(out_dir):
@@ -127,10 +132,10 @@ def update_settlement(force_start=None, force_end=None):
             files.sort()
             latest_file = files[-1]
             try:
-                df = pd.read_csv(latest_file)
-                if "date" in df.columns and not df.empty:
-                    last_date_str = str(df["date"].iloc[-1])
-                    last_date = datetime.strptime(last_date_str, "%Y-%m-%d")
+                # Last stored hour from the summary sidecar (the CSV is only read if it is stale)
+                last = series_meta.last_timestamp(settlement_info(latest_file), "settlement")
+                if last is not None:
+                    last_date = datetime(last.year, last.month, last.day)
             except Exception as e:
                 print(f"Error reading {latest_file}: {e}")
         
@@ -146,328 +151,124 @@ def update_settlement(force_start=None, force_end=None):
 
     print(f"Fetching Settlement from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
     
-    curr = start_date
-    script_path = os.path.join(os.path.dirname(__file__), "crawler", "update_monthly_settlement.py")
-    
-    while curr.date() <= end_date.date():
-        d_str = curr.strftime("%Y-%m-%d")
-        cmd = [sys.executable, script_path, "--date", d_str, "--outdir", out_dir, "--fallback-yesterday"]
-        try:
-            subprocess.run(cmd, check=True)
-        except subprocess.CalledProcessError as e:
-            print(f"Failed for {d_str}: {e}")
-        
-        curr += timedelta(days=1)
-        time.sleep(0.5) 
+    # Days are fetched concurrently in-process; each yearly file is rewritten once
+    update_settlement_range(start_date.date(), end_date.date(), out_dir, max_workers=workers, fallback_yesterday=True)
 
     print(">>> Settlement Update Finished.")
 
-# Load Taipower CSV for mapping
-try:
-    # Use absolute path or assume run from root
-    csv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '台大台電獨立電號表.csv')
-    if not os.path.exists(csv_path):
-        # Try local (if running from root)
-        csv_path = '台大台電獨立電號表.csv'
-        
-    taipower_df = pd.read_csv(csv_path, low_memory=False)
-    # Normalize for matching
-    taipower_df['match_name'] = taipower_df['館舍名稱'].fillna('').astype(str).str.replace('台', '臺').str.replace(r'[() ]', '', regex=True)
-    taipower_df['match_loc'] = taipower_df['地點'].fillna('').astype(str).str.replace('台', '臺').str.replace(r'[() ]', '', regex=True)
-except Exception as e:
-    print(f"Warning: Could not load mapping CSV: {e}")
-    taipower_df = pd.DataFrame()
+# Taipower mapping index (building -> campus/feeder/subject), loaded on first use
+_taipower_index = None
+_taipower_index_loaded = False
+
+def get_taipower_index():
+    global _taipower_index, _taipower_index_loaded
+    if not _taipower_index_loaded:
+        _taipower_index_loaded = True
+        try:
+            csv_path = building_map.MAPPING_CSV
+            if not os.path.exists(csv_path):
+                # Try local (if running from root)
+                csv_path = '台大台電獨立電號表.csv'
+            _taipower_index = building_map.load_index(csv_path)
+        except Exception as e:
+            print(f"Warning: Could not load mapping CSV: {e}")
+    return _taipower_index
 
 def get_taipower_info(building_name):
-    if taipower_df.empty:
+    index = get_taipower_index()
+    match = index.lookup(building_name) if index is not None else None
+    if match is None:
         return "Unknown_Campus", "Unknown_Feeder", get_building_category(building_name)
-    
-    clean_name = building_name.replace('-', '').replace('台', '臺').replace(' ', '').replace('(', '').replace(')', '')
-    
-    # Priority 1: Match Name
-    for _, row in taipower_df.iterrows():
-        if clean_name in row['match_name']:
-             return row['校區別'], row['饋線代號'], row['科目']
-    
-    # Priority 2: Match Location
-    for _, row in taipower_df.iterrows():
-        if clean_name in row['match_loc']:
-             return row['校區別'], row['饋線代號'], row['科目']
-             
-    return "Unknown_Campus", "Unknown_Feeder", get_building_category(building_name)
-
-class BuildingDataManager:
-    def __init__(self, base_dir="data/ntu_building"):
-        self.base_dir = base_dir
-        # Cache for loaded DataFrames: key=(campus, feeder, subject), value=DataFrame
-        self.cache = {} 
-        # Track modified files
-        self.modified = set()
-
-    def _clean(self, s):
-        # Remove invalid characters for filenames
-        s = str(s).strip().replace('/', '_').replace('\\', '_').replace(':', '_')
-        if not s or s.lower() == 'nan':
-            return "Unknown"
-        return s
-
-    def _get_key(self, campus, feeder, subject):
-        return (self._clean(campus), self._clean(feeder), self._clean(subject))
-
-    def _get_file_path(self, key):
-        campus, feeder, subject = key
-        # Determine specific save directory
-        save_dir = os.path.join(self.base_dir, campus, feeder)
-        if not os.path.exists(save_dir):
-            os.makedirs(save_dir)
-        return os.path.join(save_dir, f"{subject}.csv")
-
-    def load(self, campus, feeder, subject):
-        key = self._get_key(campus, feeder, subject)
-        if key in self.cache:
-            return
-        
-        file_path = self._get_file_path(key)
-        if os.path.exists(file_path):
-            try:
-                df = pd.read_csv(file_path)
-                if 'Datetime' in df.columns:
-                    df['Datetime'] = pd.to_datetime(df['Datetime'])
-                    df.set_index('Datetime', inplace=True)
-                self.cache[key] = df
-            except Exception as e:
-                print(f"Error reading {file_path}: {e}")
-                self.cache[key] = pd.DataFrame()
-        else:
-            self.cache[key] = pd.DataFrame()
+    return match
 
-    def get_last_date(self, campus, feeder, subject, building_name):
-        key = self._get_key(campus, feeder, subject)
-        self.load(campus, feeder, subject)
-        df = self.cache[key]
-        
-        if not df.empty and building_name in df.columns:
-            valid_idx = df[building_name].last_valid_index()
-            if valid_idx:
-                return valid_idx
-        return None
-
-    def add_data(self, campus, feeder, subject, building_name, new_series):
-        key = self._get_key(campus, feeder, subject)
-        self.load(campus, feeder, subject)
-        df = self.cache[key]
-        
-        new_df = pd.DataFrame(new_series)
-        new_df.columns = [building_name]
-        new_df.index.name = 'Datetime'
-        
-        if df.empty:
-            df = new_df
-        else:
-            # Merge logic: align indices and update/append
-            combined_idx = df.index.union(new_df.index).sort_values()
-            df = df.reindex(combined_idx)
-            if building_name in df.columns:
-                 df.loc[new_df.index, building_name] = new_df[building_name]
-            else:
-                 df[building_name] = new_df[building_name]
-        
-        self.cache[key] = df
-        self.modified.add(key)
-
-    def save_all(self):
-        # Save files that have been modified and clear them from the list
-        # Using a list copy to iterate allows us to modify the set safely
-        keys_to_save = list(self.modified)
-        if not keys_to_save:
-            return
-
-        for key in keys_to_save:
-            file_path = self._get_file_path(key)
-            df = self.cache[key]
-            # Ensure sort and reset index
-            df.sort_index(inplace=True)
-            # We must be careful not to reset index multiple times if it's already a column
-            # But here we are dumping to CSV, so we reset to get 'Datetime' as a column
-            # To avoid issues, we write a copy or handle reset carefully. 
-            # safe approach: copy for export
-            export_df = df.reset_index()
-            export_df.to_csv(file_path, index=False)
-            
-            # Mark as saved
-            self.modified.discard(key)
-
-def update_buildings(force_start=None, force_end=None):
-    print(">>> Updating Buildings (Parallel - Max 3)...")
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-    from threading import Lock
-    
+def update_buildings(force_start=None, force_end=None, concurrency=DEFAULT_CONCURRENCY):
+    print(f">>> Updating Buildings (Batched by category - Concurrency {concurrency})...")
     manager = BuildingDataManager()
-    manager_lock = Lock() # Protects manager's internal cache and file I/O
-        
+
     today = datetime.now()
     yesterday = today - timedelta(days=1)
-    
-    # Flatten the list of buildings
-    all_buildings = []
+
+    # Step 1: Work out which days each building still needs (no network yet)
+    # needed[(ctg, date_str)] -> list of buildings in ctg missing that day
+    needed = {}
+    building_info = {}
+    total_buildings = 0
     for ctg, building_list in buildings_dict.items():
         for b_val in building_list:
-            all_buildings.append((b_val, ctg))
+            total_buildings += 1
+            campus, feeder, subject = get_taipower_info(b_val)
+            building_info[b_val] = (campus, feeder, subject)
 
-    total_buildings = len(all_buildings)
-    print(f"Total buildings to process: {total_buildings}")
-    
-    # Counter for progress display
-    processed_count = 0
-    print_lock = Lock()
-
-    def process_single_building(b_val, ctg):
-        request_sleep_interval = 0.01 # Configurable sleep interval for requests
-        # Determine grouping info
-        campus, feeder, subject = get_taipower_info(b_val)
-        
-        # Determine start date
-        start_date = None
-        end_date = None
-        
-        # Step 1: Determine Date Range (Read-only logic, no lock needed yet)
-        if force_start and force_end:
-            start_date = datetime.strptime(force_start, "%Y-%m-%d")
-            end_date = datetime.strptime(force_end, "%Y-%m-%d")
-        else:
-            # Need lock to safely read last date from manager
-            with manager_lock:
-                last_date = manager.get_last_date(campus, feeder, subject, b_val)
-            
-            if last_date:
-                 start_date = last_date + timedelta(days=1)
-                 start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+            if force_start and force_end:
+                start_date = datetime.strptime(force_start, "%Y-%m-%d")
+                end_date = datetime.strptime(force_end, "%Y-%m-%d")
             else:
-                 start_date = datetime(today.year, 1, 1)
-            
-            end_date = yesterday
-            
-        if start_date.date() > end_date.date():
-            return # Up to date
-
-        # Step 2: Get Snapshot of Existing Data (Critical Section)
-        # We copy the relevant data so we can check it without holding the lock during network requests
-        existing_df_snapshot = None
-        with manager_lock:
-            manager.load(campus, feeder, subject)
-            key = manager._get_key(campus, feeder, subject)
-            if key in manager.cache and not manager.cache[key].empty:
-                # Shallow copy of the DF is enough if we don't modify structure, 
-                # but deep copy is safer for multi-threaded reads if cache might change.
-                existing_df_snapshot = manager.cache[key].copy()
-
-        date_range_objs = pd.date_range(start=start_date, end=end_date, freq='D')
-        
-        # Use a dictionary to store ONLY newly fetched data: {timestamp: value}
-        new_data_dict = {}
-        
-        # Step 3: Loop dates and Fetch (Slow part - Run in parallel)
-        for d_obj in date_range_objs:
-            d_str = d_obj.strftime("%Y-%m-%d")
-            
-            # Check existing snapshot
-            skipped = False
-            if existing_df_snapshot is not None and not existing_df_snapshot.empty and b_val in existing_df_snapshot.columns:
-                try:
-                    day_slice = existing_df_snapshot.loc[d_obj.strftime("%Y-%m-%d")]
-                    if b_val in day_slice:
-                        vals = day_slice[b_val]
-                        if isinstance(vals, pd.Series) and len(vals) == 24 and not vals.isna().any():
-                            skipped = True
-                except KeyError:
-                    pass 
-            
-            if skipped:
-                continue
-
-            # Fetch from web
-            url = 'https://epower.ga.ntu.edu.tw/fn4/report2.aspx'
-            payload = {
-                'ctg': ctg,
-                'dt1': d_str.replace("-", "/"),
-                'ok': '確定',
-            }
-            
-            day_values = []
-            try:
-                read_url = requests.post(url, data=payload)
-                dfs = pd.read_html(StringIO(read_url.text))
-                if len(dfs) > 1:
-                    data = dfs[1]
-                    data_temp = data.copy()
-                    data_temp.columns = data_temp.iloc[1]
-                    data_temp = data_temp.iloc[3:27]
-                    if b_val in data_temp.columns:
-                        col_data = data_temp[b_val]
-                        day_values = [float(val) if val != '---' else np.nan for val in col_data]
-                    else:
-                        day_values = [np.nan] * 24
+                last_date = manager.get_last_date(campus, feeder, subject, b_val)
+                if last_date:
+                    start_date = last_date + timedelta(days=1)
+                    start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
                 else:
-                    day_values = [np.nan] * 24
-            except Exception as req_e:
-                day_values = [np.nan] * 24
-            
-            for h in range(24):
-                ts = d_obj + timedelta(hours=h)
-                val = day_values[h] if h < len(day_values) else np.nan
-                new_data_dict[ts] = val
-            
-            time.sleep(request_sleep_interval)
-
-        # Step 4: Write back results (Critical Section)
-        if new_data_dict:
-            new_series = pd.Series(new_data_dict)
-            new_series.name = b_val
-            with manager_lock:
-                manager.add_data(campus, feeder, subject, b_val, new_series)
-
-    # Process using ThreadPool
-    with ThreadPoolExecutor(max_workers=15) as executor:
-        futures = {executor.submit(process_single_building, b[0], b[1]): b[0] for b in all_buildings}
-        
-        for future in as_completed(futures):
-            b_name = futures[future]
-            try:
-                future.result()
-            except Exception as e:
-                print(f"\nFailed to process {b_name}: {e}")
-            
-            with print_lock:
-                processed_count += 1
-                # Print on new line to ensure visibility
-                print(f"[{processed_count}/{total_buildings}] Processed {b_name}")
+                    start_date = datetime(today.year, 1, 1)
+                end_date = yesterday
 
-            # SAVE IMMEDIATELY after each building finishes
-            with manager_lock:
-                manager.save_all()
+            if start_date.date() > end_date.date():
+                continue # Up to date
+
+            # Days that are already complete (24 values) are skipped via the day bitmap
+            for d_obj in manager.missing_days(campus, feeder, subject, b_val, start_date, end_date):
+                needed.setdefault((ctg, d_obj.strftime("%Y-%m-%d")), []).append(b_val)
+
+    print(f"Total buildings: {total_buildings}, pages to fetch: {len(needed)}")
+    fetch_buildings(manager, needed, building_info, concurrency)
 
     print("\n>>> Buildings Update Finished.")
 
-def update_meters(force_start=None, force_end=None):
-    print(">>> Updating Meters...")
+def fetch_buildings(manager, needed, building_info, concurrency=DEFAULT_CONCURRENCY):
+    # needed[(ctg, date_str)] -> buildings to fill from that page
+    # building_info[building] -> (campus, feeder, subject)
+    if not needed:
+        return
+
+    # Fetch each (ctg, date) page once and fan it out to all its buildings.
+    # Results go through a queue to a single writer thread that owns the manager.
+    writer = BuildingWriter(manager)
+    progress = {'done': 0}
+
+    def on_page(ctg, d_str, table):
+        hours = pd.date_range(d_str, periods=24, freq='h')
+        for b_val in needed[(ctg, d_str)]:
+            series = pd.Series(day_values(table, b_val), index=hours, name=b_val, dtype=float)
+            writer.put(*building_info[b_val], b_val, series)
+
+        progress['done'] += 1
+        print(f"\r[{progress['done']}/{len(needed)}] Fetched {ctg} {d_str}", end="", flush=True)
+
+    try:
+        fetch_report_pages(needed.keys(), concurrency=concurrency, on_page=on_page)
+    except BaseException:
+        # Still persist what was fetched, but report the fetch failure, not a writer error
+        try:
+            writer.close()
+        except Exception as e:
+            print(f"\nError: building writer failed as well: {e}")
+        raise
+    writer.close()
+    print(f"\nWrote {manager.bytes_written / 1e6:.2f} MB of building data")
+
+def update_meters(force_start=None, force_end=None, workers=DEFAULT_METER_WORKERS):
+    print(f">>> Updating Meters (Parallel - {workers} workers)...")
     path = "data/ntu_meter"
-    if not os.path.exists(path):
-        os.makedirs(path)
-        
-    year = str(datetime.now().year)
-    url = 'https://epower.ga.ntu.edu.tw/fn2/dataq.aspx'
-    
-    print(f"Updating meters for year {year}...")
-    
-    dates = get_date_range(year)
-    today_date = datetime.now().strftime("%Y/%m/%d")
-    
-    # Pre-calculate chunks for performance
-    step_size = 6 if calendar.isleap(int(year)) else 5
-    
-    # Filter dates to not go beyond today
-    valid_dates = [d for d in dates if d <= today_date]
-    
+
+    if force_start and force_end:
+        # Custom range: re-crawl it even if the checkpoints say it is done
+        first_day = datetime.strptime(force_start, "%Y-%m-%d").date()
+        last_day = datetime.strptime(force_end, "%Y-%m-%d").date()
+        force = True
+    else:
+        first_day = date(datetime.now().year, 1, 1)
+        last_day = datetime.now().date()
+        force = False
+
     # Use the map to iterate if available, otherwise fallback to arrmeter
     if 'meter_name_map' in globals():
         meters_to_process = list(meter_name_map.items())
@@ -475,102 +276,57 @@ def update_meters(force_start=None, force_end=None):
         print("Warning: meter_name_map not found. Using raw codes.")
         meters_to_process = [(m, m) for m in arrmeter]
 
-    total_meters = len(meters_to_process)
-    print(f"Total meters to process: {total_meters}")
-
-    for i, (meter, meter_name) in enumerate(meters_to_process, 1):
-        # Sanitize filename
-        safe_name = str(meter_name).replace('/', '_').replace('\\', '_').replace(':', '_').replace('*', '_').replace('?', '_').replace('"', '_').replace('<', '_').replace('>', '_').replace('|', '_')
-        file_path = os.path.join(path, f"{safe_name}_{year}.xlsx") # Added year to filename
-        
-        # Check if we should skip?
-        # If file exists, we will OVERWRITE it for the current year to ensure latest data is included.
-        # Meters script is fast enough usually? Or maybe not for 200+ meters?
-        # 200 meters * (365/5 = 73 requests) = 14000 requests. That's A LOT.
-        # This might take HOURS.
-        # User said "help me set up...". I should warn them.
-        # But for "incremental", I should only fetch missing days?
-        # But the API requires fetching chunks.
-        # And the output format has no dates.
-        # If I want to be incremental, I need to know how many rows are in the file.
-        # Rows = Hours.
-        # If file has N rows, start from N/24 date?
-        
-        start_idx = 0
-        electric_use = []
-        
-        if os.path.exists(file_path):
-             try:
-                 existing_df = pd.read_excel(file_path)
-                 if not existing_df.empty:
-                     start_idx = len(existing_df) // 24 * 24 # Align to days
-                     # We can keep existing data
-                     electric_use = existing_df.iloc[:start_idx, 0].tolist()
-                     # Calculate date index
-                     # dates has 365 entries.
-                     # start_idx is hours.
-                     # days_processed = start_idx / 24
-                     # So we start fetching from dates[days_processed]
-             except:
-                 pass
-        
-        days_processed = int(start_idx / 24)
-        
-        # Progress
-        print(f"\r[{i}/{total_meters}] Processing {safe_name} (Day {days_processed})...", end="", flush=True)
-
-        if days_processed >= len(valid_dates):
-            continue
-            
-        try:
-            for i_d in range(days_processed, len(valid_dates), step_size):
-                time1 = dates[i_d] + " 00:00"
-                end_idx = min(i_d + step_size - 1, len(valid_dates) - 1)
-                
-                # If we reached the end of valid dates
-                if i_d > len(valid_dates) - 1:
-                    break
-                    
-                time2 = dates[end_idx] + " 23:00"
-                
-                payload = {
-                    'dtype': 'h',
-                    'build': str(meter),
-                    'dt1': str(time1),
-                    'dt2': str(time2),
-                }
-
-                try:
-                    response = requests.post(url, data=payload)
-                    dfs = pd.read_html(StringIO(response.text))
-                    if len(dfs) > 1:
-                        data = dfs[1]
-                        electric_use_temp = data.iloc[:,3].tolist()[1:]
-                        electric_use.extend(electric_use_temp)
-                    else:
-                        # Append -1s if missing
-                        expected_hours = (end_idx - i_d + 1) * 24
-                        electric_use.extend([-1] * expected_hours)
-                except Exception as e:
-                    # print(f"Error fetching {meter} {time1}-{time2}: {e}")
-                    # expected_hours = (end_idx - i_d + 1) * 24
-                    # electric_use.extend([-1] * expected_hours)
-                    pass
-                
-                time.sleep(0.05)
-            
-            # (Raw data saving removed)
-
-            electric_use = [float(value) if isfloat(value) else -1 for value in electric_use]
-            data_df = pd.DataFrame(electric_use)
-            data_df = data_df.rename(columns={0: meter})
-            data_df.to_excel(file_path, index=False)
-            
-        except Exception as e:
-            print(f"\nFailed meter {meter}: {e}")
+    print(f"Total meters to process: {len(meters_to_process)} ({first_day} ~ {last_day})")
+    crawl_meters(meters_to_process, path, first_day, last_day, workers=workers, force=force)
 
     print("\n>>> Meters Update Finished.")
 
+def plan_gaps(manager=None):
+    manager = manager or BuildingDataManager()
+    buildings = [(ctg, b_val, get_taipower_info(b_val)) for ctg, building_list in buildings_dict.items() for b_val in building_list]
+    if 'meter_name_map' in globals():
+        meters = list(meter_name_map)
+    else:
+        meters = list(arrmeter)
+    snapshot_dirs = [
+        (os.path.join("data", "taipower_generators"), "NET_P", "generator"),
+        (os.path.join("data", "taipower_flow"), "FLOW_P", "flow"),
+    ]
+    plan = gap_planner.build_plan(manager, buildings, meters, "data/ntu_meter", "data/taipower_ancillary", snapshot_dirs)
+    gap_planner.print_plan(plan)
+    return plan
+
+def fill_gaps(concurrency=DEFAULT_CONCURRENCY, meter_workers=DEFAULT_METER_WORKERS, settlement_workers=4):
+    print(">>> Planning gap re-crawl...")
+    manager = BuildingDataManager()
+    plan = plan_gaps(manager)
+    fetch = plan["fetch"]
+
+    if fetch["buildings"]:
+        print(f">>> Filling building gaps ({len(fetch['buildings'])} pages)...")
+        needed = {(page["ctg"], page["date"]): page["buildings"] for page in fetch["buildings"]}
+        building_info = {b_val: get_taipower_info(b_val) for b_vals in needed.values() for b_val in b_vals}
+        fetch_buildings(manager, needed, building_info, concurrency)
+
+    if fetch["meters"]:
+        names = meter_name_map if 'meter_name_map' in globals() else {}
+        for batch in fetch["meters"]:
+            print(f"\n>>> Filling meter gaps {batch['year']} ({len(batch['meters'])} meters)...")
+            meters = [(m, names.get(m, m)) for m in batch["meters"]]
+            # Days with NaN hours can be marked done already (settled): open them up again
+            for meter, ranges in plan["gaps"]["meters"][str(batch["year"])].items():
+                reopen_days("data/ntu_meter", meter, batch["year"], ranges)
+            first_day = date.fromisoformat(batch["start"])
+            last_day = date.fromisoformat(batch["end"])
+            crawl_meters(meters, "data/ntu_meter", first_day, last_day, workers=meter_workers)
+
+    if fetch["settlement"]:
+        days = [d.strftime("%Y-%m-%d") for d in gap_planner.expand(fetch["settlement"])]
+        print(f"\n>>> Filling settlement gaps ({len(days)} days)...")
+        update_settlement_days(days, "data/taipower_ancillary", max_workers=settlement_workers)
+
+    print("\n>>> Gap Fill Finished.")
+
 def update_ntu_pv():
     print(">>> Updating NTU PV...")
     print("!!! NTU PV crawler requires Selenium and specific URL/Interaction.")
@@ -649,7 +405,19 @@ if __name__ == "__main__":
             update_meters()
         elif arg == "--ntu_pv":
             update_ntu_pv()
+        elif arg == "--gaps":
+            plan = plan_gaps()
+            if len(sys.argv) > 2:
+                with open(sys.argv[2], 'w', encoding='utf-8') as f:
+                    json.dump(plan, f, ensure_ascii=False, indent=1)
+                print(f"Plan written to {sys.argv[2]}")
+        elif arg == "--fill-gaps":
+            fill_gaps()
+        elif arg == "--daemon":
+            poll_daemon.run_daemon(int(sys.argv[2]) if len(sys.argv) > 2 else None)
+        elif arg == "--compact-buildings":
+            print(f"Compacted {BuildingDataManager().compact_all()} building file(s).")
         else:
-            print("Unknown argument. Available: --all, --generators, --settlement, --buildings, --meters, --ntu_pv")
+            print("Unknown argument. Available: --all, --generators, --settlement, --buildings, --meters, --ntu_pv, --gaps [plan.json], --fill-gaps, --daemon [port], --compact-buildings")
     else:
         main_menu()
\ No newline at end of file
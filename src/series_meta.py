@@ -0,0 +1,97 @@
+import os
+import json
+
+import pandas as pd
+
+# Summary sidecar of a data file, so resuming an update does not need the data:
+#
+#   {stem}.meta.json  {"source": [[size, mtime_ns], ...],
+#                      "series": {name: {"first": ISO, "last": ISO, "rows": n,
+#                                        "days": n, "complete_days": n}}}
+#
+# rows counts timestamps with a value, days the days with any value and
+# complete_days those with all 24 hours. The writers save it right after the
+# data file (building_store on every log append / compaction, the settlement
+# crawler on every merge) with the size/mtime of the files it describes, so a
+# sidecar that no longer matches (file edited by hand, older version) is
+# rebuilt from the data once by cached().
+
+SUFFIX = ".meta.json"
+
+
+def meta_path(file_path):
+    return os.path.splitext(file_path)[0] + SUFFIX
+
+
+def file_signature(paths):
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append([st.st_size, st.st_mtime_ns])
+        except FileNotFoundError:
+            signature.append(None)
+    return signature
+
+
+def summarize(series):
+    """Summary of one hourly Series (DatetimeIndex); NaN = no value."""
+    valid = series.index[series.notna().to_numpy()]
+    if not len(valid):
+        return {"first": None, "last": None, "rows": 0, "days": 0, "complete_days": 0}
+    per_day = pd.Series(1, index=valid.unique()).groupby(valid.unique().normalize()).size()
+    return {
+        "first": valid.min().isoformat(),
+        "last": valid.max().isoformat(),
+        "rows": int(len(valid.unique())),
+        "days": int(len(per_day)),
+        "complete_days": int((per_day >= 24).sum()),
+    }
+
+
+def summarize_frame(df):
+    """{column: summary} of a wide hourly DataFrame."""
+    if df.empty or not isinstance(df.index, pd.DatetimeIndex):
+        return {}
+    return {str(col): summarize(df[col]) for col in df.columns}
+
+
+def load(file_path, signature):
+    """Series summaries of file_path, or None if there is no sidecar for this signature."""
+    path = meta_path(file_path)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("source") != signature:
+        return None
+    return data.get("series", {})
+
+
+def save(file_path, signature, series):
+    path = meta_path(file_path)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"source": signature, "series": series}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def cached(file_path, signature, build):
+    """Sidecar summaries of file_path, rebuilt with build() (and saved) when out of date."""
+    series = load(file_path, signature)
+    if series is None:
+        series = build()
+        if any(s is not None for s in signature):
+            try:
+                save(file_path, signature, series)
+            except OSError as e:
+                print(f"Warning: Could not write {meta_path(file_path)}: {e}")
+    return series
+
+
+def last_timestamp(series, name):
+    entry = series.get(name)
+    if not entry or not entry.get("last"):
+        return None
+    return pd.Timestamp(entry["last"])
@@ -0,0 +1,95 @@
+import os
+import sys
+import math
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from process.organize_taipower_data import save_json
+from process.taipower_records import RecordTable
+
+# RecordTable must give back a master exactly as it was read: values that
+# compare or hash alike (1 / 1.0 / True, None / NaN, 0.0 / -0.0, "1" / 1)
+# stay apart through load, merge and write_json.
+
+METADATA = {"CATALOG": "test", "UNIT_OF_MEASUREMENT": "MW", "INTERVAL": "10min"}
+MIXED = [1.0, 1, True, None, float("nan"), -0.0, 0.0, 0, False, "1.0", "1", 2.5, 1.0, None]
+
+
+def stamp(i):
+    return (datetime(2025, 1, 1) + timedelta(minutes=10 * i)).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def make_records(values, unit="機組000", offset=0):
+    return [{
+        "DATETIME": stamp(offset + i),
+        "FUEL_TYPE": "燃煤" if i % 2 else None,
+        "UNIT_NAME": unit,
+        "NET_P": value,
+    } for i, value in enumerate(values)]
+
+
+def write_master(path, records):
+    save_json(path, {"records": {
+        "CATALOG": METADATA["CATALOG"], "START_DATE": records[0]["DATETIME"], "END_DATE": records[-1]["DATETIME"],
+        "UNIT_OF_MEASUREMENT": METADATA["UNIT_OF_MEASUREMENT"], "INTERVAL": METADATA["INTERVAL"], "NET_P": records,
+    }})
+
+
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def same_value(a, b):
+    if isinstance(a, float) and math.isnan(a):
+        return isinstance(b, float) and math.isnan(b)
+    return type(a) is type(b) and a == b and (not isinstance(a, float) or math.copysign(1, a) == math.copysign(1, b))
+
+
+def test_load_write_roundtrip(tmp_path):
+    src, out = tmp_path / "src.json", tmp_path / "out.json"
+    write_master(src, make_records(MIXED))
+    RecordTable.load(src, "NET_P").write_json(out, "NET_P", METADATA)
+    assert read_bytes(src) == read_bytes(out)
+
+
+def test_merge_new_records_win(tmp_path):
+    src = tmp_path / "src.json"
+    old = make_records([1.0, 2.0, 3.0, 4.0]) + make_records([5.0, 6.0, 7.0, 8.0], unit="機組001")
+    old.sort(key=lambda rec: (rec["DATETIME"], rec["UNIT_NAME"]))
+    write_master(src, old)
+
+    new = make_records([1, True], offset=2) + make_records([None, float("nan")], unit="機組001", offset=3)
+    table = RecordTable.load(src, "NET_P").merge(new)
+
+    expected = {(rec["DATETIME"], rec["UNIT_NAME"]): rec for rec in old + new}
+    keys = sorted(expected)
+    merged = table.records()
+    assert [(rec["DATETIME"], rec["UNIT_NAME"]) for rec in merged] == keys
+    for rec, key in zip(merged, keys):
+        assert rec.keys() == expected[key].keys()
+        for field, value in expected[key].items():
+            assert same_value(rec[field], value), (key, field, rec[field], value)
+
+
+def test_merge_roundtrip_keeps_value_types(tmp_path):
+    # Merging mixed values into a master and writing it equals writing the merged dicts
+    src, out, ref = tmp_path / "src.json", tmp_path / "out.json", tmp_path / "ref.json"
+    old = make_records(MIXED)
+    write_master(src, old)
+    new = make_records(list(reversed(MIXED)), offset=len(MIXED) - 4)
+
+    RecordTable.load(src, "NET_P").merge(new).write_json(out, "NET_P", METADATA)
+
+    merged = {rec["DATETIME"]: rec for rec in old + new}
+    write_master(ref, [merged[k] for k in sorted(merged)])
+    assert read_bytes(out) == read_bytes(ref)
+
+
+def test_merge_into_empty_table():
+    records = make_records(MIXED)
+    merged = RecordTable().merge(list(reversed(records))).records()
+    assert [rec["DATETIME"] for rec in merged] == [rec["DATETIME"] for rec in records]
+    for rec, value in zip(merged, MIXED):
+        assert same_value(rec["NET_P"], value)